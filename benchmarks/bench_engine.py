@@ -0,0 +1,304 @@
+"""Benchmarks of the graph engine's own overhead, using nodes which do no work.
+
+Each case builds a graph of a given shape and size and measures:
+
+- build: add_node/build_node for that many distinct functions.
+- wire: calling the nodes to define the flow.
+- plan: Graph.compile.
+- run: one call of the graph, averaged over several calls, also given per node.
+- peak memory: traced while wiring, planning and running once.
+
+Usage:
+    python benchmarks/bench_engine.py run [--sizes 10 100 ...] [--shapes chain ...] [--output results.json]
+    python benchmarks/bench_engine.py compare old.json new.json [--threshold 0.2]
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import types
+import typing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from mr_graph.graph import Graph  # noqa: E402
+
+SIZES = [10, 100, 1000, 10000, 100000]
+SHAPES = ["chain", "chain_async", "fan_out", "fan_in", "nested"]
+NESTED_WIDTH = 10
+METRICS = ["build_s", "wire_s", "plan_s", "run_s", "peak_mb"]
+
+
+def noop(x: int):
+    """
+    return the input
+
+    Parameters
+    ----------
+    x : int
+        a number.
+
+    Returns
+    -------
+    x : int
+        the same number
+    """
+    return x
+
+
+async def anoop(x: int):
+    """
+    return the input
+
+    Parameters
+    ----------
+    x : int
+        a number.
+
+    Returns
+    -------
+    x : int
+        the same number
+    """
+    return x
+
+
+def collect(xs: list):
+    """
+    count the aggregated values
+
+    Parameters
+    ----------
+    xs : list
+        aggregated values.
+
+    Returns
+    -------
+    n : int
+        number of values
+    """
+    return len(xs)
+
+
+def copy_function(func: typing.Callable, name: str) -> typing.Callable:
+    """A distinct function with the same code and docstring, so each add_node builds a new node."""
+    copy = types.FunctionType(func.__code__, func.__globals__, name)
+    copy.__doc__ = func.__doc__
+    copy.__qualname__ = name
+    return copy
+
+
+def build(size: int) -> float:
+    """Seconds taken by add_node for size distinct functions."""
+    funcs = [copy_function(noop, f"noop_{i}") for i in range(size)]
+    g = Graph()
+    started = time.perf_counter()
+    for func in funcs:
+        g.add_node(func, executor="inline")
+    return time.perf_counter() - started
+
+
+def inner_graph() -> Graph:
+    g = Graph()
+    g.add_node(noop, executor="inline")
+    x = g.input(name="x")
+    for _ in range(NESTED_WIDTH - 1):
+        x = g.noop(x)
+    g.outputs = g.noop(x)
+    return g
+
+
+def wire(shape: str, size: int) -> Graph:
+    """Define a graph of about size nodes."""
+    g = Graph()
+    if shape == "chain":
+        g.add_node(noop, executor="inline")
+        x = g.input(name="x")
+        for _ in range(size):
+            x = g.noop(x)
+        g.outputs = x
+    elif shape == "chain_async":
+        g.add_node(anoop)
+        x = g.input(name="x")
+        for _ in range(size):
+            x = g.anoop(x)
+        g.outputs = x
+    elif shape == "fan_out":
+        g.add_node(noop, executor="inline")
+        x = g.input(name="x")
+        for _ in range(size - 1):
+            g.noop(x)
+        g.outputs = g.noop(x)
+    elif shape == "fan_in":
+        g.add_node(noop, executor="inline")
+        g.add_node(collect, executor="inline")
+        xs = g.aggregator(name="xs")
+        for i in range(size - 1):
+            xs += g.noop(x=i).x
+        g.outputs = g.collect(xs=xs)
+    elif shape == "nested":
+        inner = inner_graph()
+
+        async def subgraph(x: int):
+            """
+            run a chain of no-op nodes
+
+            Parameters
+            ----------
+            x : int
+                a number.
+
+            Returns
+            -------
+            x : int
+                the same number
+            """
+            return (await inner(x=x)).x
+
+        g.add_node(subgraph)
+        x = g.input(name="x")
+        for _ in range(max(1, size // NESTED_WIDTH)):
+            x = g.subgraph(x)
+        g.outputs = x
+    else:
+        raise ValueError(f"unknown shape {shape}")
+    return g
+
+
+async def run_case(shape: str, size: int, memory: bool) -> dict:
+    """Measure one shape and size."""
+    result = dict(shape=shape, size=size)
+    result["build_s"] = build(size) if shape == "chain" else None
+
+    started = time.perf_counter()
+    g = wire(shape, size)
+    result["wire_s"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    g.compile()
+    result["plan_s"] = time.perf_counter() - started
+
+    n_runs = max(3, min(100, 100000 // size))
+    await g(x=1)
+    started = time.perf_counter()
+    for _ in range(n_runs):
+        await g(x=1)
+    result["run_s"] = (time.perf_counter() - started) / n_runs
+    result["run_us_per_node"] = 1e6 * result["run_s"] / size
+
+    result["peak_mb"] = None
+    if memory:
+        tracemalloc.start()
+        g = wire(shape, size)
+        g.compile()
+        await g(x=1)
+        result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result
+
+
+def commit() -> typing.Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: list[int], shapes: list[str], memory: bool, output: str):
+    logging.getLogger().setLevel(logging.ERROR)
+    results = []
+    for shape in shapes:
+        for size in sizes:
+            result = asyncio.run(run_case(shape, size, memory))
+            results.append(result)
+            build_s = (
+                ""
+                if result["build_s"] is None
+                else f"  build {result['build_s']:8.3f}s"
+            )
+            print(
+                f"{shape:12s} {size:7d}{build_s}  wire {result['wire_s']:8.3f}s  plan {result['plan_s']:8.3f}s  "
+                f"run {result['run_s']:8.4f}s  {result['run_us_per_node']:7.2f}us/node",
+                flush=True,
+            )
+    report = dict(
+        commit=commit(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        timestamp=time.strftime("%Y-%m-%dT%H:%M:%S"),
+        results=results,
+    )
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {output}")
+
+
+def compare(old: str, new: str, threshold: float) -> int:
+    """Print the change of every metric between two result files.
+
+    Returns:
+        int: 1 when a metric got slower (or bigger) by more than threshold, else 0.
+    """
+    with open(old) as f:
+        old_results = {(x["shape"], x["size"]): x for x in json.load(f)["results"]}
+    with open(new) as f:
+        new_results = {(x["shape"], x["size"]): x for x in json.load(f)["results"]}
+    regressed = False
+    for key in sorted(old_results.keys() & new_results.keys()):
+        for metric in METRICS:
+            before, after = old_results[key][metric], new_results[key][metric]
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            flag = ""
+            if change > threshold:
+                flag = "  REGRESSION"
+                regressed = True
+            print(
+                f"{key[0]:12s} {key[1]:7d} {metric:8s} {before:10.4f} -> {after:10.4f} {change:+7.1%}{flag}"
+            )
+    return int(regressed)
+
+
+def main(argv: typing.Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="mr_graph engine overhead benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    run_parser.add_argument("--shapes", nargs="+", choices=SHAPES, default=SHAPES)
+    run_parser.add_argument(
+        "--no-memory", action="store_true", help="skip the traced memory pass"
+    )
+    run_parser.add_argument(
+        "--output", help="results file. Defaults to bench-<commit>.json"
+    )
+    compare_parser = commands.add_parser("compare", help="compare two results files")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed slowdown, as a fraction"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        output = args.output or f"bench-{commit() or 'local'}.json"
+        run(args.sizes, args.shapes, not args.no_memory, output)
+        return 0
+    return compare(args.old, args.new, args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
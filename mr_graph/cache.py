@@ -0,0 +1,521 @@
+import argparse
+import asyncio
+import hashlib
+import inspect
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+import typing
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """Snapshot of a node cache.
+
+    Attributes:
+        hits (int): lookups answered from the cache.
+        misses (int): lookups that called the function.
+        evictions (int): entries removed to respect the size limits, or because they expired.
+        entries (int): entries held now.
+        size (int): approximate bytes held now.
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size: int
+
+
+def source_hash(func: typing.Callable) -> str:
+    """Hash a function's source, so cached results are not reused after it changes.
+
+    Args:
+        func (typing.Callable): the function.
+
+    Returns:
+        str: short hex digest of the source, or of the bytecode when the source is not available.
+    """
+    try:
+        source = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        code = getattr(func, "__code__", None)
+        source = code.co_code + repr(code.co_consts).encode() if code else b""
+    return hashlib.sha256(source).hexdigest()[:16]
+
+
+def node_namespace(func: typing.Callable) -> str:
+    """Identify a node's function in cache keys.
+
+    Args:
+        func (typing.Callable): the node's function.
+
+    Returns:
+        str: module and qualified name of the function, and a hash of its source.
+    """
+    return f"{func.__module__}.{func.__qualname__}@{source_hash(func)}"
+
+
+class _Unordered(tuple):
+    """A set or frozenset in a cache key: its type name, then its items in a fixed order."""
+
+
+def _pickled(value: typing.Any) -> bytes:
+    return pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _canonical(value: typing.Any) -> typing.Any:
+    """Replace sets inside lists, tuples and dicts by their items in a fixed order.
+
+    Sets are pickled in hash order, which changes with PYTHONHASHSEED, so without this the same
+    inputs get a different key in every process.
+    """
+    if isinstance(value, (set, frozenset)):
+        items = sorted((_canonical(x) for x in value), key=_pickled)
+        return _Unordered([type(value).__name__] + items)
+    if type(value) in (list, tuple):
+        return type(value)(_canonical(x) for x in value)
+    if type(value) is dict:
+        return {k: _canonical(v) for k, v in value.items()}
+    return value
+
+
+class NodeCache(ABC):
+    """Interface between the scheduler and a node's cached results.
+
+    Keys are a stable hash of the node's namespace and its bound keyword arguments, so a hit
+    skips the thread hop or coroutine entirely. Cached values are shared by reference and
+    must not be mutated by downstream nodes.
+
+    Attributes:
+        blocking (bool): get and set may wait on I/O or locks, so the scheduler runs them in a worker thread rather than on the event loop.
+
+    Args:
+        ABC: Abstract base class.
+    """
+
+    blocking: bool = False
+
+    def key(self, namespace: str, kwds: dict) -> typing.Optional[str]:
+        """Hash the inputs of a call. The hash is the same in every process, so keys can be shared through a DiskCache.
+
+        Args:
+            namespace (str): identifies the node.
+            kwds (dict): bound keyword arguments.
+
+        Returns:
+            typing.Optional[str]: "namespace:digest", or None when the inputs cannot be pickled (the call is not cached).
+        """
+        try:
+            payload = _pickled(sorted((k, _canonical(v)) for k, v in kwds.items()))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return None
+        return f"{namespace}:{hashlib.sha256(payload).hexdigest()}"
+
+    @abstractmethod
+    def get(self, key: typing.Optional[str]) -> tuple[bool, typing.Any]:
+        """Look up a result.
+
+        Args:
+            key (typing.Optional[str]): from key.
+
+        Returns:
+            tuple[bool, typing.Any]: (True, value) on a hit, (False, None) on a miss.
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: typing.Any):
+        """Store a result.
+
+        Args:
+            key (str): from key.
+            value (typing.Any): the node's return value.
+        """
+
+    @abstractmethod
+    def stats(self) -> CacheStats:
+        """Hits, misses and size.
+
+        Returns:
+            CacheStats: current counters.
+        """
+
+    @abstractmethod
+    def clear(self):
+        """Remove every entry."""
+
+    async def aget(self, key: typing.Optional[str]) -> tuple[bool, typing.Any]:
+        """get, in a worker thread when the cache is blocking."""
+        if self.blocking:
+            return await asyncio.to_thread(self.get, key)
+        return self.get(key)
+
+    async def aset(self, key: str, value: typing.Any):
+        """set, in a worker thread when the cache is blocking."""
+        if self.blocking:
+            await asyncio.to_thread(self.set, key, value)
+        else:
+            self.set(key, value)
+
+    async def fill(self, key: str, call: typing.Awaitable) -> typing.Any:
+        """Await a call and store its result.
+
+        Args:
+            key (str): from key.
+            call (typing.Awaitable): the node invocation.
+
+        Returns:
+            typing.Any: the node's return value.
+        """
+        value = await call
+        await self.aset(key, value)
+        return value
+
+
+class MemoryCache(NodeCache):
+    """In-memory LRU cache for node results.
+
+    Attributes:
+        max_entries (int, optional): entries kept before the least recently used is evicted.
+        max_bytes (int, optional): approximate bytes kept before the least recently used is evicted. Values are sized by their pickled length.
+        ttl (float, optional): seconds an entry stays valid.
+    """
+
+    max_entries: typing.Optional[int]
+    max_bytes: typing.Optional[int]
+    ttl: typing.Optional[float]
+
+    def __init__(
+        self,
+        max_entries: typing.Optional[int] = 1024,
+        max_bytes: typing.Optional[int] = None,
+        ttl: typing.Optional[float] = None,
+    ):
+        """Configure the cache.
+
+        Args:
+            max_entries (typing.Optional[int], optional): entry limit, None for no limit. Defaults to 1024.
+            max_bytes (typing.Optional[int], optional): size limit, None for no limit. Defaults to None.
+            ttl (typing.Optional[float], optional): seconds before an entry expires, None to never expire. Defaults to None.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _sizeof(self, value: typing.Any) -> int:
+        if self.max_bytes is None:
+            return 0
+        try:
+            return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return sys.getsizeof(value)
+
+    def get(self, key: typing.Optional[str]) -> tuple[bool, typing.Any]:
+        with self._lock:
+            entry = self._entries.get(key) if key is not None else None
+            if entry is not None:
+                value, expires, size = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return True, value
+                del self._entries[key]
+                self._size -= size
+                self._evictions += 1
+            self._misses += 1
+            return False, None
+
+    def set(self, key: str, value: typing.Any):
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[2]
+            self._entries[key] = (value, expires, size)
+            self._size += size
+            while (
+                self.max_entries is not None and len(self._entries) > self.max_entries
+            ) or (self.max_bytes is not None and self._size > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self._evictions += 1
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                size=self._size,
+            )
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+class DiskCache(NodeCache):
+    """SQLite-backed cache for node results, shared by processes and kept across restarts.
+
+    Several worker processes can read and write the same file. The database uses write-ahead
+    logging, and lookups and writes run in a worker thread, so waiting for another writer never
+    holds up the event loop. Writes are best effort: when another process holds the write lock
+    for longer than timeout, the result is not stored (and a hit does not refresh its access time).
+    Keys include a hash of the node function's source, so results are not reused once the function changes.
+
+    Attributes:
+        path (str): database file.
+        max_bytes (int, optional): bytes of pickled values kept before the least recently used are evicted.
+        max_entries (int, optional): entries kept before the least recently used are evicted.
+        ttl (float, optional): seconds an entry stays valid.
+    """
+
+    path: str
+    max_bytes: typing.Optional[int]
+    max_entries: typing.Optional[int]
+    ttl: typing.Optional[float]
+    blocking: bool = True
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: typing.Optional[int] = 1 << 30,
+        max_entries: typing.Optional[int] = None,
+        ttl: typing.Optional[float] = None,
+        timeout: float = 30.0,
+    ):
+        """Open (or create) the cache file.
+
+        Args:
+            path (str): database file.
+            max_bytes (typing.Optional[int], optional): size limit, None for no limit. Defaults to 1 GiB.
+            max_entries (typing.Optional[int], optional): entry limit, None for no limit. Defaults to None.
+            ttl (typing.Optional[float], optional): seconds before an entry expires, None to never expire. Defaults to None.
+            timeout (float, optional): seconds to wait for another process holding the write lock. Defaults to 30.
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._connection = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, namespace TEXT, value BLOB, size INTEGER, "
+            "accessed REAL, expires REAL)"
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+        )
+
+    def get(self, key: typing.Optional[str]) -> tuple[bool, typing.Any]:
+        with self._lock:
+            row = None
+            try:
+                if key is not None:
+                    row = self._connection.execute(
+                        "SELECT value, expires FROM entries WHERE key = ?", (key,)
+                    ).fetchone()
+            except sqlite3.OperationalError:
+                # locked by another process, treat it as a miss
+                pass
+            if row is not None:
+                value, expires = row
+                now = time.time()
+                if expires is None or expires > now:
+                    self._write(
+                        "UPDATE entries SET accessed = ? WHERE key = ?", (now, key)
+                    )
+                    self._hits += 1
+                    return True, pickle.loads(value)
+                if self._write("DELETE FROM entries WHERE key = ?", (key,)):
+                    self._evictions += 1
+            self._misses += 1
+            return False, None
+
+    def _write(self, sql: str, params: tuple) -> bool:
+        """Run a single statement, giving up when another process holds the write lock."""
+        try:
+            self._connection.execute(sql, params)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def set(self, key: str, value: typing.Any):
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return
+        if self.max_bytes is not None and len(payload) > self.max_bytes:
+            return
+        now = time.time()
+        expires = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                # another process held the write lock for longer than timeout, skip the write
+                return
+            try:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, key.split(":")[0], payload, len(payload), now, expires),
+                )
+                self._evictions += self._evict()
+                self._connection.execute("COMMIT")
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def _evict(self) -> int:
+        """Remove expired entries, then the least recently used until both limits hold."""
+        evicted = self._connection.execute(
+            "DELETE FROM entries WHERE expires IS NOT NULL AND expires <= ?",
+            (time.time(),),
+        ).rowcount
+        entries, size = self._connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if self.max_entries is not None and entries > self.max_entries:
+            evicted += self._connection.execute(
+                "DELETE FROM entries WHERE key IN "
+                "(SELECT key FROM entries ORDER BY accessed LIMIT ?)",
+                (entries - self.max_entries,),
+            ).rowcount
+            size = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+        if self.max_bytes is not None and size > self.max_bytes:
+            rows = self._connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed"
+            )
+            oldest = []
+            for key, entry_size in rows:
+                if size <= self.max_bytes:
+                    break
+                oldest.append((key,))
+                size -= entry_size
+            self._connection.executemany("DELETE FROM entries WHERE key = ?", oldest)
+            evicted += len(oldest)
+        return evicted
+
+    def namespaces(self) -> list[tuple[str, int, int]]:
+        """Summarise the entries by node.
+
+        Returns:
+            list[tuple[str, int, int]]: (namespace, entries, bytes) for every namespace.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT namespace, COUNT(*), SUM(size) FROM entries "
+                "GROUP BY namespace ORDER BY namespace"
+            ).fetchall()
+
+    def purge(
+        self, namespace: typing.Optional[str] = None, expired_only: bool = False
+    ) -> int:
+        """Remove entries.
+
+        Args:
+            namespace (typing.Optional[str], optional): only remove entries of this namespace. A namespace without "@" matches every version of the function. Defaults to None.
+            expired_only (bool, optional): only remove entries past their TTL. Defaults to False.
+
+        Returns:
+            int: number of entries removed.
+        """
+        clauses, params = [], []
+        if namespace is not None:
+            if "@" in namespace:
+                clauses.append("namespace = ?")
+                params.append(namespace)
+            else:
+                clauses.append("(namespace = ? OR namespace LIKE ?)")
+                params += [namespace, namespace + "@%"]
+        if expired_only:
+            clauses.append("expires IS NOT NULL AND expires <= ?")
+            params.append(time.time())
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self._lock:
+            return self._connection.execute(
+                "DELETE FROM entries" + where, params
+            ).rowcount
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            entries, size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            return CacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=entries,
+                size=size,
+            )
+
+    def clear(self):
+        self.purge()
+
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
+
+
+def main(argv: typing.Optional[list[str]] = None):
+    """Inspect or purge a DiskCache file.
+
+    Usage: python -m mr_graph.cache {inspect,purge} PATH [--namespace NAMESPACE] [--expired]
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m mr_graph.cache", description=main.__doc__.split("\n")[0]
+    )
+    parser.add_argument("command", choices=["inspect", "purge"])
+    parser.add_argument("path", help="cache database file")
+    parser.add_argument("--namespace", help="only entries of this node")
+    parser.add_argument(
+        "--expired", action="store_true", help="only purge entries past their TTL"
+    )
+    args = parser.parse_args(argv)
+
+    cache = DiskCache(args.path, max_bytes=None)
+    try:
+        if args.command == "inspect":
+            total_entries, total_size = 0, 0
+            for namespace, entries, size in cache.namespaces():
+                if args.namespace is None or namespace.split("@")[0] == args.namespace:
+                    print(f"{namespace}\t{entries}\t{size}")
+                    total_entries += entries
+                    total_size += size
+            print(f"total\t{total_entries}\t{total_size}")
+        else:
+            removed = cache.purge(namespace=args.namespace, expired_only=args.expired)
+            print(f"removed {removed} entries")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import asyncio
+import contextvars
+import pickle
+import threading
+import time
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+EXECUTORS = (INLINE, THREAD, PROCESS)
+"""Ways a blocking (SyncNode) function can be run: on the event loop, in a worker thread or in a worker process.
+"""
+
+_PICKLE_ERRORS = (pickle.PicklingError, TypeError, AttributeError)
+
+
+def check_picklable(name: str, func: typing.Callable):
+    """Make sure a function can be sent to a worker process.
+
+    Args:
+        name (str): node name, used in the error.
+        func (typing.Callable): function to check.
+
+    Raises:
+        TypeError: Raised when the function cannot be pickled.
+    """
+    try:
+        pickle.dumps(func)
+    except _PICKLE_ERRORS as err:
+        raise TypeError(
+            f"node {name} cannot run in a process because its function cannot be pickled ({err}). "
+            "Define it at the top level of a module."
+        ) from None
+
+
+@dataclass(frozen=True)
+class PoolStats:
+    """Snapshot of a ThreadPool's load.
+
+    Attributes:
+        name (str): pool name.
+        max_workers (int): number of worker threads.
+        queued (int): calls waiting for a free worker.
+        active (int): calls running now.
+        completed (int): calls finished since the stats were reset.
+        wait_time (float): total seconds calls spent queued.
+        busy_time (float): total seconds workers spent running calls.
+        utilisation (float): busy_time as a fraction of the worker time available since the stats were reset.
+    """
+
+    name: str
+    max_workers: int
+    queued: int
+    active: int
+    completed: int
+    wait_time: float
+    busy_time: float
+    utilisation: float
+
+
+class ThreadPool:
+    """A named pool of worker threads for blocking nodes.
+
+    Giving slow kinds of nodes (HTTP clients, databases, file I/O) their own pools stops them
+    from starving each other, or anything else in the process using the event loop's default executor.
+
+    Attributes:
+        name (str): pool name.
+        max_workers (int): number of worker threads.
+    """
+
+    name: str
+    max_workers: int
+
+    def __init__(self, name: str, max_workers: int):
+        """Configure the pool. Threads are started as calls arrive.
+
+        Args:
+            name (str): pool name, also used as the thread name prefix.
+            max_workers (int): number of worker threads.
+
+        Raises:
+            ValueError: Raised when max_workers is less than 1.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.name = name
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self.reset_stats()
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix=self.name
+            )
+        return self._executor
+
+    def _call(self, func: typing.Callable, kwds: dict, submitted: float):
+        """Runs in the worker thread and keeps the counters up to date."""
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+            self._wait_time += started - submitted
+        try:
+            return func(**kwds)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._busy_time += time.perf_counter() - started
+
+    async def run(self, name: str, func: typing.Callable, kwds: dict) -> typing.Any:
+        """Call func(**kwds) in one of the pool's threads.
+
+        Args:
+            name (str): node name.
+            func (typing.Callable): blocking function.
+            kwds (dict): keyword arguments for the call.
+
+        Returns:
+            typing.Any: the return value of func.
+        """
+        with self._lock:
+            self._queued += 1
+        context = contextvars.copy_context()
+        future = self.executor.submit(
+            context.run, self._call, func, kwds, time.perf_counter()
+        )
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if future.cancel():
+                # never reached a worker
+                with self._lock:
+                    self._queued -= 1
+            raise
+
+    def stats(self) -> PoolStats:
+        """Queue depth and utilisation of the pool.
+
+        Returns:
+            PoolStats: current counters.
+        """
+        with self._lock:
+            elapsed = time.perf_counter() - self._since
+            busy_time = self._busy_time
+            return PoolStats(
+                name=self.name,
+                max_workers=self.max_workers,
+                queued=self._queued,
+                active=self._active,
+                completed=self._completed,
+                wait_time=self._wait_time,
+                busy_time=busy_time,
+                utilisation=busy_time / (elapsed * self.max_workers)
+                if elapsed > 0
+                else 0.0,
+            )
+
+    def reset_stats(self):
+        """Zero the completed, wait_time and busy_time counters."""
+        with self._lock:
+            self._completed = 0
+            self._wait_time = 0.0
+            self._busy_time = 0.0
+            self._since = time.perf_counter()
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker threads. The pool starts new ones if it is used again."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def __repr__(self) -> str:
+        return f"ThreadPool(name={self.name}, max_workers={self.max_workers})"
+
+
+def _call_in_process(name: str, payload: bytes) -> bytes:
+    """Runs in the worker process: unpickle the call, run it and pickle the result."""
+    func, kwds = pickle.loads(payload)
+    result = func(**kwds)
+    try:
+        return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    except _PICKLE_ERRORS as err:
+        raise TypeError(
+            f"the value returned by node {name} cannot be pickled ({err})"
+        ) from None
+
+
+class ProcessPool:
+    """Process pool shared by the nodes of a graph. Worker processes are started on first use.
+
+    Arguments and return values are pickled explicitly, so failures name the node and say which side could not be pickled.
+
+    Attributes:
+        max_workers (int, optional): number of worker processes. Defaults to the number of CPUs.
+    """
+
+    max_workers: typing.Optional[int]
+
+    def __init__(
+        self,
+        max_workers: typing.Optional[int] = None,
+        executor: typing.Optional[Executor] = None,
+    ):
+        """Configure the pool.
+
+        Args:
+            max_workers (typing.Optional[int], optional): number of worker processes. Defaults to None.
+            executor (typing.Optional[Executor], optional): an existing executor to use instead of starting one. It is left
+                running by shutdown, since its owner may still be using it. Defaults to None.
+        """
+        self.max_workers = max_workers
+        self._executor = executor
+        self._owned = executor is None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def run(self, name: str, func: typing.Callable, kwds: dict) -> typing.Any:
+        """Call func(**kwds) in a worker process.
+
+        Args:
+            name (str): node name, used in errors.
+            func (typing.Callable): a picklable function.
+            kwds (dict): keyword arguments for the call.
+
+        Raises:
+            TypeError: Raised when the arguments or the return value cannot be pickled.
+
+        Returns:
+            typing.Any: the return value of func.
+        """
+        try:
+            payload = pickle.dumps((func, kwds), protocol=pickle.HIGHEST_PROTOCOL)
+        except _PICKLE_ERRORS as err:
+            raise TypeError(
+                f"the arguments of node {name} cannot be pickled ({err})"
+            ) from None
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            self.executor, _call_in_process, name, payload
+        )
+        return pickle.loads(result)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes the pool started. The pool starts new ones if it is used again.
+
+        An executor passed in by the caller is left running.
+        """
+        if self._owned and self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
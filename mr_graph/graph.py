@@ -2,15 +2,45 @@ import asyncio
 import typing
 import logging
 from uuid import uuid4 as uuid
-from pydantic import Field
-from mr_graph.node import build_node, NODE_TYPES
-from mr_graph.node_data_class import NodeDataClass
+from mr_graph.node import (
+    build_node,
+    NODE_TYPES,
+    AsyncNode,
+    StreamNode,
+    SubgraphNode,
+    MappedNode,
+)
+from mr_graph.node_data_class import NodeDataClass, make_node_dataclass
 from mr_graph.node_data_tracker import NodeDataTracker
 from mr_graph.node_data_aggregator import NodeDataAggregator
-from dataclasses import make_dataclass, fields, asdict
-from inspect import iscoroutinefunction
+from dataclasses import fields
 from functools import partial
+from collections import deque
 from mr_graph.graphio import GraphIO
+from mr_graph.plan import (
+    DeadlineExceeded,
+    ExecutionPlan,
+    IDENTITY,
+    RunMemo,
+    SKIPPED_DEADLINE,
+    build_plan,
+)
+from mr_graph.limits import ConcurrencyLimit, PerLoop, RateLimiter
+from mr_graph.serialize import load_plan, save_plan
+from mr_graph.hedge import HedgePolicy, HedgeStats
+from mr_graph.profiler import Profiler
+from mr_graph.hooks import GraphHooks, RunHooks
+from mr_graph.executors import (
+    EXECUTORS,
+    PROCESS,
+    THREAD,
+    PoolStats,
+    ProcessPool,
+    ThreadPool,
+    check_picklable,
+)
+from mr_graph.cache import CacheStats, MemoryCache, NodeCache
+from concurrent.futures import Executor
 
 
 class Graph:
@@ -21,6 +51,15 @@ class Graph:
         flow (dict[str, GraphIO]): Inputs, nodes, and outputs for all of the nodes defined in the graph.
         inputs (dict[str, NodeDataClass]): The inputs required by the graph.
         outputs (NodeDataClass): The outputs from all defined outputs in the graph.
+        plan (ExecutionPlan, optional): The compiled plan. Cleared whenever the graph is changed.
+        semaphore (ConcurrencyLimit, optional): Graph-wide limit on running nodes.
+        process_pool (ProcessPool): Worker processes shared by the nodes using the process executor.
+        thread_pools (dict[str, ThreadPool]): Named thread pools used by the graph's nodes.
+        stream_buffer (int): Items buffered between a streaming node and each streaming node reading it.
+        profiler (Profiler, optional): Records node timings for every run when set.
+        hooks (list[GraphHooks]): Called as runs and nodes start and end.
+        name (str, optional): Name of the node when the graph is added to another graph.
+        output_sets (dict[str, tuple[str, ...]]): Named subsets of the outputs, which calls can ask for by name.
 
     Returns:
         NodeDataClass: outputs from the functions used in the graph.
@@ -29,29 +68,267 @@ class Graph:
     nodes: dict[str, NODE_TYPES] = dict()
     flow: dict[str, GraphIO] = dict()
     inputs: dict[str, NodeDataClass] = dict()
-    outputs: NodeDataClass = None
+    plan: typing.Optional[ExecutionPlan] = None
+    semaphore: typing.Optional[ConcurrencyLimit] = None
+    process_pool: ProcessPool = None
+    thread_pools: dict[str, ThreadPool] = dict()
+    stream_buffer: int = 16
+    profiler: typing.Optional[Profiler] = None
+    hooks: list[GraphHooks] = list()
+    name: typing.Optional[str] = None
+    output_sets: dict[str, tuple[str, ...]] = dict()
 
-    def __init__(self, nodes: typing.List[typing.Callable] = []):
+    def __init__(
+        self,
+        nodes: typing.List[typing.Callable] = [],
+        max_concurrency: typing.Optional[int] = None,
+        process_pool: typing.Union[int, ProcessPool, Executor, None] = None,
+        thread_pools: typing.Optional[dict[str, typing.Union[int, ThreadPool]]] = None,
+        stream_buffer: int = 16,
+        profile: typing.Union[bool, Profiler] = False,
+        name: typing.Optional[str] = None,
+    ):
         """Graphs can be initialized by passing nodes, or defined later.
 
         Args:
             nodes (typing.List[typing.Callable], optional): Functions which are to be converted into graph nodes. Defaults to [].
+            max_concurrency (typing.Optional[int], optional): Maximum number of nodes running at once, across every call of the graph. Defaults to None (no limit).
+            process_pool (typing.Union[int, ProcessPool, Executor, None], optional): Pool for nodes added with executor="process": a number of workers, a ProcessPool or an existing executor. Defaults to one worker per CPU, started on first use.
+            thread_pools (typing.Optional[dict[str, typing.Union[int, ThreadPool]]], optional): Named thread pools (or their sizes) that nodes can be assigned to. A pool named "default" is used by thread nodes without a pool of their own, instead of the event loop's default executor. Defaults to None.
+            stream_buffer (int, optional): Items buffered between a streaming (generator) node and each streaming node reading it. The producer waits while a buffer is full. Defaults to 16.
+            profile (typing.Union[bool, Profiler], optional): Record when each node became ready, started and finished in every run. True creates a Profiler. Defaults to False.
+            name (typing.Optional[str], optional): Name of the node when the graph is added to another graph with add_node. Defaults to None.
         """
         super().__init__()
         self.nodes = dict()
         self.flow = dict()
         self.inputs = dict()
-        self.outputs = None
+        self.plan = None
+        self.semaphore = _semaphore(max_concurrency)
+        if isinstance(process_pool, ProcessPool):
+            self.process_pool = process_pool
+        elif isinstance(process_pool, Executor):
+            self.process_pool = ProcessPool(executor=process_pool)
+        else:
+            self.process_pool = ProcessPool(max_workers=process_pool)
+        self.thread_pools = dict()
+        for pool_name, pool in (thread_pools or dict()).items():
+            if not isinstance(pool, ThreadPool):
+                pool = ThreadPool(pool_name, pool)
+            self.thread_pools[pool_name] = pool
+        if stream_buffer < 1:
+            raise ValueError("stream_buffer must be at least 1")
+        self.stream_buffer = stream_buffer
+        if profile is True:
+            profile = Profiler()
+        self.profiler = profile or None
+        self.hooks = list()
+        if self.profiler is not None:
+            self.add_hooks(self.profiler)
+        self.name = name
+        self.output_sets = dict()
+        self._outputs = None
         self.add_nodes(nodes)
 
-    def add_node(self, func: typing.Callable):
+    @property
+    def outputs(self) -> NodeDataTracker:
+        """The outputs from all defined outputs in the graph."""
+        return self._outputs
+
+    @outputs.setter
+    def outputs(self, outputs: NodeDataTracker):
+        self._outputs = outputs
+        self.plan = None
+
+    def add_node(
+        self,
+        func: typing.Callable,
+        max_concurrency: typing.Union[int, ConcurrencyLimit, None] = None,
+        rate_limit: typing.Union[float, RateLimiter, None] = None,
+        rate_limit_cost: typing.Optional[typing.Callable] = None,
+        executor: typing.Optional[str] = None,
+        thread_pool: typing.Union[str, ThreadPool, None] = None,
+        cache: typing.Union[bool, NodeCache, None] = None,
+        timeout: typing.Optional[float] = None,
+        hedge: typing.Union[float, HedgePolicy, None] = None,
+    ):
         """generates a node from a function
 
+        Limits are enforced by the scheduler and shared by every call of the graph.
+        Pass the same ConcurrencyLimit or RateLimiter to several nodes to share a limit between them.
+
+        A Graph can also be added. It is added with add_subgraph, named after the graph's name. Its limits and timeout
+        apply to each run of the graph; executors, thread pools, caches and hedges are set on the graph's own nodes.
+
         Args:
             func (typing.Callable): builds the node
+            max_concurrency (typing.Union[int, ConcurrencyLimit, None], optional): Maximum number of calls of this node running at once. Defaults to None.
+            rate_limit (typing.Union[float, RateLimiter, None], optional): Tokens per second available to this node. Defaults to None.
+            rate_limit_cost (typing.Optional[typing.Callable], optional): Called with the node's kwds to get the tokens a call uses. Defaults to 1 token per call.
+            executor (typing.Optional[str], optional): Where a blocking function runs: "inline" on the event loop, "thread" or "process". Defaults to "thread".
+            thread_pool (typing.Union[str, ThreadPool, None], optional): Name of one of the graph's thread pools, or a new pool to add to the graph. Implies executor="thread". Defaults to the graph's "default" pool.
+            cache (typing.Union[bool, NodeCache, None], optional): Reuse results for inputs seen before. True uses a MemoryCache with default limits. Only for pure functions. Defaults to None.
+            timeout (typing.Optional[float], optional): Seconds a call may take once its limits allow it to start. A call taking longer is cancelled and the run fails with NodeTimeoutError. Blocking functions keep running in their thread or process until they return. Defaults to None.
+            hedge (typing.Union[float, HedgePolicy, None], optional): For idempotent async functions: start a duplicate call when the first has not finished after this many seconds (or the policy's delay), and keep whichever finishes first. Defaults to None.
+
+        Raises:
+            ValueError: Raised when the executor is unknown or set for an async function, an option is not supported by a generator
+                or a graph, the timeout is not positive, or a hedge is set for a function which is not async.
+            KeyError: Raised when the named thread pool does not exist.
+            TypeError: Raised when a function using the process executor cannot be pickled.
         """
+        if isinstance(func, Graph):
+            if func.name is None:
+                raise ValueError("a graph needs a name to be added with add_node")
+            unsupported = [
+                option
+                for option, value in [
+                    ("executor", executor),
+                    ("thread_pool", thread_pool),
+                    ("cache", cache),
+                    ("hedge", hedge),
+                ]
+                if value is not None
+            ]
+            if unsupported:
+                raise ValueError(
+                    f"{func.name} is a graph and does not support {', '.join(unsupported)}"
+                )
+            return self.add_subgraph(
+                func,
+                func.name,
+                max_concurrency=max_concurrency,
+                rate_limit=rate_limit,
+                rate_limit_cost=rate_limit_cost,
+                timeout=timeout,
+            )
         node = build_node(func)
+        if isinstance(node, StreamNode):
+            if cache:
+                raise ValueError(f"{node.name} is a generator and cannot be cached")
+            if executor not in [None, THREAD]:
+                raise ValueError(f"{node.name} is a generator and cannot run {executor}")
+            if len(fields(node.outputs)) != 1:
+                raise ValueError(f"{node.name} is a generator and must yield one output")
+        if executor is not None:
+            if executor not in EXECUTORS:
+                raise ValueError(f"executor must be one of {EXECUTORS}, not {executor}")
+            if isinstance(node, AsyncNode) or (
+                isinstance(node, StreamNode) and node.asynchronous
+            ):
+                raise ValueError(
+                    f"{node.name} is async and is always awaited on the event loop"
+                )
+            if executor == PROCESS:
+                check_picklable(node.name, func)
+            node.executor = executor
+        if thread_pool is not None:
+            if (
+                isinstance(node, AsyncNode)
+                or (isinstance(node, StreamNode) and node.asynchronous)
+                or executor not in [None, THREAD]
+            ):
+                raise ValueError(f"{node.name} does not run in a thread")
+            if isinstance(thread_pool, ThreadPool):
+                self.thread_pools[thread_pool.name] = thread_pool
+            else:
+                thread_pool = self.thread_pools[thread_pool]
+            node.thread_pool = thread_pool
+        if cache is True:
+            cache = MemoryCache()
+        node.cache = cache or None
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
+        node.timeout = timeout
+        if hedge is not None:
+            if not isinstance(node, AsyncNode):
+                raise ValueError(f"{node.name} is not async and cannot be hedged")
+            if not isinstance(hedge, HedgePolicy):
+                hedge = HedgePolicy(delay=hedge)
+        node.hedge = hedge
+        node.semaphore = _semaphore(max_concurrency)
+        if isinstance(rate_limit, (int, float)):
+            rate_limit = RateLimiter(rate_limit)
+        node.rate_limiter = rate_limit
+        node.rate_limit_cost = rate_limit_cost
+        self._add(node)
+
+    def add_subgraph(
+        self,
+        graph: "Graph",
+        name: str,
+        flatten: bool = False,
+        max_concurrency: typing.Union[int, ConcurrencyLimit, None] = None,
+        rate_limit: typing.Union[float, RateLimiter, None] = None,
+        rate_limit_cost: typing.Optional[typing.Callable] = None,
+        timeout: typing.Optional[float] = None,
+    ):
+        """Add a graph as a node. The node's inputs are the graph's inputs, and its outputs are the graph's outputs.
+
+        The inner graph is compiled once, when it is added. By default every call of the node is a run of the inner graph,
+        with the inner graph's limits, pools and hooks. A flattened graph's nodes are copied into this graph's plan instead,
+        so they start as soon as their own inputs are ready, and use this graph's limits, pools and hooks. Their names in
+        the plan are prefixed with the name of the subgraph's GraphIO.
+
+        Args:
+            graph (Graph): the inner graph.
+            name (str): name of the node.
+            flatten (bool, optional): copy the inner graph's nodes into this graph's plan. Defaults to False.
+            max_concurrency (typing.Union[int, ConcurrencyLimit, None], optional): Maximum number of runs of the inner graph at once. Defaults to None.
+            rate_limit (typing.Union[float, RateLimiter, None], optional): Tokens per second available to runs of the inner graph. Defaults to None.
+            rate_limit_cost (typing.Optional[typing.Callable], optional): Called with the node's kwds to get the tokens a run uses. Defaults to 1 token per run.
+            timeout (typing.Optional[float], optional): Seconds a run of the inner graph may take. Defaults to None.
+
+        Raises:
+            ValueError: Raised when a limit or timeout is set for a flattened graph, or the timeout is not positive.
+        """
+        if flatten and any(
+            x is not None
+            for x in [max_concurrency, rate_limit, rate_limit_cost, timeout]
+        ):
+            raise ValueError(
+                f"{name} is flattened, so its nodes use their own limits and timeouts"
+            )
+        plan = graph.compile()
+        inputs = dict()
+        for field, _, default in plan.inputs:
+            inputs.setdefault(field, default)
+        input_dataclass = make_node_dataclass(
+            f"{name}_inputs",
+            [(k, "typing.Optional[typing.Any]", v) for k, v in inputs.items()],
+        )
+        output_dataclass = make_node_dataclass(
+            f"{name}_outputs",
+            [(field, "typing.Optional[typing.Any]", None) for field, _ in plan.outputs],
+        )
+        out_fields = [field for field, _ in plan.outputs]
+
+        async def run_subgraph(**kwds):
+            outputs = await graph._run(plan, tuple(), kwds)
+            values = tuple(getattr(outputs, field) for field in out_fields)
+            return values[0] if len(values) == 1 else values
+
+        node = SubgraphNode(
+            name=name,
+            inputs=input_dataclass,
+            func=run_subgraph,
+            outputs=output_dataclass,
+            graph=graph,
+            flatten=flatten,
+        )
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
+        node.timeout = timeout
+        node.semaphore = _semaphore(max_concurrency)
+        if isinstance(rate_limit, (int, float)):
+            rate_limit = RateLimiter(rate_limit)
+        node.rate_limiter = rate_limit
+        node.rate_limit_cost = rate_limit_cost
+        self._add(node)
+
+    def _add(self, node: NODE_TYPES):
         self.nodes[node.name] = node
+        self.plan = None
 
         # THe graph adds an attribute that tracks the use of the function, its input, and its ouput
         gio = partial(self.__node_wrapper, node)
@@ -68,158 +345,392 @@ class Graph:
                 self.add_node(func)
 
     def __plan_implicit_graph_flow(self):
-        """Use the function input and output names to generate the graph topology."""
-        graph_edges = []
-        nodes_with_inputs = set()
-        leaf_nodes = set(self.nodes.keys())
-        for node_name_0, node_0 in self.nodes.items():
-            if len(fields(node_0.inputs)) == 0:
-                # always a root
-                graph_edges.append((node_name_0, None, None))
-            else:
-                for node_name_1, node_1 in self.nodes.items():
-                    node_0_inputs = sorted([x.name for x in fields(node_0.inputs)])
-                    node_1_outputs = sorted([x.name for x in fields(node_1.outputs)])
-                    if node_name_0 != node_name_1:
-                        if node_0_inputs == node_1_outputs:
-                            # node_1 is the input to node_0
-                            graph_edges.append(
-                                (node_name_0, node_name_1, node_1_outputs)
-                            )
-                            nodes_with_inputs.add(node_name_0)
-                            if node_name_1 in leaf_nodes:
-                                leaf_nodes.remove(node_name_1)
-        # find global inputs.
-        root_node_names = [
-            x for x in list(self.nodes.keys()) if x not in nodes_with_inputs
-        ]
-        outputs = {}
-        for root_node_name in root_node_names:
-            # we get the outputs for the root nodes and then
-            # iterate over the rest until all the edges have inputs.
-            self_root_node = getattr(self, root_node_name)
-            outputs[root_node_name] = self_root_node()
-        while len(graph_edges) > 0:
-            remaining_edges = []
-            for graph_edge in graph_edges:
-                if graph_edge[1] is None:
-                    # no input node
-                    self_node = getattr(self, graph_edge[0])
-                    outputs[graph_edge[0]] = self_node()
-                elif graph_edge[1] in list(outputs.keys()):
-                    self_node = getattr(self, graph_edge[0])
-                    outputs[graph_edge[0]] = self_node(outputs[graph_edge[1]])
-                else:
-                    remaining_edges.append(graph_edge)
-            graph_edges = remaining_edges
+        """Use the function input and output names to generate the graph topology.
+
+        Each input is fed by the node with an output of the same name, so a node can read from several nodes.
+        Inputs which no other node outputs become graph inputs. Nodes whose outputs are not read are the graph outputs.
+
+        Raises:
+            Exception: Raised when more than one node outputs a field another node reads, or the nodes form a cycle.
+        """
+        # output field -> nodes producing it, built once
+        producers = dict()
+        for node_name, node in self.nodes.items():
+            for field in fields(node.outputs):
+                producers.setdefault(field.name, []).append(node_name)
+
+        sources = dict()
+        consumers = {node_name: set() for node_name in self.nodes}
+        for node_name, node in self.nodes.items():
+            sources[node_name] = dict()
+            for field in fields(node.inputs):
+                candidates = [
+                    x for x in producers.get(field.name, []) if x != node_name
+                ]
+                if len(candidates) > 1:
+                    raise Exception(
+                        f"input {field.name} of {node_name} is an output of more than one node: {candidates}. Wire the graph explicitly."
+                    )
+                elif len(candidates) == 1:
+                    sources[node_name][field.name] = candidates[0]
+                    consumers[candidates[0]].add(node_name)
+
+        # call the nodes in topological order
+        waiting_on = {
+            node_name: len(set(node_sources.values()))
+            for node_name, node_sources in sources.items()
+        }
+        ready_nodes = deque(x for x, count in waiting_on.items() if count == 0)
+        outputs = dict()
+        while ready_nodes:
+            node_name = ready_nodes.popleft()
+            self_node = getattr(self, node_name)
+            outputs[node_name] = self_node(
+                **{
+                    field: outputs[producer]
+                    for field, producer in sources[node_name].items()
+                }
+            )
+            for consumer in consumers[node_name]:
+                waiting_on[consumer] -= 1
+                if waiting_on[consumer] == 0:
+                    ready_nodes.append(consumer)
+        if len(outputs) != len(self.nodes):
+            cycle = [x for x in self.nodes if x not in outputs]
+            raise Exception(f"nodes read each other's outputs in a cycle: {cycle}")
 
-        self.outputs = [outputs[x] for x in leaf_nodes]
+        self.outputs = [outputs[x] for x in self.nodes if len(consumers[x]) == 0]
         if len(self.outputs) == 1:
             self.outputs = self.outputs[0]
 
-    async def __call__(self, *args, **kwds) -> dict[str, NodeDataClass]:
+    def compile(
+        self, outputs: typing.Union[str, typing.Iterable[str], None] = None
+    ) -> ExecutionPlan:
+        """Freeze the graph topology into an execution plan. If the graph has not been configured, use inputs/outputs to plan the graph.
+
+        The plan is reused by every call until the graph is changed. Call again after
+        modifying an aggregator that is already wired into the graph.
+
+        Args:
+            outputs (typing.Union[str, typing.Iterable[str], None], optional): only plan the nodes needed for these output fields, or the fields of a
+                named output set. The pruned plan is kept, alongside the full plan. Defaults to None (every output).
+
+        Raises:
+            ValueError: Raised when outputs names an unknown output set or output field.
+
+        Returns:
+            ExecutionPlan: the compiled plan.
+        """
+        if self.plan is None:
+            if len(self.flow.keys()) == 0:
+                # implicit graph definition
+                self.__plan_implicit_graph_flow()
+            self.plan = build_plan(
+                self.flow,
+                self.inputs,
+                self.outputs,
+                semaphore=self.semaphore,
+                process_pool=self.process_pool,
+                thread_pool=self.thread_pools.get("default"),
+                stream_buffer=self.stream_buffer,
+            )
+        if outputs is None:
+            return self.plan
+        if isinstance(outputs, str):
+            if outputs not in self.output_sets:
+                raise ValueError(f"graph has no output set named {outputs}")
+            outputs = self.output_sets[outputs]
+        return self.plan.prune(outputs)
+
+    def add_output_set(self, name: str, outputs: typing.Iterable[str]):
+        """Name a subset of the graph outputs. Calls given the name only run the nodes those outputs need.
+
+        Args:
+            name (str): name of the set.
+            outputs (typing.Iterable[str]): output fields in the set.
+        """
+        self.output_sets[name] = tuple(outputs)
+
+    def save(self, path: str):
+        """Compile the graph and write the plan to a file, so workers can load it without building the graph.
+
+        Functions are saved by import path, with a hash of their code. Limits, caches and hedges are not saved.
+
+        Args:
+            path (str): file to write.
+
+        Raises:
+            ValueError: Raised when a function cannot be imported by name (lambdas and functions defined inside others), or a subgraph is not flattened.
+            TypeError: Raised when a constant or input default is not a JSON value.
+        """
+        save_plan(self.compile(), path)
+
+    @classmethod
+    def load(cls, path: str, **kwds) -> "Graph":
+        """Create a graph running a plan written by save. Signatures and docstrings are not parsed, and no planning is done.
+
+        The graph can be run, but not changed.
+
+        Args:
+            path (str): file to read.
+            kwds: passed to Graph, e.g. max_concurrency, process_pool, thread_pools or profile.
+
+        Raises:
+            StalePlanError: Raised when a function cannot be imported, or its code has changed since the plan was saved.
+            KeyError: Raised when a node uses a thread pool which is not passed in thread_pools.
+
+        Returns:
+            Graph: the graph.
+        """
+        graph = cls(**kwds)
+        graph.plan = load_plan(
+            path,
+            semaphore=graph.semaphore,
+            process_pool=graph.process_pool,
+            thread_pools=graph.thread_pools,
+        )
+        for step in graph.plan.steps:
+            if step.aggregator is None:
+                graph.nodes[step.node.name] = step.node
+        return graph
+
+    async def __call__(
+        self,
+        *args,
+        deadline: typing.Optional[float] = None,
+        return_partial: bool = False,
+        outputs: typing.Union[str, typing.Iterable[str], None] = None,
+        **kwds,
+    ) -> dict[str, NodeDataClass]:
         """Execute the graph. If the graph has not been configured, use inputs/outputs to plan the graph.
 
+        Every call keeps its results in its own slots, so overlapping calls on the same graph do not interfere.
+
+        Positional args are matched to the graph inputs in the order they were defined. Otherwise, inputs are matched by keyword,
+        so deadline, return_partial and outputs cannot be used as graph input names.
+
+        If a node fails, the nodes still running are cancelled and the error is raised.
+
+        Args:
+            deadline (typing.Optional[float], optional): Seconds the run may take. Nodes still running then are cancelled, and nodes expected to take longer than the time left are not started. Defaults to None.
+            return_partial (bool, optional): When the deadline passes, return the outputs set so far instead of raising DeadlineExceeded. Defaults to False.
+            outputs (typing.Union[str, typing.Iterable[str], None], optional): Output fields to return, or the name of an output set. Only the nodes they need are run. Defaults to None (every output).
+
+        Raises:
+            DeadlineExceeded: Raised when the deadline passes, unless return_partial is set.
+            ValueError: Raised when outputs names an unknown output set or output field.
+
         Returns:
-            dict[str, NodeDataClass]: The output from the graph.
+            dict[str, NodeDataClass]: The output from the graph. When nodes were skipped, the "__skipped" attribute maps their names to the reason.
         """
-        if len(self.flow.keys()) == 0:
-            # implicit graph definition
-            self.__plan_implicit_graph_flow()
-
-        intermediate_results = dict()
-        if len(args) == len(self.inputs):
-            for arg, (key, val) in zip(args, self.inputs.items()):
-                if isinstance(arg, NodeDataTracker):
-                    # if the arg is a dataclass, then we use it to set the input dataclass
-                    arg_fields = sorted(arg.fields)
-                    input_fields = sorted([x.name for x in fields(val)])
-                    if arg_fields == input_fields:
-                        for input_field in input_fields:
-                            setattr(
-                                val, input_field, getattr(arg.data_class, input_field)
-                            )
-                        intermediate_results[key] = val
-                elif isinstance(arg, tuple) and arg[0] == "mr_graph_node":
-                    (_, key, val) = arg
-                    intermediate_results[key] = val
-                else:
-                    # if the arg is not a dataclass, we use the value to set the values in order.
-                    # each input must be a single value
-                    input_fields = [x.name for x in fields(val)]
-                    setattr(val, input_fields[0], arg)
-                    intermediate_results[key] = val
+        plan = self.compile(outputs)
+        return await self._run(plan, args, kwds, deadline, return_partial)
+
+    async def _run(
+        self,
+        plan: ExecutionPlan,
+        args: tuple,
+        kwds: dict,
+        deadline: typing.Optional[float] = None,
+        return_partial: bool = False,
+        memo: typing.Optional[RunMemo] = None,
+    ) -> NodeDataClass:
+        skipped = dict()
+        reused = None if memo is None else []
+        if deadline is not None:
+            deadline += asyncio.get_running_loop().time()
+        hooks = RunHooks(self.hooks, plan) if self.hooks else None
+        error = None
+        try:
+            values = await plan.execute(
+                plan.bind(args, kwds), deadline, skipped, hooks, memo, reused
+            )
+        except BaseException as err:
+            error = err
+            raise
+        finally:
+            if hooks is not None:
+                hooks.end(skipped, error)
+        outputs = plan.collect(values, skipped, reused)
+        if not return_partial and SKIPPED_DEADLINE in skipped.values():
+            raise DeadlineExceeded(skipped, outputs)
+        return outputs
+
+    async def map(
+        self,
+        inputs: typing.Union[typing.Iterable, typing.AsyncIterable],
+        max_in_flight: int = 64,
+        ordered: bool = True,
+        outputs: typing.Union[str, typing.Iterable[str], None] = None,
+    ) -> typing.AsyncIterator:
+        """Run many sets of inputs through the graph. The graph is compiled once and shared by every run.
+
+        Each item of inputs is a dict of keyword inputs, a tuple of positional inputs, or a single positional input.
+
+        Args:
+            inputs (typing.Union[typing.Iterable, typing.AsyncIterable]): input sets. Consumed lazily.
+            max_in_flight (int, optional): maximum number of runs executing at once. Defaults to 64.
+            ordered (bool, optional): yield outputs in input order. Otherwise (index, output) is yielded as each run completes. Defaults to True.
+            outputs (typing.Union[str, typing.Iterable[str], None], optional): output fields to return, or the name of an output set. Defaults to None (every output).
+
+        Raises:
+            ValueError: Raised when max_in_flight is less than 1, or outputs names an unknown output set or output field.
+
+        Yields:
+            NodeDataClass: The output from each run, or (int, NodeDataClass) when not ordered.
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        plan = self.compile(outputs)
+        if hasattr(inputs, "__aiter__"):
+            source = inputs.__aiter__()
         else:
-            # number of args does not match. we use kwargs now.
-            for g_input_name, g_input_dataclass in self.inputs.items():
-                # here we check the input fields
-                g_input_dc_field_name = fields(g_input_dataclass)
-                if g_input_dc_field_name[0].name in kwds.keys():
-                    #  if the keywords match, use the keyword
-                    setattr(
-                        g_input_dataclass,
-                        g_input_dc_field_name[0].name,
-                        kwds[g_input_dc_field_name[0].name],
-                    )
-                intermediate_results[g_input_name] = g_input_dataclass
-
-        for node_name, node in self.flow.items():
-            # these are the outputs for the flow nodes
-            intermediate_results[node_name] = node.output
-
-        processing_nodes = True
-        completed_tasks = []
-        running_coroutines = {}
-        while processing_nodes:
-            # We iterate over all of the nodes and run any that are ready to be ran.
-            # If we find that no more nodes can be executed, we quit.
-            # todo: add WARNING if some nodes are not executed.
-            # todo: add limits in case of loops
-            processing_nodes = False
-            for step_graphio in self.flow.values():
-                step_kwds = self._check_if_ready_to_run(
-                    intermediate_results, step_graphio.inputs
-                )
-                if (
-                    (step_kwds is not None)
-                    and (step_graphio.name not in completed_tasks)
-                    and (step_graphio.name not in running_coroutines)
-                ):
-                    processing_nodes = True
-                    if iscoroutinefunction(step_graphio.node.func):
-                        running_coroutines[step_graphio.name] = asyncio.create_task(
-                            step_graphio.node(**step_kwds)
-                        )
-                    else:
-                        running_coroutines[step_graphio.name] = asyncio.create_task(
-                            asyncio.to_thread(step_graphio.node, **step_kwds)
-                        )
-                    await asyncio.sleep(0)
-            await asyncio.sleep(0)
-            for task_name, task in running_coroutines.items():
-                if task.done() and (task_name not in completed_tasks):
-                    step_value = task.result()
-                    ks = list(asdict(intermediate_results[task_name]).keys())
-                    if len(ks) > 1:
-                        for i, k in enumerate(ks):
-                            setattr(
-                                intermediate_results[task_name], str(k), step_value[i]
-                            )
+            source = _aiter(inputs)
+
+        running = dict()
+        in_order = deque()
+        exhausted = False
+        n_started = 0
+        try:
+            while True:
+                while not exhausted and len(running) < max_in_flight:
+                    try:
+                        item = await source.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    if isinstance(item, dict):
+                        args, kwds = tuple(), item
+                    elif isinstance(item, tuple):
+                        args, kwds = item, dict()
                     else:
-                        setattr(intermediate_results[task_name], str(ks[0]), step_value)
-                    completed_tasks.append(task_name)
-                    processing_nodes = True
-            if len(completed_tasks) < len(running_coroutines):
-                # still waiting for a return value
-                processing_nodes = True
-
-        for node, field in self.outputs.field_map.items():
-            setattr(
-                self.outputs.data_class,
-                field,
-                getattr(intermediate_results[node], field),
+                        args, kwds = (item,), dict()
+                    task = asyncio.create_task(self._run(plan, args, kwds))
+                    running[task] = n_started
+                    n_started += 1
+                    if ordered:
+                        in_order.append(task)
+                if not running:
+                    break
+                if ordered:
+                    # finished runs keep their place in flight until every earlier run is yielded
+                    task = in_order.popleft()
+                    await asyncio.wait([task])
+                    running.pop(task)
+                    yield task.result()
+                else:
+                    done, _ = await asyncio.wait(
+                        running.keys(), return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        yield running.pop(task), task.result()
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def batch(
+        self,
+        inputs: typing.Union[typing.Iterable, typing.AsyncIterable],
+        max_in_flight: int = 64,
+        outputs: typing.Union[str, typing.Iterable[str], None] = None,
+    ) -> list[NodeDataClass]:
+        """Run many sets of inputs through the graph and return the outputs in input order.
+
+        Args:
+            inputs (typing.Union[typing.Iterable, typing.AsyncIterable]): input sets, as accepted by map.
+            max_in_flight (int, optional): maximum number of runs executing at once. Defaults to 64.
+            outputs (typing.Union[str, typing.Iterable[str], None], optional): output fields to return, or the name of an output set. Defaults to None (every output).
+
+        Returns:
+            list[NodeDataClass]: The output from each run.
+        """
+        return [
+            x
+            async for x in self.map(
+                inputs, max_in_flight=max_in_flight, outputs=outputs
             )
-        return self.outputs.data_class
+        ]
+
+    def incremental(self, compare: str = IDENTITY) -> "IncrementalGraph":
+        """Run the graph repeatedly, calling only the nodes whose inputs changed since the previous run.
+
+        Args:
+            compare (str, optional): how values are compared with the previous run, "identity" or "hash". Defaults to "identity".
+
+        Raises:
+            ValueError: Raised when compare is not "identity" or "hash".
+
+        Returns:
+            IncrementalGraph: call it like the graph.
+        """
+        return IncrementalGraph(self, compare)
+
+    def thread_pool_stats(self) -> dict[str, PoolStats]:
+        """Queue depth and utilisation of each of the graph's thread pools.
+
+        Returns:
+            dict[str, PoolStats]: stats by pool name.
+        """
+        return {name: pool.stats() for name, pool in self.thread_pools.items()}
+
+    def cache_stats(self) -> dict[str, CacheStats]:
+        """Hit and miss counters for each cached node.
+
+        Returns:
+            dict[str, CacheStats]: stats by node name.
+        """
+        return {
+            name: node.cache.stats()
+            for name, node in self.nodes.items()
+            if node.cache is not None
+        }
+
+    def add_hooks(self, hooks: GraphHooks):
+        """Call hooks as runs and nodes start and end. Runs cost nothing extra while no hooks are added.
+
+        Args:
+            hooks (GraphHooks): hooks to call.
+        """
+        self.hooks = self.hooks + [hooks]
+
+    def remove_hooks(self, hooks: GraphHooks):
+        """Stop calling hooks added with add_hooks.
+
+        Args:
+            hooks (GraphHooks): hooks to remove.
+
+        Raises:
+            ValueError: Raised when the hooks were not added.
+        """
+        hooks_list = list(self.hooks)
+        hooks_list.remove(hooks)
+        self.hooks = hooks_list
+        if hooks is self.profiler:
+            self.profiler = None
+
+    def hedge_stats(self) -> dict[str, HedgeStats]:
+        """How often duplicate calls were started and won, for each hedged node.
+
+        Returns:
+            dict[str, HedgeStats]: stats by node name.
+        """
+        return {
+            name: node.hedge.stats()
+            for name, node in self.nodes.items()
+            if node.hedge is not None
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes and threads used by the graph. They are restarted if the graph is called again.
+
+        An executor passed as process_pool is left running.
+
+        Args:
+            wait (bool, optional): wait for running calls to finish. Defaults to True.
+        """
+        self.process_pool.shutdown(wait=wait)
+        for pool in self.thread_pools.values():
+            pool.shutdown(wait=wait)
 
     def __node_wrapper(self, node: NODE_TYPES, *args, **kwds) -> NodeDataTracker:
         """Wraps the node entity to enable tracking inputs and outputs.
@@ -238,8 +749,48 @@ class Graph:
                 logging.warning(f"Adding inputs node:({gio.name}) missing:{field}")
 
         self.flow[gio.name] = gio
+        self.plan = None
         return NodeDataTracker(gio.output)
 
+    def map_node(
+        self,
+        func: typing.Union[str, typing.Callable],
+        over: str,
+        *args,
+        max_concurrency: int = 64,
+        **kwds,
+    ) -> NodeDataTracker:
+        """Call a node once for each item of a list-valued input. The number of calls is known only when the graph runs.
+
+        The other inputs are wired as for a normal call of the node, and are the same for every item.
+        Each output of the mapped node is a list with a value per item, in item order. The node's limits, cache,
+        timeout and hedge apply to each call, and a failed call cancels the others.
+
+        Args:
+            func (typing.Union[str, typing.Callable]): the node, or its name. Functions which are not nodes yet are added.
+            over (str): the input holding the items.
+            max_concurrency (int, optional): maximum number of calls running at once, in each run. Defaults to 64.
+
+        Raises:
+            ValueError: Raised when over is not an input of the node, max_concurrency is less than 1, or the node is a generator.
+
+        Returns:
+            NodeDataTracker: Output from the mapped node.
+        """
+        if not isinstance(func, str):
+            if func.__name__ not in self.nodes:
+                self.add_node(func)
+            func = func.__name__
+        node = self.nodes[func]
+        if isinstance(node, StreamNode):
+            raise ValueError(f"{node.name} is a generator and cannot be mapped")
+        if over not in [x.name for x in fields(node.inputs)]:
+            raise ValueError(f"{over} is not an input of {node.name}")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        mapped = MappedNode(node, over, max_concurrency)
+        return self.__node_wrapper(mapped, *args, **kwds)
+
     def input(
         self,
         name: str = None,
@@ -257,59 +808,102 @@ class Graph:
             NodeDataTracker: Dataclass for the input.
         """
         new_node_name = f"graph_input_{str(uuid())}"
-        input_dataclass = make_dataclass(
-            new_node_name,
-            [
-                (
-                    name,
-                    f"typing.Optional[{d_type}]",
-                    Field(default=default_value, init=False),
-                )
-            ],
-            bases=(NodeDataClass,),
-            init=False,
+        input_dataclass = make_node_dataclass(
+            new_node_name, [(name, f"typing.Optional[{d_type}]", default_value)]
         )
         i = input_dataclass()
         setattr(i, "__node_name", new_node_name)
         self.inputs[new_node_name] = i
+        self.plan = None
         return NodeDataTracker(i)
 
-    def aggregator(self, name: str):
-        nda = NodeDataAggregator(name)
+    def aggregator(
+        self,
+        name: str,
+        reduce: typing.Optional[typing.Callable] = None,
+        initial: typing.Optional[typing.Callable] = None,
+        ordered: bool = True,
+        partial: bool = False,
+    ) -> NodeDataAggregator:
+        """Collect values from many nodes into one input (fan-in). Add values with +=.
+
+        Values are added as the nodes producing them finish, and are not kept once added unless something else reads them.
+
+        Args:
+            name (str): name of the aggregated value.
+            reduce (typing.Optional[typing.Callable], optional): called with the running result and the next value, returns the new running result. Defaults to None (a list of the values).
+            initial (typing.Optional[typing.Callable], optional): creates the first running result at the start of each run, e.g. int or dict. Defaults to the first value.
+            ordered (bool, optional): add values in the order they were added to the aggregator, rather than the order the nodes finish. Defaults to True.
+            partial (bool, optional): streaming (generator) consumers start straight away and get each value, or running result, as it arrives. Defaults to False.
+
+        Returns:
+            NodeDataAggregator: the aggregator.
+        """
+        nda = NodeDataAggregator(
+            name, reduce=reduce, initial=initial, ordered=ordered, partial=partial
+        )
         self.flow[nda.name] = nda
+        self.plan = None
         return nda
 
-    def _check_if_ready_to_run(
-        self, cached_results, input_dict
-    ) -> typing.Optional[dict[str, tuple[str, str]]]:
-        step_kwds = dict()
-        for input_kwd, (input_node_id, input_node_kwd) in input_dict.items():
-            if input_node_id is not None and (
-                asdict(cached_results[input_node_id])[input_node_kwd] is None
-            ):
-                return None
-            elif input_node_id is None:
-                if isinstance(input_node_kwd, NodeDataAggregator):
-                    node_agg_data = self._check_if_ready_to_run(
-                        cached_results, input_node_kwd.inputs
-                    )
-                    if len(node_agg_data) > 0:
-                        step_kwds[input_kwd] = input_node_kwd(node_agg_data)
-                    else:
-                        return None
-                elif isinstance(input_node_kwd, NodeDataTracker):
-                    if len(input_node_kwd.fields) == 1:
-                        node_name = getattr(input_node_kwd, "__node_name")
-                        field = input_node_kwd.fields[0]
-                        v = asdict(input_node_kwd[node_name])[field]
-                        if v is not None:
-                            step_kwds[input_kwd] = v
-                        else:
-                            return None
-                else:
-                    step_kwds[input_kwd] = input_node_kwd
-            else:
-                step_kwds[input_kwd] = asdict(cached_results[input_node_id])[
-                    input_node_kwd
-                ]
-        return step_kwds
+
+class IncrementalGraph:
+    """Runs a graph again and again, keeping each run's values so the next only calls the nodes whose inputs changed.
+
+    Made by Graph.incremental. Calls on an event loop are run one at a time, each compared with the one before. Each output has a
+    "__reused" attribute listing the nodes whose values were kept from the previous run.
+
+    Attributes:
+        graph (Graph): the graph being run.
+        memo (RunMemo): values kept from the previous run.
+    """
+
+    graph: Graph
+    memo: RunMemo
+
+    def __init__(self, graph: Graph, compare: str = IDENTITY):
+        self.graph = graph
+        self.memo = RunMemo(compare)
+        self._plan = None
+        self._locks = PerLoop(asyncio.Lock)
+
+    async def __call__(
+        self,
+        *args,
+        deadline: typing.Optional[float] = None,
+        return_partial: bool = False,
+        outputs: typing.Union[str, typing.Iterable[str], None] = None,
+        **kwds,
+    ) -> NodeDataClass:
+        """Execute the graph, reusing the outputs of nodes whose inputs have not changed. Arguments are as for Graph.__call__.
+
+        Everything runs again once the graph has been changed and recompiled, or a different set of outputs is asked for.
+
+        Returns:
+            NodeDataClass: The output from the graph.
+        """
+        plan = self.graph.compile(outputs)
+        async with self._locks.get():
+            if plan is not self._plan:
+                self.memo.clear()
+                self._plan = plan
+            return await self.graph._run(
+                plan, args, kwds, deadline, return_partial, self.memo
+            )
+
+    def reset(self):
+        """Forget the previous run, so the next calls every node."""
+        self.memo.clear()
+
+
+async def _aiter(items: typing.Iterable) -> typing.AsyncIterator:
+    for item in items:
+        yield item
+
+
+def _semaphore(
+    limit: typing.Union[int, asyncio.Semaphore, ConcurrencyLimit, None],
+) -> typing.Union[asyncio.Semaphore, ConcurrencyLimit, None]:
+    if limit is None or isinstance(limit, (asyncio.Semaphore, ConcurrencyLimit)):
+        return limit
+    return ConcurrencyLimit(limit)
@@ -1,6 +1,6 @@
 from mr_graph.node import NODE_TYPES, NodeDataClass
 from uuid import uuid4 as uuid
-from dataclasses import fields, asdict
+from dataclasses import fields
 import logging
 from mr_graph.node_data_tracker import NodeDataTracker
 from mr_graph.node_data_aggregator import NodeDataAggregator
@@ -59,7 +59,7 @@ class GraphIO:
                     )
                 elif isinstance(dc, tuple) and dc[0] == "mr_graph_node":
                     (_, key, val) = dc
-                    self.inputs[node_input_fields[indx]] = (key, val)
+                    self.inputs[kwd] = (key, val)
                 else:
                     # some constant passed
                     self.inputs[kwd] = (None, dc)
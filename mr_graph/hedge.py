@@ -0,0 +1,172 @@
+import asyncio
+import time
+import typing
+from collections import deque
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class HedgeStats:
+    """Counters for a HedgePolicy.
+
+    Attributes:
+        calls (int): calls made through the policy.
+        hedges (int): duplicate calls started.
+        wins (int): duplicate calls which finished before the original.
+        delay (float, optional): current delay before a duplicate is started.
+    """
+
+    calls: int
+    hedges: int
+    wins: int
+    delay: typing.Optional[float]
+
+
+class HedgePolicy:
+    """Starts a duplicate call when the first one is slow, and keeps whichever finishes first.
+
+    Only for idempotent async functions. The loser is cancelled.
+
+    The delay is either fixed, or a percentile of the latencies seen recently. Until enough
+    latencies have been seen, the fixed delay is used (or no duplicate is started if there is none).
+
+    Attributes:
+        delay (float, optional): seconds to wait before starting a duplicate.
+        percentile (float, optional): use this percentile (0-100) of recent latencies as the delay.
+        max_extra (float): largest fraction of calls which may be duplicated.
+        window (int): number of recent latencies kept for the percentile.
+        min_samples (int): latencies needed before the percentile is used.
+    """
+
+    delay: typing.Optional[float]
+    percentile: typing.Optional[float]
+    max_extra: float
+    window: int
+    min_samples: int
+
+    def __init__(
+        self,
+        delay: typing.Optional[float] = None,
+        percentile: typing.Optional[float] = None,
+        max_extra: float = 0.1,
+        window: int = 1000,
+        min_samples: int = 20,
+    ):
+        """Configure the policy.
+
+        Args:
+            delay (typing.Optional[float], optional): seconds to wait before starting a duplicate. Defaults to None.
+            percentile (typing.Optional[float], optional): percentile (0-100) of recent latencies to wait before starting a duplicate. Defaults to None.
+            max_extra (float, optional): largest fraction of calls which may be duplicated. Defaults to 0.1.
+            window (int, optional): number of recent latencies kept. Defaults to 1000.
+            min_samples (int, optional): latencies needed before the percentile is used. Defaults to 20.
+
+        Raises:
+            ValueError: Raised when neither delay nor percentile is given, or a value is out of range.
+        """
+        if delay is None and percentile is None:
+            raise ValueError("a hedge needs a delay or a percentile")
+        if delay is not None and delay < 0:
+            raise ValueError("delay must not be negative")
+        if percentile is not None and not 0 < percentile < 100:
+            raise ValueError("percentile must be between 0 and 100")
+        if not 0 <= max_extra <= 1:
+            raise ValueError("max_extra must be between 0 and 1")
+        self.delay = delay
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.window = window
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self.reset_stats()
+
+    def current_delay(self) -> typing.Optional[float]:
+        """Seconds to wait before starting a duplicate call.
+
+        Returns:
+            typing.Optional[float]: the delay, or None when no duplicate should be started.
+        """
+        if self.percentile is not None and len(self._latencies) >= self.min_samples:
+            latencies = sorted(self._latencies)
+            index = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100))
+            return latencies[index]
+        return self.delay
+
+    async def run(
+        self,
+        start: typing.Callable[[], typing.Awaitable],
+        ready: typing.Optional[asyncio.Event] = None,
+    ) -> typing.Any:
+        """Await start(), starting it a second time if the first call is slow.
+
+        Args:
+            start (typing.Callable[[], typing.Awaitable]): starts a call. Called once or twice.
+            ready (typing.Optional[asyncio.Event], optional): set by the first call once it is running, e.g. after waiting
+                for a concurrency limit. The delay and the latency are measured from then. Defaults to None, from the first call.
+
+        Raises:
+            Exception: the error from the call, when every call started failed.
+
+        Returns:
+            typing.Any: the result of the first call to succeed.
+        """
+        self._calls += 1
+        first = asyncio.ensure_future(start())
+        tasks = {first}
+        try:
+            if ready is not None and not ready.is_set():
+                # time spent queuing for limits is not slowness, and must not start a duplicate
+                waiting = asyncio.ensure_future(ready.wait())
+                try:
+                    await asyncio.wait(
+                        {first, waiting}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    waiting.cancel()
+            started = time.perf_counter()
+            delay = self.current_delay()
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and self._hedges < self.max_extra * self._calls:
+                    self._hedges += 1
+                    tasks.add(asyncio.ensure_future(start()))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        # when the duplicate wins, this is a lower bound on the original's latency
+                        self._latencies.append(time.perf_counter() - started)
+                        if task is not first:
+                            self._wins += 1
+                        return task.result()
+                    if error is None:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> HedgeStats:
+        """How often duplicates were started and won.
+
+        Returns:
+            HedgeStats: current counters.
+        """
+        return HedgeStats(
+            calls=self._calls,
+            hedges=self._hedges,
+            wins=self._wins,
+            delay=self.current_delay(),
+        )
+
+    def reset_stats(self):
+        """Zero the counters. Recent latencies are kept."""
+        self._calls = 0
+        self._hedges = 0
+        self._wins = 0
+
+    def __repr__(self) -> str:
+        return f"HedgePolicy(delay={self.delay}, percentile={self.percentile}, max_extra={self.max_extra})"
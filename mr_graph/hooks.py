@@ -0,0 +1,187 @@
+import itertools
+import time
+import typing
+
+
+class GraphHooks:
+    """Base class for execution hooks. Override the calls you need and add an instance with Graph.add_hooks.
+
+    Hooks are called on the event loop, so they should return quickly. Times are time.perf_counter() values.
+    Every call gets the run number, and node calls get the node name and the id of the GraphIO (the plan step) being run.
+    """
+
+    def on_run_start(self, run: int, plan: typing.Any, started: float):
+        """A run of the graph is starting.
+
+        Args:
+            run (int): run number.
+            plan (ExecutionPlan): the plan being run.
+            started (float): when the run started.
+        """
+
+    def on_node_ready(self, run: int, node: str, step: str, ready: float):
+        """Every input of a node is available.
+
+        Args:
+            run (int): run number.
+            node (str): node name.
+            step (str): GraphIO id.
+            ready (float): when the node became ready.
+        """
+
+    def on_node_start(
+        self, run: int, node: str, step: str, ready: float, started: float
+    ):
+        """A node is being called, after any concurrency or rate limit.
+
+        Args:
+            run (int): run number.
+            node (str): node name.
+            step (str): GraphIO id.
+            ready (float): when the node became ready.
+            started (float): when the call started.
+        """
+
+    def on_node_end(
+        self,
+        run: int,
+        node: str,
+        step: str,
+        ready: float,
+        started: float,
+        finished: float,
+        cache_hit: bool,
+    ):
+        """A node returned.
+
+        Args:
+            run (int): run number.
+            node (str): node name.
+            step (str): GraphIO id.
+            ready (float): when the node became ready.
+            started (float): when the call started.
+            finished (float): when the result was available.
+            cache_hit (bool): the result came from the node's cache.
+        """
+
+    def on_node_error(
+        self,
+        run: int,
+        node: str,
+        step: str,
+        ready: float,
+        started: float,
+        finished: float,
+        error: BaseException,
+    ):
+        """A node raised an error.
+
+        Args:
+            run (int): run number.
+            node (str): node name.
+            step (str): GraphIO id.
+            ready (float): when the node became ready.
+            started (float): when the call started.
+            finished (float): when the error was raised.
+            error (BaseException): the error.
+        """
+
+    def on_run_end(
+        self,
+        run: int,
+        started: float,
+        finished: float,
+        skipped: dict,
+        error: typing.Optional[BaseException],
+    ):
+        """A run of the graph has finished.
+
+        Args:
+            run (int): run number.
+            started (float): when the run started.
+            finished (float): when the run finished.
+            skipped (dict): step name -> reason, for the steps which did not run.
+            error (typing.Optional[BaseException]): the error which stopped the run, if any.
+        """
+
+
+_run_numbers = itertools.count()
+
+
+class RunHooks:
+    """Calls a graph's hooks during one run. Created by the graph only when hooks are registered.
+
+    Attributes:
+        run (int): run number.
+        started (float): when the run started.
+    """
+
+    run: int
+    started: float
+
+    def __init__(self, hooks: list, plan: typing.Any):
+        """Start a run.
+
+        Args:
+            hooks (list[GraphHooks]): hooks to call.
+            plan (ExecutionPlan): the plan being run.
+        """
+        self.run = next(_run_numbers)
+        self.started = time.perf_counter()
+        self._hooks = hooks
+        self._steps = plan.steps
+        self._ready = [None] * len(plan.steps)
+        self._started = [None] * len(plan.steps)
+        for hook in hooks:
+            hook.on_run_start(self.run, plan, self.started)
+
+    def ready(self, index: int):
+        now = time.perf_counter()
+        self._ready[index] = now
+        step = self._steps[index]
+        for hook in self._hooks:
+            hook.on_node_ready(self.run, step.node.name, step.name, now)
+
+    def start(self, index: int):
+        now = time.perf_counter()
+        self._started[index] = now
+        step = self._steps[index]
+        for hook in self._hooks:
+            hook.on_node_start(
+                self.run, step.node.name, step.name, self._ready[index], now
+            )
+
+    def finish(self, index: int, cache_hit: bool = False):
+        now = time.perf_counter()
+        step = self._steps[index]
+        started = self._started[index] or now
+        for hook in self._hooks:
+            hook.on_node_end(
+                self.run,
+                step.node.name,
+                step.name,
+                self._ready[index],
+                started,
+                now,
+                cache_hit,
+            )
+
+    def fail(self, index: int, error: BaseException):
+        now = time.perf_counter()
+        step = self._steps[index]
+        started = self._started[index] or now
+        for hook in self._hooks:
+            hook.on_node_error(
+                self.run,
+                step.node.name,
+                step.name,
+                self._ready[index],
+                started,
+                now,
+                error,
+            )
+
+    def end(self, skipped: dict, error: typing.Optional[BaseException] = None):
+        now = time.perf_counter()
+        for hook in self._hooks:
+            hook.on_run_end(self.run, self.started, now, skipped, error)
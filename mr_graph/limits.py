@@ -0,0 +1,140 @@
+import asyncio
+import threading
+import time
+import typing
+import weakref
+from functools import partial
+
+
+class PerLoop:
+    """One asyncio primitive (lock, semaphore...) per event loop, made the first time it is used in that loop.
+
+    asyncio primitives belong to the loop they are first used in. Graphs are often built once and run by
+    several loops, e.g. a worker calling asyncio.run for every request, so limits keep one per loop.
+    """
+
+    def __init__(self, factory: typing.Callable[[], typing.Any]):
+        """Make nothing until a loop asks for it.
+
+        Args:
+            factory (typing.Callable[[], typing.Any]): makes the primitive for a new loop.
+        """
+        self._factory = factory
+        self._by_loop = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def get(self) -> typing.Any:
+        """The primitive for the running event loop."""
+        loop = asyncio.get_running_loop()
+        value = self._by_loop.get(loop)
+        if value is None:
+            with self._lock:
+                value = self._by_loop.setdefault(loop, self._factory())
+        return value
+
+
+class ConcurrencyLimit:
+    """Limits how many calls run at once. Used like an asyncio.Semaphore, and can be used from any event loop.
+
+    Shared by every run of the graph on a loop, so the limit holds across concurrent calls. Each event loop has its own count.
+
+    Attributes:
+        limit (int): calls allowed to run at once.
+    """
+
+    limit: int
+
+    def __init__(self, limit: int):
+        """Allow limit calls at once.
+
+        Args:
+            limit (int): calls allowed to run at once.
+
+        Raises:
+            ValueError: Raised when limit is less than 1.
+        """
+        if limit < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.limit = limit
+        self._semaphores = PerLoop(partial(asyncio.Semaphore, limit))
+
+    async def __aenter__(self):
+        await self._semaphores.get().acquire()
+
+    async def __aexit__(self, *exc_info):
+        self._semaphores.get().release()
+
+    def __repr__(self) -> str:
+        return f"ConcurrencyLimit({self.limit})"
+
+
+class RateLimiter:
+    """Token bucket used to limit how often a node is started.
+
+    Shared by every run of the graph, so the limit holds across concurrent calls, including calls on different event loops.
+
+    Attributes:
+        rate (float): tokens added to the bucket per second.
+        capacity (float): maximum number of tokens held by the bucket, i.e. the largest burst.
+        tokens (float): tokens currently available.
+    """
+
+    rate: float
+    capacity: float
+    tokens: float
+
+    def __init__(self, rate: float, capacity: typing.Optional[float] = None):
+        """Create a full bucket.
+
+        Args:
+            rate (float): tokens added per second.
+            capacity (typing.Optional[float], optional): largest burst. Defaults to one second of tokens (at least 1).
+
+        Raises:
+            ValueError: Raised when rate or capacity is not positive.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity is None:
+            capacity = max(1.0, rate)
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        # waiters on a loop queue on that loop's lock, the bucket itself is shared
+        self._locks = PerLoop(asyncio.Lock)
+        self._bucket_lock = threading.Lock()
+
+    def _take(self, tokens: float) -> float:
+        """Take tokens if there are enough, otherwise return the seconds until there will be."""
+        with self._bucket_lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1):
+        """Wait until tokens are available and take them. Waiters are served in order.
+
+        Args:
+            tokens (float, optional): tokens to take. Requests larger than the capacity wait for a full bucket. Defaults to 1.
+        """
+        tokens = min(tokens, self.capacity)
+        async with self._locks.get():
+            wait = self._take(tokens)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._take(tokens)
+
+    def __repr__(self) -> str:
+        return f"RateLimiter(rate={self.rate}, capacity={self.capacity})"
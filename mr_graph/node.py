@@ -1,10 +1,20 @@
+import dataclasses
 import typing
+import weakref
 from abc import ABC
-from pydantic import Field
-from inspect import signature, iscoroutinefunction
-from dataclasses import make_dataclass
+from inspect import (
+    signature,
+    iscoroutinefunction,
+    isasyncgenfunction,
+    isgeneratorfunction,
+)
+from mr_graph.cache import NodeCache
+from mr_graph.executors import ThreadPool
+from mr_graph.hedge import HedgePolicy
+from mr_graph.limits import ConcurrencyLimit, RateLimiter
 from mr_graph.node_data_class import (
     NodeDataClass,
+    make_node_dataclass,
     parse_annotation,
     parse_default,
     parse_doc,
@@ -19,6 +29,14 @@ class NodeBase(ABC):
         inputs (typing.Callable, optional): a function to create a dataclass which will be used as input for the function.
         func (typing.Callable): The function to be called for this node in the graph.
         outputs (typing.Callable, optional): a function to create a dataclass which will be used to create an output for the function.
+        semaphore (ConcurrencyLimit, optional): limits how many calls of the node run at once, across every run of the graph.
+        rate_limiter (RateLimiter, optional): limits how often the node is started.
+        rate_limit_cost (typing.Callable, optional): called with the node's kwds to get the tokens a call takes from rate_limiter. Each call takes 1 token when not set.
+        executor (str, optional): where a blocking function runs: "inline", "thread" or "process". Defaults to a thread.
+        thread_pool (ThreadPool, optional): pool used when the function runs in a thread. Defaults to the graph's default pool.
+        cache (NodeCache, optional): stores results by input, for pure functions.
+        timeout (float, optional): seconds a call may take before it is cancelled.
+        hedge (HedgePolicy, optional): starts a duplicate call when the first is slow. Async functions only.
 
     Args:
         ABC: Abstract base class.
@@ -28,6 +46,14 @@ class NodeBase(ABC):
     inputs: typing.Optional[typing.Callable]
     func: typing.Callable
     outputs: typing.Optional[typing.Callable]
+    semaphore: typing.Optional[ConcurrencyLimit] = None
+    rate_limiter: typing.Optional[RateLimiter] = None
+    rate_limit_cost: typing.Optional[typing.Callable] = None
+    executor: typing.Optional[str] = None
+    thread_pool: typing.Optional[ThreadPool] = None
+    cache: typing.Optional[NodeCache] = None
+    timeout: typing.Optional[float] = None
+    hedge: typing.Optional[HedgePolicy] = None
 
     def __init__(self, name, inputs, func, outputs):
         self.name = name
@@ -74,39 +100,170 @@ class AsyncNode(NodeBase):
         return await self.func(*args, **kwds)
 
 
-NODE_TYPES = typing.Union[AsyncNode, SyncNode]
+class StreamNode(NodeBase):
+    """For generator functions (sync or async). Items are passed downstream as they are yielded.
+
+    Attributes:
+        asynchronous (bool): True for async generators, False for generators which run in a thread.
+
+    Args:
+        NodeBase: Inherited class
+    """
+
+    asynchronous: bool
+
+    def __init__(self, *args, asynchronous: bool = True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.asynchronous = asynchronous
+
+    def __call__(self, *args: typing.Any, **kwds: typing.Any) -> typing.Iterator:
+        return self.func(*args, **kwds)
+
+
+class SubgraphNode(AsyncNode):
+    """For graphs used as a node of another graph. The inner graph's inputs and outputs are the node's inputs and outputs.
+
+    The inner graph is compiled, and its flow captured, when it is added. Later changes to it are not seen by the node.
+
+    Attributes:
+        graph (Graph): the inner graph.
+        flatten (bool): copy the inner graph's nodes into the plan of the graph using it, instead of running the inner graph as one call.
+        flow (dict[str, GraphIO]): the inner graph's flow when it was added.
+        graph_inputs (dict[str, NodeDataClass]): the inner graph's inputs when it was added.
+        graph_outputs (NodeDataTracker): the inner graph's outputs when it was added.
+
+    Args:
+        AsyncNode: Inherited class
+    """
+
+    graph: typing.Any
+    flatten: bool
+    flow: dict
+    graph_inputs: dict
+    graph_outputs: typing.Any
+
+    def __init__(self, *args, graph: typing.Any, flatten: bool = False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.graph = graph
+        self.flatten = flatten
+        self.flow = dict(graph.flow)
+        self.graph_inputs = dict(graph.inputs)
+        self.graph_outputs = graph.outputs
+
+
+class MappedNode(NodeBase):
+    """For a node called once for each item of one of its inputs. Each output is a list, with a value per item.
+
+    The node's settings (executor, limits, cache, timeout, hedge) apply to each call.
+
+    Attributes:
+        node (NODE_TYPES): the node being mapped.
+        over (str): the input holding the items.
+        max_concurrency (int): maximum number of calls running at once, in each run of the mapped node.
+
+    Args:
+        NodeBase: Inherited class
+    """
+
+    node: typing.Any
+    over: str
+    max_concurrency: int
+
+    def __init__(self, node: NodeBase, over: str, max_concurrency: int):
+        outputs = make_node_dataclass(
+            f"{node.name}_mapped_outputs",
+            [
+                (x.name, "typing.Optional[list[typing.Any]]", None)
+                for x in dataclasses.fields(node.outputs)
+            ],
+        )
+        super().__init__(
+            name=node.name, inputs=node.inputs, func=node.func, outputs=outputs
+        )
+        self.node = node
+        self.over = over
+        self.max_concurrency = max_concurrency
+
+
+NODE_TYPES = typing.Union[AsyncNode, SyncNode, StreamNode]
 """Typing.Union for all valid node types
 """
 
 
-def build_node(func: typing.Callable) -> NODE_TYPES:
-    """Generate a node. Can be ASync or blocking depending on the method.
+_node_specs = weakref.WeakKeyDictionary()
+"""Input and output dataclasses built for each function, reused while the function's code, docstring, defaults and annotations are unchanged.
+"""
+
+
+def _node_spec(func: typing.Callable) -> tuple[type, type]:
+    """Build (or reuse) the input and output dataclasses for a function.
 
     Args:
         func (typing.Callable): The function used in the node.
 
     Returns:
-        NODE_TYPES: Any valid node type. Determined by the function that's being wrapped.
+        tuple[type, type]: input and output dataclasses.
     """
+    version = (
+        getattr(func, "__code__", None),
+        func.__doc__,
+        getattr(func, "__defaults__", None),
+        getattr(func, "__kwdefaults__", None),
+        getattr(func, "__annotations__", None),
+    )
+    try:
+        cached = _node_specs.get(func)
+    except TypeError:
+        # not weakly referenceable or not hashable
+        cached = None
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
     name = func.__name__
     sig = signature(func)
     inputs = [
         (
             k,
             f"typing.Optional[{parse_annotation(str(v.annotation))}]",
-            Field(default=parse_default(str(v))),
+            parse_default(str(v)),
         )
         for k, v in sig.parameters.items()
     ]
-    input_dataclass = make_dataclass(
-        f"{name}_inputs", inputs, bases=(NodeDataClass,), init=False
-    )
+    input_dataclass = make_node_dataclass(f"{name}_inputs", inputs)
     outputs = parse_doc(func)
-    output_dataclass = make_dataclass(
-        f"{name}_outputs", outputs, bases=(NodeDataClass,), init=False
-    )
+    output_dataclass = make_node_dataclass(f"{name}_outputs", outputs)
+    spec = (input_dataclass, output_dataclass)
+    if version[0] is not None:
+        try:
+            _node_specs[func] = (version, spec)
+        except TypeError:
+            pass
+    return spec
+
+
+def build_node(func: typing.Callable) -> NODE_TYPES:
+    """Generate a node. Can be ASync, blocking or streaming (a generator) depending on the method.
+
+    The dataclasses describing the function are cached, so building a node for the same function again is cheap.
 
-    if iscoroutinefunction(func):
+    Args:
+        func (typing.Callable): The function used in the node.
+
+    Returns:
+        NODE_TYPES: Any valid node type. Determined by the function that's being wrapped.
+    """
+    name = func.__name__
+    input_dataclass, output_dataclass = _node_spec(func)
+
+    if isasyncgenfunction(func) or isgeneratorfunction(func):
+        return StreamNode(
+            func=func,
+            name=name,
+            inputs=input_dataclass,
+            outputs=output_dataclass,
+            asynchronous=isasyncgenfunction(func),
+        )
+    elif iscoroutinefunction(func):
         return AsyncNode(
             func=func, name=name, inputs=input_dataclass, outputs=output_dataclass
         )
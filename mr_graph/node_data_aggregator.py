@@ -1,18 +1,53 @@
 from uuid import uuid4 as uuid
-from mr_graph.node_data_class import NodeDataClass
+from mr_graph.node_data_class import NodeDataClass, make_node_dataclass
 from mr_graph.node import SyncNode
 import typing
-from dataclasses import make_dataclass
-from pydantic import Field
+
+
+class _Empty:
+    """Value of a reduction which has not received anything yet."""
+
+
+_EMPTY = _Empty()
 
 
 class NodeDataAggregator:
+    """Collects values from many nodes into one input for another node (fan-in).
+
+    Values are added as the nodes producing them finish. By default the result is the list of values, in the order
+    they were added to the aggregator. With a reduce function only the running result is kept.
+
+    Attributes:
+        result_name (str): name of the aggregated value.
+        name (str): unique name for tracking use.
+        inputs (dict[str, tuple[str, str]]): where each value is read from.
+        reduce (typing.Callable, optional): called with the running result and the next value, returns the new running result.
+        initial (typing.Callable, optional): called at the start of each run to create the first running result. Without it, the first value is used.
+        ordered (bool): add values in the order they were added to the aggregator. Otherwise in the order the nodes finish.
+        partial (bool): streaming consumers start straight away and get each value (or running result) as it arrives.
+    """
+
     inputs: dict[str, tuple[str, str]]  # keys to pull input
     node: typing.Callable
     output: typing.Callable
+    reduce: typing.Optional[typing.Callable] = None
+    initial: typing.Optional[typing.Callable] = None
+    ordered: bool = True
+    partial: bool = False
 
-    def __init__(self, name: str):
+    def __init__(
+        self,
+        name: str,
+        reduce: typing.Optional[typing.Callable] = None,
+        initial: typing.Optional[typing.Callable] = None,
+        ordered: bool = True,
+        partial: bool = False,
+    ):
         self.result_name = name
+        self.reduce = reduce
+        self.initial = initial
+        self.ordered = ordered
+        self.partial = partial
         self.name = f"{name}_{str(uuid())}"
         setattr(self, "__node_name", self.name)
         self.inputs = dict()
@@ -20,13 +55,13 @@ class NodeDataAggregator:
         outputs = [
             (
                 self.result_name,
-                f"typing.Optional[list[typing.Any]]",
-                Field(default=None, init=False),
+                "typing.Optional[typing.Any]"
+                if reduce is not None
+                else "typing.Optional[list[typing.Any]]",
+                None,
             )
         ]
-        self.outputs = make_dataclass(
-            f"{self.name}_outputs", outputs, bases=(NodeDataClass,), init=False
-        )
+        self.outputs = make_node_dataclass(f"{self.name}_outputs", outputs)
         self.output = self.outputs()
         self.node = SyncNode(
             name=self.name,
@@ -62,10 +97,106 @@ class NodeDataAggregator:
             return self
 
     def __call__(self, *args: typing.Any, **kwds: typing.Any) -> NodeDataClass:
-        return list(kwds.values())
+        aggregate = self.start(len(kwds))
+        for position, value in enumerate(kwds.values()):
+            aggregate.add(position, value)
+        return aggregate.result()
+
+    def start(
+        self, n_inputs: int, stream: typing.Optional[typing.Any] = None
+    ) -> "AggregatorRun":
+        """Start collecting values for one run.
+
+        Args:
+            n_inputs (int): number of values expected.
+            stream (typing.Optional[NodeStream], optional): sent each value (or running result) as it arrives. Defaults to None.
+
+        Returns:
+            AggregatorRun: the run's collected values.
+        """
+        return AggregatorRun(self, n_inputs, stream)
 
     def __repr__(self) -> str:
         return f"({self.node_name}, 'inputs': {self.inputs}, 'outputs': {self.outputs})"
 
     def __hash__(self) -> int:
         return self.func.__hash__()
+
+
+class AggregatorRun:
+    """The result of a NodeDataAggregator during one run, built up as its values arrive.
+
+    Attributes:
+        n_inputs (int): number of values expected.
+        received (int): number of values added so far.
+    """
+
+    n_inputs: int
+    received: int
+
+    def __init__(
+        self,
+        aggregator: NodeDataAggregator,
+        n_inputs: int,
+        stream: typing.Optional[typing.Any] = None,
+    ):
+        self.n_inputs = n_inputs
+        self.received = 0
+        self._reduce = aggregator.reduce
+        self._ordered = aggregator.ordered
+        self._stream = stream
+        self._next = 0
+        self._pending = dict()
+        if aggregator.reduce is None:
+            self._value = []
+        elif aggregator.initial is None:
+            self._value = _EMPTY
+        else:
+            self._value = aggregator.initial()
+
+    @property
+    def complete(self) -> bool:
+        """Every value expected has been added."""
+        return self.received == self.n_inputs
+
+    def add(self, position: int, value: typing.Any):
+        """Add a value.
+
+        Args:
+            position (int): position of the value's input in the aggregator.
+            value (typing.Any): the value.
+        """
+        self.received += 1
+        if not self._ordered:
+            self._take(value)
+            return
+        # values arriving early wait for the ones before them
+        self._pending[position] = value
+        while self._next in self._pending:
+            self._take(self._pending.pop(self._next))
+            self._next += 1
+
+    def _take(self, value: typing.Any):
+        if self._reduce is None:
+            self._value.append(value)
+        elif self._value is _EMPTY:
+            self._value = value
+        else:
+            self._value = self._reduce(self._value, value)
+        if self._stream is not None:
+            self._stream.put_nowait(value if self._reduce is None else self._value)
+
+    def result(self) -> typing.Any:
+        """The list of values, or the running result when there is a reduce function. Ends the stream.
+
+        Returns:
+            typing.Any: the aggregated value. None when a reduction without an initial value received nothing.
+        """
+        self.close()
+        return None if self._value is _EMPTY else self._value
+
+    def close(self):
+        """End the stream sent to partial consumers."""
+        if self._stream is not None:
+            self._stream.close_nowait()
+            self._stream = None
@@ -1,12 +1,16 @@
-from pydantic import BaseModel, Extra, Field
+import dataclasses
 import typing
+from pydantic import create_model
 
+_PRIVATE_ATTRS = ["_Graph__node_name", "__node_name", "__skipped", "__reused"]
 
-class NodeDataClass(BaseModel):
+
+class NodeDataClass:
     """The baseclass for dataclasses generated during graph execution.
 
-    Args:
-        BaseModel: Pydantic basemodel
+    Subclasses are made with make_node_dataclass. Their fields are stored in __slots__, so an instance is a
+    small fixed-size record. Other attributes (such as the "__node_name" set by the graph) go in an
+    instance __dict__, which is only created when one is set. Values are not validated unless validate is called.
 
     Raises:
         Exception: Raised when adding two NodeDataClass with the same attr name.
@@ -17,9 +21,56 @@ class NodeDataClass(BaseModel):
         NodeDataClass: returns self. The result of + or += methods.
     """
 
-    class Config:
-        arbitrary_types_allowed = True
-        extra = Extra.allow
+    __slots__ = ("__dict__",)
+    _defaults: typing.ClassVar[dict] = dict()
+    _validator: typing.ClassVar[typing.Optional[type]] = None
+
+    def __init__(self, **values):
+        for name, default in self._defaults.items():
+            object.__setattr__(self, name, default)
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def __iter__(self) -> typing.Iterator[tuple[str, typing.Any]]:
+        """(name, value) for every field, then every other attribute set on the instance."""
+        for name in self._defaults:
+            yield name, getattr(self, name)
+        yield from self.__dict__.items()
+
+    def dict(self) -> dict[str, typing.Any]:
+        """The fields and other public attributes as a dict.
+
+        Returns:
+            dict[str, typing.Any]: name -> value.
+        """
+        return {name: value for name, value in self if name not in _PRIVATE_ATTRS}
+
+    def validate(self) -> "NodeDataClass":
+        """Check the values against the field annotations with pydantic.
+
+        Raises:
+            pydantic.ValidationError: Raised when a value does not match its annotation.
+
+        Returns:
+            NodeDataClass: self, with the values as coerced by pydantic.
+        """
+        cls = type(self)
+        if cls._validator is None:
+            namespace = {"typing": typing}
+            cls._validator = create_model(
+                f"{cls.__name__}_validator",
+                **{
+                    x.name: (
+                        eval(x.type, namespace) if isinstance(x.type, str) else x.type,
+                        None,
+                    )
+                    for x in dataclasses.fields(cls)
+                },
+            )
+        validated = cls._validator(**{name: getattr(self, name) for name in cls._defaults})
+        for name in cls._defaults:
+            setattr(self, name, getattr(validated, name))
+        return self
 
     def __add__(self, other) -> "NodeDataClass":
         """adding two NodeDataClass together.
@@ -36,12 +87,13 @@ class NodeDataClass(BaseModel):
             NodeDataClass: All attrs are added to self and returned as the result of +.
         """
         if isinstance(other, NodeDataClass):
-            for attr, val in other.__dict__.items():
-                if attr in ["_Graph__node_name", "__node_name"]:
+            for attr, val in other:
+                present = attr in self._defaults or attr in self.__dict__
+                if attr in _PRIVATE_ATTRS:
                     continue
-                elif attr in self.__dict__ and getattr(self, attr) == None:
+                elif present and getattr(self, attr) == None:
                     setattr(self, attr, val)
-                elif attr not in self.__dict__:
+                elif not present:
                     setattr(self, attr, val)
                 else:
                     raise Exception(
@@ -61,21 +113,29 @@ class NodeDataClass(BaseModel):
         Returns:
             list: Each NodeDataClass is appended to a list and returned.
         """
-        if isinstance(other, NodeDataClass):
-            for attr, val in other.__dict__.items():
-                if attr in ["_Graph__node_name", "__node_name"]:
-                    continue
-                elif attr in self.__dict__ and getattr(self, attr) == None:
-                    setattr(self, attr, val)
-                elif attr not in self.__dict__:
-                    setattr(self, attr, val)
-                else:
-                    raise Exception(
-                        f"Attempting to overwrite {attr} when adding NodeDataClass"
-                    )
-            return self
-        else:
-            raise Exception("Adding a not NodeDataClass to a NodeDataClass")
+        return self.__add__(other)
+
+
+def make_node_dataclass(
+    name: str, fields: list[tuple[str, str, typing.Any]]
+) -> type:
+    """Create a NodeDataClass subclass with a slot for each field.
+
+    Args:
+        name (str): class name.
+        fields (list[tuple[str, str, typing.Any]]): name, annotation and default of each field.
+
+    Returns:
+        type: a dataclass. Instances start with every field set to its default.
+    """
+    namespace = {
+        "__slots__": tuple(x[0] for x in fields),
+        "__annotations__": {x[0]: x[1] for x in fields},
+        "_defaults": {x[0]: x[2] for x in fields},
+        "_validator": None,
+    }
+    cls = type(name, (NodeDataClass,), namespace)
+    return dataclasses.dataclass(init=False)(cls)
 
 
 type_map = dict()
@@ -114,21 +174,21 @@ def parse_annotation(class_str: str) -> str:
     return class_name
 
 
-def parse_doc(func: typing.Callable) -> list[typing.Optional[tuple[str, str]]]:
-    """Parses the doctrings for functions (__doc__) to get the name and type of returned values.
+def parse_doc(func: typing.Callable) -> list[typing.Optional[tuple[str, str, None]]]:
+    """Parses the doctrings for functions (__doc__) to get the name and type of returned values. Generators use a Yields section.
 
     Args:
         func (typing.Callable): function to get return values for.
 
     Returns:
-        list[typing.Optional[tuple[str, str]]]: list of string tuples. Tuples contain the name and type of the return values used to create new dataclasses.
+        list[typing.Optional[tuple[str, str, None]]]: name, type and default (None) of the return values, used to create new dataclasses.
     """
     returns = list()
     docs = func.__doc__.split("\n")
     in_returns = False
     return_row_number = -1
     for row_number, row in enumerate(docs):
-        if row.strip("\n ").lower() == "returns":
+        if row.strip("\n ").lower() in ["returns", "yields"]:
             in_returns = True
             return_row_number = row_number
         elif in_returns and (row_number - return_row_number) % 2 == 0:
@@ -138,7 +198,7 @@ def parse_doc(func: typing.Callable) -> list[typing.Optional[tuple[str, str]]]:
                     (
                         parts[0].strip(),
                         f"typing.Optional[{parts[1].strip()}]",
-                        Field(default=None, init=False),
+                        None,
                     )
                 )
     return returns
@@ -15,7 +15,7 @@ class NodeDataTracker:
         node_name = getattr(output_to_track, "__node_name")
         setattr(self, "__node_name", node_name)
 
-        for key, value in output_to_track.__dict__.items():
+        for key, value in output_to_track:
             if key not in ["__node_name", "node_type"]:
                 graph_tracking_tuple = ("mr_graph_node", node_name, key)
                 setattr(self, key, graph_tracking_tuple)
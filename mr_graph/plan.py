@@ -0,0 +1,1381 @@
+import asyncio
+import copy
+import hashlib
+import pickle
+import typing
+from collections import deque
+from dataclasses import dataclass, field, fields, replace
+from contextlib import nullcontext
+from mr_graph.executors import INLINE, THREAD, PROCESS, ProcessPool, ThreadPool
+from mr_graph.cache import NodeCache, node_namespace
+from mr_graph.limits import ConcurrencyLimit, RateLimiter
+from mr_graph.hedge import HedgePolicy
+from mr_graph.hooks import RunHooks
+from mr_graph.node import (
+    AsyncNode,
+    MappedNode,
+    StreamNode,
+    SubgraphNode,
+    NODE_TYPES,
+)
+from mr_graph.stream import NodeStream, drain_async, drain_sync
+from functools import partial
+from mr_graph.node_data_class import NodeDataClass, make_node_dataclass
+from mr_graph.node_data_tracker import NodeDataTracker
+from mr_graph.node_data_aggregator import NodeDataAggregator
+from mr_graph.graphio import GraphIO
+
+
+class _Missing:
+    """Marker for a slot which has not been written during a run."""
+
+    def __repr__(self) -> str:
+        return "MISSING"
+
+
+MISSING = _Missing()
+"""Value of a slot that was never set. Steps reading it are skipped.
+"""
+
+
+class _CacheHit:
+    """Result of a step task answered by a blocking cache, rather than by calling the node."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value: typing.Any):
+        self.value = value
+
+
+ASYNC = "async"
+"""Dispatch mode for coroutine functions. Blocking functions use one of INLINE, THREAD or PROCESS.
+"""
+
+_NO_LIMIT = nullcontext()
+
+SKIPPED_MISSING_INPUT = "missing input"
+"""Reason given for a step that was not run because one of its inputs was never set.
+"""
+
+SKIPPED_DEADLINE = "deadline"
+"""Reason given for a step that was cancelled, or never started, because the run's deadline passed or would pass before it finished.
+"""
+
+
+class NodeTimeoutError(TimeoutError):
+    """Raised when a node does not finish within its timeout.
+
+    Attributes:
+        name (str): name of the step that timed out.
+        timeout (float): the node's timeout, in seconds.
+    """
+
+    def __init__(self, name: str, timeout: float):
+        super().__init__(f"node {name} did not finish within {timeout}s")
+        self.name = name
+        self.timeout = timeout
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a graph run does not finish before its deadline.
+
+    Attributes:
+        skipped (dict[str, str]): step name -> reason, for every step that did not run to completion.
+        outputs (NodeDataClass): the graph outputs which were set before the deadline.
+    """
+
+    def __init__(self, skipped: dict, outputs: NodeDataClass):
+        names = [name for name, reason in skipped.items() if reason == SKIPPED_DEADLINE]
+        super().__init__(f"deadline passed before {', '.join(names)} finished")
+        self.skipped = skipped
+        self.outputs = outputs
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    """A single node invocation in a compiled plan.
+
+    Attributes:
+        index (int): Position of the step in ExecutionPlan.steps.
+        name (str): Name of the GraphIO (or NodeDataAggregator) this step was compiled from.
+        node (NODE_TYPES): The node being called.
+        call (typing.Callable): The callable dispatched by the scheduler.
+        dispatch (str): One of ASYNC, INLINE, THREAD or PROCESS.
+        args (tuple[tuple[str, int, typing.Any], ...]): (keyword, slot, constant) for every argument. slot is -1 for constants.
+        out_fields (tuple[str, ...]): Names of the values returned by the node.
+        out_slots (tuple[int, ...]): Slots the returned values are written to.
+        consumers (tuple[int, ...]): Steps reading at least one of this step's outputs.
+        n_deps (int): Number of distinct steps this step reads from.
+        level (int): Topological level. Steps in the same level never depend on each other.
+        semaphore (ConcurrencyLimit, optional): the node's concurrency limit.
+        rate_limiter (RateLimiter, optional): the node's rate limit.
+        rate_limit_cost (typing.Callable, optional): tokens taken from rate_limiter by a call.
+        executor (typing.Union[ProcessPool, ThreadPool], optional): pool used by PROCESS steps, and THREAD steps not using the event loop's default executor.
+        cache (NodeCache, optional): results of earlier calls, checked before the node is started.
+        cache_namespace (str, optional): identifies the node in cache keys.
+        stream (bool): the node is a generator. Its items are sent to stream_consumers as they are yielded.
+        stream_consumers (tuple[int, ...]): streaming steps started together with this one, reading its items as they arrive.
+        stream_inputs (frozenset[int]): slots this step reads as a stream rather than a finished value.
+        collect_stream (bool): keep every yielded item, for non-streaming consumers or the graph output.
+        timeout (float, optional): seconds the node may run, once its limits allow it to start, before it is cancelled.
+        hedge (HedgePolicy, optional): starts a duplicate call of an async node when the first is slow.
+        map_over (str, optional): the node is called once for each item of this input, and each output is a list.
+        map_concurrency (int, optional): maximum number of calls of a mapped node running at once, in each run.
+        aggregator (NodeDataAggregator, optional): set for aggregator steps, whose values are added as their producers finish.
+        aggregator_inputs (tuple[tuple[int, int, typing.Any], ...]): (position, slot, constant) for an aggregator's values which no step produces. slot is -1 for constants.
+        folds (tuple[tuple[int, tuple[tuple[int, int], ...]], ...]): (aggregator step, ((position, slot), ...)) for every aggregator reading this step's outputs.
+        drop_slots (tuple[int, ...]): slots of this step read only by aggregators, cleared once their values are added.
+    """
+
+    index: int
+    name: str
+    node: NODE_TYPES
+    call: typing.Callable
+    dispatch: str
+    args: tuple
+    out_fields: tuple
+    out_slots: tuple
+    consumers: tuple
+    n_deps: int
+    level: int
+    semaphore: typing.Optional[ConcurrencyLimit] = None
+    rate_limiter: typing.Optional[RateLimiter] = None
+    rate_limit_cost: typing.Optional[typing.Callable] = None
+    executor: typing.Union[ProcessPool, ThreadPool, None] = None
+    cache: typing.Optional[NodeCache] = None
+    cache_namespace: typing.Optional[str] = None
+    stream: bool = False
+    stream_consumers: tuple = tuple()
+    stream_inputs: frozenset = frozenset()
+    collect_stream: bool = False
+    timeout: typing.Optional[float] = None
+    hedge: typing.Optional[HedgePolicy] = None
+    map_over: typing.Optional[str] = None
+    map_concurrency: typing.Optional[int] = None
+    aggregator: typing.Optional[NodeDataAggregator] = None
+    aggregator_inputs: tuple = tuple()
+    folds: tuple = tuple()
+    drop_slots: tuple = tuple()
+
+    @property
+    def limited(self) -> bool:
+        return self.semaphore is not None or self.rate_limiter is not None
+
+    def gather(self, values: list) -> typing.Optional[dict[str, typing.Any]]:
+        """Collect the keyword arguments for this step.
+
+        Args:
+            values (list): Slots for the current run.
+
+        Returns:
+            typing.Optional[dict[str, typing.Any]]: kwds for the call, or None if an input was never set.
+        """
+        kwds = dict()
+        for kwd, slot, constant in self.args:
+            if slot < 0:
+                kwds[kwd] = constant
+            else:
+                value = values[slot]
+                if value is MISSING:
+                    return None
+                if isinstance(value, NodeStream):
+                    if slot not in self.stream_inputs:
+                        value = value.items
+                    elif self.dispatch == ASYNC:
+                        value = value.reader(self.index)
+                    else:
+                        loop = asyncio.get_running_loop()
+                        value = value.sync_reader(self.index, loop)
+                kwds[kwd] = value
+        return kwds
+
+    def invoke(
+        self, kwds: dict, stream: typing.Optional[NodeStream] = None
+    ) -> typing.Awaitable:
+        """Start the node. Coroutines are returned as is, blocking calls are sent to their executor.
+
+        Args:
+            kwds (dict): kwds for the call.
+            stream (typing.Optional[NodeStream], optional): where a streaming node sends its items. Defaults to None.
+
+        Returns:
+            typing.Awaitable: resolves to the node's return value.
+        """
+        if stream is not None:
+            if self.dispatch == ASYNC:
+                return drain_async(self.call, kwds, stream)
+            call = partial(
+                drain_sync, self.call, kwds, stream, asyncio.get_running_loop()
+            )
+            if self.executor is None:
+                return asyncio.to_thread(call)
+            return self.executor.run(self.node.name, call, dict())
+        elif self.dispatch == ASYNC:
+            return self.call(**kwds)
+        elif self.dispatch == THREAD and self.executor is None:
+            return asyncio.to_thread(self.call, **kwds)
+        elif self.dispatch != INLINE:
+            return self.executor.run(self.node.name, self.call, kwds)
+        return _call_inline(self.call, kwds)
+
+    def start(
+        self,
+        kwds: dict,
+        semaphore: typing.Optional[ConcurrencyLimit],
+        stream: typing.Optional[NodeStream] = None,
+        hooks: typing.Optional[RunHooks] = None,
+    ) -> typing.Awaitable:
+        """Start the node under its limits, the graph's limit, its hedge and its timeout.
+
+        Args:
+            kwds (dict): kwds for the call.
+            semaphore (typing.Optional[ConcurrencyLimit]): graph-wide limit on running nodes.
+            stream (typing.Optional[NodeStream], optional): where a streaming node sends its items. Defaults to None.
+            hooks (typing.Optional[RunHooks], optional): told when the node starts. Defaults to None.
+
+        Returns:
+            typing.Awaitable: resolves to the node's return value.
+        """
+        if self.hedge is None or stream is not None:
+            call = self._attempt(kwds, semaphore, stream, hooks)
+        else:
+            # a duplicate waits for its own slot and rate token, the hooks only hear of the first call
+            ready = asyncio.Event()
+            first = iter([(hooks, ready)])
+            call = self.hedge.run(
+                lambda: self._attempt(
+                    kwds, semaphore, None, *next(first, (None, None))
+                ),
+                ready,
+            )
+        return call
+
+    def _attempt(
+        self,
+        kwds: dict,
+        semaphore: typing.Optional[ConcurrencyLimit],
+        stream: typing.Optional[NodeStream],
+        hooks: typing.Optional[RunHooks],
+        ready: typing.Optional[asyncio.Event] = None,
+    ) -> typing.Awaitable:
+        """One call of the node, once its limits allow it."""
+        if self.limited or semaphore is not None:
+            return self.invoke_limited(kwds, semaphore, stream, hooks, ready)
+        if hooks is not None:
+            hooks.start(self.index)
+        if ready is not None:
+            ready.set()
+        return self.invoke_timed(kwds, stream)
+
+    async def invoke_limited(
+        self,
+        kwds: dict,
+        semaphore: typing.Optional[ConcurrencyLimit],
+        stream: typing.Optional[NodeStream] = None,
+        hooks: typing.Optional[RunHooks] = None,
+        ready: typing.Optional[asyncio.Event] = None,
+    ) -> typing.Any:
+        """Start the node once its concurrency limit, the graph's limit and its rate limit allow it.
+
+        Args:
+            kwds (dict): kwds for the call.
+            semaphore (typing.Optional[ConcurrencyLimit]): graph-wide limit on running nodes.
+            stream (typing.Optional[NodeStream], optional): where a streaming node sends its items. Defaults to None.
+            hooks (typing.Optional[RunHooks], optional): told when the node starts, once the limits allow it. Defaults to None.
+            ready (typing.Optional[asyncio.Event], optional): set once the limits allow the node to start. Defaults to None.
+
+        Returns:
+            typing.Any: Return value of the node.
+        """
+        async with self.semaphore or _NO_LIMIT, semaphore or _NO_LIMIT:
+            if self.rate_limiter is not None:
+                if self.rate_limit_cost is None:
+                    await self.rate_limiter.acquire()
+                else:
+                    await self.rate_limiter.acquire(self.rate_limit_cost(**kwds))
+            if hooks is not None:
+                hooks.start(self.index)
+            if ready is not None:
+                ready.set()
+            return await self.invoke_timed(kwds, stream)
+
+    def invoke_timed(
+        self, kwds: dict, stream: typing.Optional[NodeStream] = None
+    ) -> typing.Awaitable:
+        """Start the node under its timeout. Time spent waiting for limits does not count against it.
+
+        Args:
+            kwds (dict): kwds for the call.
+            stream (typing.Optional[NodeStream], optional): where a streaming node sends its items. Defaults to None.
+
+        Returns:
+            typing.Awaitable: resolves to the node's return value.
+        """
+        call = self.invoke(kwds, stream)
+        if self.timeout is not None:
+            call = _with_timeout(self, call)
+        return call
+
+    async def invoke_map(
+        self,
+        kwds: dict,
+        semaphore: typing.Optional[ConcurrencyLimit],
+        hooks: typing.Optional[RunHooks] = None,
+    ) -> typing.Any:
+        """Call the node for each item of its map_over input, at most map_concurrency at a time.
+
+        Limits, the cache, the timeout and the hedge apply to each call. If a call fails, the others are cancelled.
+
+        Args:
+            kwds (dict): kwds for the calls. The map_over input holds the items.
+            semaphore (typing.Optional[ConcurrencyLimit]): graph-wide limit on running nodes.
+            hooks (typing.Optional[RunHooks], optional): told when the first call starts. Defaults to None.
+
+        Returns:
+            typing.Any: a list with a result per item, or a tuple of lists for nodes with several outputs.
+        """
+        items = list(kwds[self.map_over])
+        results = [None] * len(items)
+        if hooks is not None:
+            hooks.start(self.index)
+        if (
+            self.dispatch == INLINE
+            and not self.limited
+            and semaphore is None
+            and self.cache is None
+        ):
+            for i, item in enumerate(items):
+                kwds[self.map_over] = item
+                results[i] = self.call(**kwds)
+        else:
+            queue = iter(enumerate(items))
+
+            async def worker():
+                for i, item in queue:
+                    item_kwds = dict(kwds)
+                    item_kwds[self.map_over] = item
+                    results[i] = await self._invoke_item(item_kwds, semaphore)
+
+            workers = [
+                asyncio.create_task(worker())
+                for _ in range(min(self.map_concurrency, len(items)))
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for task in workers:
+                    task.cancel()
+        if len(self.out_slots) > 1:
+            return tuple(list(x) for x in zip(*results)) or tuple(
+                [] for _ in self.out_slots
+            )
+        return results
+
+    async def _invoke_item(
+        self, kwds: dict, semaphore: typing.Optional[ConcurrencyLimit]
+    ) -> typing.Any:
+        """One call of a mapped node."""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(self.cache_namespace, kwds)
+            hit, cached_value = await self.cache.aget(cache_key)
+            if hit:
+                return cached_value
+        call = self.start(kwds, semaphore)
+        if cache_key is not None:
+            call = self.cache.fill(cache_key, call)
+        return await call
+
+    def store(self, values: list, result: typing.Any):
+        """Write the value(s) returned by the node into the run's slots.
+
+        Args:
+            values (list): Slots for the current run.
+            result (typing.Any): Return value of the node.
+        """
+        if self.stream:
+            # the slot keeps the NodeStream, which holds the collected items
+            return
+        if len(self.out_slots) == 1:
+            values[self.out_slots[0]] = result
+        elif len(self.out_slots) > 1:
+            for slot, value in zip(self.out_slots, result):
+                values[slot] = value
+
+
+IDENTITY = "identity"
+"""RunMemo comparison: a value is unchanged when it is the same object as last run.
+"""
+
+HASH = "hash"
+"""RunMemo comparison: a value is unchanged when its pickled bytes hash the same as last run.
+"""
+
+
+def _value_hash(value: typing.Any) -> typing.Optional[str]:
+    try:
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return None
+    return hashlib.sha256(payload).hexdigest()
+
+
+class RunMemo:
+    """Values kept from the last run of a plan, so the next run only calls the steps whose inputs changed.
+
+    A step is reused, rather than called, when it finished in the last run and none of the values it reads
+    have changed. The outputs of steps which are called are compared too, so when comparing by hash a step
+    returning an equal value does not make its consumers run again. Values which cannot be pickled always
+    count as changed. Streaming steps, steps reading a stream, and partial aggregators are always called.
+
+    Kept values are shared with the outputs of the last run, and must not be mutated.
+
+    Attributes:
+        compare (str): IDENTITY or HASH.
+        values (list, optional): slots of the last run.
+        hashes (list, optional): hashes of the last run's slots, when comparing by HASH.
+        done (list[bool], optional): steps which finished in the last run.
+    """
+
+    compare: str
+    values: typing.Optional[list]
+    hashes: typing.Optional[list]
+    done: typing.Optional[list]
+
+    def __init__(self, compare: str = IDENTITY):
+        """Start with nothing kept, so the first run calls every step.
+
+        Args:
+            compare (str, optional): IDENTITY or HASH. Defaults to IDENTITY.
+
+        Raises:
+            ValueError: Raised when compare is not IDENTITY or HASH.
+        """
+        if compare not in (IDENTITY, HASH):
+            raise ValueError(f"compare must be {IDENTITY!r} or {HASH!r}")
+        self.compare = compare
+        self.clear()
+
+    def clear(self):
+        """Forget the last run."""
+        self.values = None
+        self.hashes = None
+        self.done = None
+
+    def start(self, values: list, inputs: tuple) -> "MemoRun":
+        """Compare the graph inputs of a new run with the last run's.
+
+        Args:
+            values (list): Slots from bind.
+            inputs (tuple): ExecutionPlan.inputs.
+
+        Returns:
+            MemoRun: tracks which slots changed during the run.
+        """
+        run = MemoRun(self, len(values))
+        for _, slot, _ in inputs:
+            run.compare(slot, values[slot])
+        return run
+
+    def keep(self, run: "MemoRun", values: list, done: list):
+        """Keep a finished run, to compare the next one with.
+
+        Args:
+            run (MemoRun): from start.
+            values (list): Slots after execute.
+            done (list[bool]): steps which finished, rather than being skipped.
+        """
+        self.values = values
+        self.hashes = run.hashes
+        self.done = done
+
+
+class MemoRun:
+    """Which slots changed during one run, compared with the RunMemo it was started from.
+
+    Attributes:
+        memo (RunMemo): the last run.
+        changed (list[bool]): for every slot, whether its value differs from the last run.
+        hashes (list, optional): hashes of this run's slots, when comparing by HASH.
+    """
+
+    def __init__(self, memo: RunMemo, n_slots: int):
+        self.memo = memo
+        self.changed = [True] * n_slots
+        self.hashes = [None] * n_slots if memo.compare == HASH else None
+
+    def compare(self, slot: int, value: typing.Any):
+        """Set whether a slot changed, once its value is known."""
+        memo = self.memo
+        if value is MISSING or isinstance(value, NodeStream):
+            return
+        if memo.values is not None and value is memo.values[slot]:
+            self.changed[slot] = False
+            if self.hashes is not None:
+                self.hashes[slot] = memo.hashes[slot]
+            return
+        if self.hashes is None:
+            self.changed[slot] = True
+            return
+        value_hash = _value_hash(value)
+        self.hashes[slot] = value_hash
+        self.changed[slot] = (
+            value_hash is None or memo.hashes is None or value_hash != memo.hashes[slot]
+        )
+
+    def reusable(self, step: PlanStep) -> bool:
+        """Whether the step finished in the last run, and reads nothing that has changed since."""
+        done = self.memo.done
+        if done is None or not done[step.index]:
+            return False
+        if step.stream or step.stream_inputs or step.stream_consumers:
+            return False
+        changed = self.changed
+        return not any(changed[slot] for _, slot, _ in step.args if slot >= 0)
+
+    def reuse(self, step: PlanStep, values: list):
+        """Copy the step's outputs from the last run."""
+        for slot in step.out_slots:
+            values[slot] = self.memo.values[slot]
+
+    def update(self, step: PlanStep, values: list):
+        """Compare the outputs of a step which has just finished with the last run's."""
+        if step.stream:
+            return
+        for slot in step.out_slots:
+            self.compare(slot, values[slot])
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """Immutable, precomputed execution order for a graph.
+
+    Attributes:
+        steps (tuple[PlanStep, ...]): Every node invocation in the graph.
+        levels (tuple[tuple[int, ...], ...]): Step indices grouped by topological level.
+        roots (tuple[int, ...]): Steps with no upstream steps.
+        inputs (tuple[tuple[str, int, typing.Any], ...]): (field, slot, default) for every graph input, in definition order.
+        outputs (tuple[tuple[str, int], ...]): (field, slot) for every graph output.
+        output_class (typing.Callable): dataclass returned by each run, one attr per output.
+        n_slots (int): Number of values held by a single run.
+        semaphore (ConcurrencyLimit, optional): limits the number of nodes running at once, across every run.
+        stream_buffer (int): items buffered between a streaming node and each streaming consumer.
+        mean_durations (list[typing.Optional[float]]): moving average of each step's run time, used to avoid starting steps which cannot finish before a deadline.
+        aggregators (tuple[int, ...]): aggregator steps.
+        pruned (dict[frozenset, ExecutionPlan]): plans made by prune, by output fields.
+
+    The plan holds no run state. Each call gets its own list of slots, so a plan can be
+    executed many times concurrently.
+    """
+
+    steps: tuple
+    levels: tuple
+    roots: tuple
+    inputs: tuple
+    outputs: tuple
+    output_class: typing.Callable
+    n_slots: int
+    semaphore: typing.Optional[ConcurrencyLimit] = None
+    stream_buffer: int = 16
+    mean_durations: list = field(default_factory=list)
+    aggregators: tuple = tuple()
+    pruned: dict = field(default_factory=dict, repr=False, compare=False)
+
+    def prune(self, outputs: typing.Iterable[str]) -> "ExecutionPlan":
+        """A plan producing only some of the outputs, running only the steps they depend on.
+
+        Pruned plans are kept, so each set of outputs is pruned once. Steps keep their slots, and the pruned plan
+        binds the same inputs.
+
+        Args:
+            outputs (typing.Iterable[str]): output fields to keep.
+
+        Raises:
+            ValueError: Raised when a field is not an output of the plan.
+
+        Returns:
+            ExecutionPlan: the pruned plan, or this plan when every output is kept.
+        """
+        key = frozenset(outputs)
+        if key in self.pruned:
+            return self.pruned[key]
+        output_names = [x[0] for x in self.outputs]
+        unknown = sorted(key.difference(output_names))
+        if unknown:
+            raise ValueError(f"{', '.join(unknown)} are not outputs of the graph")
+        if len(key) == len(output_names):
+            return self
+
+        slot_producer = {slot: x.index for x in self.steps for slot in x.out_slots}
+        needed = set()
+        to_visit = [
+            slot_producer[slot]
+            for name, slot in self.outputs
+            if name in key and slot in slot_producer
+        ]
+        while to_visit:
+            index = to_visit.pop()
+            if index in needed:
+                continue
+            needed.add(index)
+            for _, slot, _ in self.steps[index].args:
+                if slot in slot_producer:
+                    to_visit.append(slot_producer[slot])
+        kept = sorted(needed)
+        new_index = {old: new for new, old in enumerate(kept)}
+
+        levels = []
+        for level in self.levels:
+            level = tuple(new_index[x] for x in level if x in new_index)
+            if level:
+                levels.append(level)
+        step_level = {x: n for n, level in enumerate(levels) for x in level}
+        steps = tuple(
+            replace(
+                self.steps[old],
+                index=new,
+                consumers=tuple(
+                    new_index[x] for x in self.steps[old].consumers if x in new_index
+                ),
+                stream_consumers=tuple(
+                    new_index[x]
+                    for x in self.steps[old].stream_consumers
+                    if x in new_index
+                ),
+                level=step_level[new],
+                folds=tuple(
+                    (new_index[x], positions)
+                    for x, positions in self.steps[old].folds
+                    if x in new_index
+                ),
+            )
+            for new, old in enumerate(kept)
+        )
+        outputs = tuple(x for x in self.outputs if x[0] in key)
+        plan = replace(
+            self,
+            steps=steps,
+            levels=tuple(levels),
+            roots=tuple(x.index for x in steps if x.n_deps == 0),
+            outputs=outputs,
+            output_class=make_node_dataclass(
+                "graph_outputs",
+                [(name, "typing.Optional[typing.Any]", None) for name, _ in outputs],
+            ),
+            mean_durations=(
+                [self.mean_durations[x] for x in kept] if self.mean_durations else []
+            ),
+            aggregators=tuple(new_index[x] for x in self.aggregators if x in new_index),
+            pruned=dict(),
+        )
+        self.pruned[key] = plan
+        return plan
+
+    def bind(self, args: tuple, kwds: dict) -> list:
+        """Create the slots for a run and fill in the graph inputs.
+
+        Positional args are used when they match the number of inputs, otherwise inputs are matched by keyword.
+
+        Args:
+            args (tuple): positional graph inputs.
+            kwds (dict): keyword graph inputs.
+
+        Returns:
+            list: Slots for a new run.
+        """
+        values = [MISSING] * self.n_slots
+        for _, slot, default in self.inputs:
+            if default is not None:
+                values[slot] = default
+        if len(args) == len(self.inputs):
+            for arg, (field, slot, _) in zip(args, self.inputs):
+                if isinstance(arg, NodeDataTracker):
+                    # if the arg is a dataclass, then we use it to set the input
+                    if arg.fields == [field]:
+                        values[slot] = getattr(arg.data_class, field)
+                elif not (isinstance(arg, tuple) and arg[0] == "mr_graph_node"):
+                    values[slot] = arg
+        else:
+            for field, slot, _ in self.inputs:
+                if field in kwds:
+                    values[slot] = kwds[field]
+        return values
+
+    async def execute(
+        self,
+        values: list,
+        deadline: typing.Optional[float] = None,
+        skipped: typing.Optional[dict] = None,
+        hooks: typing.Optional[RunHooks] = None,
+        memo: typing.Optional[RunMemo] = None,
+        reused: typing.Optional[list] = None,
+    ) -> list:
+        """Run every step of the plan.
+
+        A step is dispatched as soon as all of the steps it reads from have finished.
+        If a step fails, the steps still running are cancelled before the error is raised.
+
+        Args:
+            values (list): Slots from bind.
+            deadline (typing.Optional[float], optional): event loop time by which the run must finish. Steps still running then are cancelled, and steps which would not finish in time are not started. Defaults to None.
+            skipped (typing.Optional[dict], optional): filled with step name -> reason for every step that did not run. Defaults to None.
+            hooks (typing.Optional[RunHooks], optional): told when each step becomes ready, starts and finishes. Defaults to None.
+            memo (typing.Optional[RunMemo], optional): the last run. Steps whose inputs have not changed since reuse its outputs, and this run is kept in its place. Defaults to None.
+            reused (typing.Optional[list], optional): filled with the name of every step reused from memo. Defaults to None.
+
+        Returns:
+            list: The same slots, with the node outputs filled in.
+        """
+        if skipped is None:
+            skipped = dict()
+        if reused is None:
+            reused = []
+        loop = asyncio.get_running_loop()
+        steps = self.steps
+        waiting_on = [step.n_deps for step in steps]
+        finished = [False] * len(steps)
+        ready_steps = deque(self.roots)
+        running_coroutines = dict()
+        started = dict()
+        if hooks is not None:
+            for index in self.roots:
+                hooks.ready(index)
+        run = None if memo is None else memo.start(values, self.inputs)
+        aggregates = self._start_aggregates(values, waiting_on, ready_steps, hooks)
+        try:
+            while True:
+                while ready_steps:
+                    step = steps[ready_steps.popleft()]
+                    if run is not None and run.reusable(step):
+                        run.reuse(step, values)
+                        reused.append(step.name)
+                        self._stored(step, values, aggregates, run)
+                        finished[step.index] = True
+                        if hooks is not None:
+                            hooks.finish(step.index, cache_hit=True)
+                        self._release(step.consumers, waiting_on, ready_steps, hooks)
+                        continue
+                    if step.aggregator is not None:
+                        aggregate = aggregates[step.index]
+                        if aggregate.complete:
+                            if hooks is not None:
+                                hooks.start(step.index)
+                            step.store(values, aggregate.result())
+                            if hooks is not None:
+                                hooks.finish(step.index)
+                            self._stored(step, values, aggregates, run)
+                        else:
+                            # a value was never set
+                            aggregate.close()
+                            values[step.out_slots[0]] = MISSING
+                            skipped[step.name] = SKIPPED_MISSING_INPUT
+                        finished[step.index] = True
+                        self._release(step.consumers, waiting_on, ready_steps, hooks)
+                        continue
+                    step_kwds = step.gather(values)
+                    reason = None
+                    if step_kwds is None:
+                        # an input was never set, so this step (and anything fed by it) is skipped.
+                        reason = SKIPPED_MISSING_INPUT
+                    elif deadline is not None and not self._can_finish(
+                        step, deadline - loop.time()
+                    ):
+                        reason = SKIPPED_DEADLINE
+                    if reason is not None:
+                        skipped[step.name] = reason
+                        finished[step.index] = True
+                        # the producers must not wait for room in the queue of a step that never reads it
+                        for slot in step.stream_inputs:
+                            if isinstance(values[slot], NodeStream):
+                                values[slot].detach(step.index)
+                        self._release(step.consumers, waiting_on, ready_steps, hooks)
+                        self._release(
+                            step.stream_consumers, waiting_on, ready_steps, hooks
+                        )
+                        continue
+                    if step.map_over is not None:
+                        task = asyncio.create_task(
+                            step.invoke_map(step_kwds, self.semaphore, hooks)
+                        )
+                        running_coroutines[task] = step
+                        started[task] = loop.time()
+                        continue
+                    cache_key = None
+                    # blocking caches are looked up in the step's task, off the event loop
+                    lookup = False
+                    if step.cache is not None:
+                        cache_key = step.cache.key(step.cache_namespace, step_kwds)
+                        lookup = cache_key is not None and step.cache.blocking
+                    if step.cache is not None and not lookup:
+                        hit, cached_value = step.cache.get(cache_key)
+                        if hit:
+                            step.store(values, cached_value)
+                            self._stored(step, values, aggregates, run)
+                            finished[step.index] = True
+                            if hooks is not None:
+                                hooks.finish(step.index, cache_hit=True)
+                            self._release(step.consumers, waiting_on, ready_steps, hooks)
+                            continue
+                    if step.dispatch == INLINE and not step.limited and not lookup:
+                        if hooks is not None:
+                            hooks.start(step.index)
+                        try:
+                            step_value = step.call(**step_kwds)
+                        except Exception as err:
+                            if hooks is not None:
+                                hooks.fail(step.index, err)
+                            raise
+                        if cache_key is not None:
+                            step.cache.set(cache_key, step_value)
+                        step.store(values, step_value)
+                        self._stored(step, values, aggregates, run)
+                        finished[step.index] = True
+                        if hooks is not None:
+                            hooks.finish(step.index)
+                        self._release(step.consumers, waiting_on, ready_steps, hooks)
+                        continue
+                    stream = None
+                    if step.stream:
+                        stream = NodeStream(
+                            step.stream_consumers,
+                            self.stream_buffer,
+                            step.collect_stream,
+                        )
+                        values[step.out_slots[0]] = stream
+                    semaphore = self.semaphore
+                    if step.stream_inputs:
+                        # streaming consumers run under the graph-wide slot of the producer they start with,
+                        # so a small limit cannot leave a stage waiting on a stage that has no slot
+                        semaphore = None
+                    if lookup:
+                        call = _lookup_then_call(
+                            step.cache,
+                            cache_key,
+                            partial(step.start, step_kwds, semaphore, stream, hooks),
+                        )
+                    else:
+                        call = step.start(step_kwds, semaphore, stream, hooks)
+                        if cache_key is not None:
+                            call = step.cache.fill(cache_key, call)
+                    task = asyncio.create_task(call)
+                    running_coroutines[task] = step
+                    started[task] = loop.time()
+                    if step.stream_consumers:
+                        self._release(
+                            step.stream_consumers, waiting_on, ready_steps, hooks
+                        )
+                if not running_coroutines:
+                    break
+                done, _ = await asyncio.wait(
+                    running_coroutines.keys(),
+                    timeout=None if deadline is None else max(0, deadline - loop.time()),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    # the deadline passed. Whatever has not finished is skipped.
+                    for step in steps:
+                        if not finished[step.index]:
+                            skipped[step.name] = SKIPPED_DEADLINE
+                    break
+                for task in done:
+                    step = running_coroutines.pop(task)
+                    if hooks is not None:
+                        error = task.exception()
+                        if error is None:
+                            hooks.finish(
+                                step.index,
+                                cache_hit=isinstance(task.result(), _CacheHit),
+                            )
+                        else:
+                            hooks.fail(step.index, error)
+                    result = task.result()
+                    duration = loop.time() - started.pop(task)
+                    if isinstance(result, _CacheHit):
+                        result = result.value
+                    else:
+                        self._record_duration(step, duration)
+                    step.store(values, result)
+                    self._stored(step, values, aggregates, run)
+                    finished[step.index] = True
+                    self._release(step.consumers, waiting_on, ready_steps, hooks)
+                    for slot in step.stream_inputs:
+                        if isinstance(values[slot], NodeStream):
+                            values[slot].detach(step.index)
+            if memo is not None:
+                memo.keep(
+                    run,
+                    values,
+                    [finished[x.index] and x.name not in skipped for x in steps],
+                )
+        finally:
+            # results of the steps still running can no longer be used
+            for task in running_coroutines:
+                task.cancel()
+            if running_coroutines:
+                # producers and consumers in worker threads cannot be cancelled, so unblock them
+                for value in values:
+                    if isinstance(value, NodeStream):
+                        value.abort()
+                await asyncio.wait(running_coroutines.keys())
+                for task in running_coroutines:
+                    if not task.cancelled():
+                        task.exception()
+        return values
+
+    def collect(
+        self,
+        values: list,
+        skipped: typing.Optional[dict] = None,
+        reused: typing.Optional[list] = None,
+    ) -> NodeDataClass:
+        """Build the graph output for a run.
+
+        Args:
+            values (list): Slots after execute.
+            skipped (typing.Optional[dict], optional): steps skipped by execute. Attached to the output as "__skipped" when not empty. Defaults to None.
+            reused (typing.Optional[list], optional): steps reused by an incremental run. Attached to the output as "__reused". Defaults to None.
+
+        Returns:
+            NodeDataClass: a new output_class instance. Outputs which were never set are None.
+        """
+        output = self.output_class()
+        if skipped:
+            setattr(output, "__skipped", dict(skipped))
+        if reused is not None:
+            setattr(output, "__reused", list(reused))
+        for field, slot in self.outputs:
+            value = values[slot]
+            if isinstance(value, NodeStream):
+                value = value.items
+            if value is not MISSING:
+                setattr(output, field, value)
+        return output
+
+    def _start_aggregates(
+        self,
+        values: list,
+        waiting_on: list,
+        ready_steps: deque,
+        hooks: typing.Optional[RunHooks] = None,
+    ) -> dict:
+        """Start collecting values for every aggregator, adding the graph inputs and constants they read.
+
+        Streaming consumers of partial aggregators are released, so they start straight away.
+        """
+        aggregates = dict()
+        for index in self.aggregators:
+            step = self.steps[index]
+            stream = None
+            if step.stream_consumers:
+                stream = NodeStream(step.stream_consumers, 0, False)
+                values[step.out_slots[0]] = stream
+            aggregate = step.aggregator.start(len(step.args), stream)
+            for position, slot, constant in step.aggregator_inputs:
+                value = constant if slot < 0 else values[slot]
+                if value is not MISSING:
+                    aggregate.add(position, value)
+            aggregates[index] = aggregate
+            self._release(step.stream_consumers, waiting_on, ready_steps, hooks)
+        return aggregates
+
+    def _stored(
+        self,
+        step: PlanStep,
+        values: list,
+        aggregates: dict,
+        run: typing.Optional[MemoRun] = None,
+    ):
+        """Add a finished step's outputs to the aggregators reading them.
+
+        In an incremental run the outputs are compared with the last run's, and kept even when only aggregators read them.
+        """
+        if run is not None:
+            run.update(step, values)
+        for index, positions in step.folds:
+            aggregate = aggregates[index]
+            for position, slot in positions:
+                value = values[slot]
+                if isinstance(value, NodeStream):
+                    value = value.items
+                aggregate.add(position, value)
+        if run is None:
+            for slot in step.drop_slots:
+                values[slot] = MISSING
+
+    def _can_finish(self, step: PlanStep, remaining: float) -> bool:
+        """Whether a step is expected to finish in the time left, judging by its earlier runs."""
+        if remaining <= 0:
+            return False
+        mean_duration = self.mean_durations[step.index] if self.mean_durations else None
+        return mean_duration is None or mean_duration <= remaining
+
+    def _record_duration(self, step: PlanStep, duration: float):
+        if not self.mean_durations:
+            return
+        mean_duration = self.mean_durations[step.index]
+        if mean_duration is None:
+            self.mean_durations[step.index] = duration
+        else:
+            self.mean_durations[step.index] = 0.8 * mean_duration + 0.2 * duration
+
+    def _release(
+        self,
+        consumers: tuple,
+        waiting_on: list,
+        ready_steps: deque,
+        hooks: typing.Optional[RunHooks] = None,
+    ):
+        """Mark a step as finished (or started, for streaming consumers) and queue the consumers which are now ready."""
+        for consumer in consumers:
+            waiting_on[consumer] -= 1
+            if waiting_on[consumer] == 0:
+                ready_steps.append(consumer)
+                if hooks is not None:
+                    hooks.ready(consumer)
+
+
+async def _call_inline(call: typing.Callable, kwds: dict) -> typing.Any:
+    return call(**kwds)
+
+
+async def _lookup_then_call(
+    cache: NodeCache, key: str, start: typing.Callable[[], typing.Awaitable]
+) -> typing.Any:
+    """Look a call up in a blocking cache, and only start the node on a miss."""
+    hit, value = await cache.aget(key)
+    if hit:
+        return _CacheHit(value)
+    return await cache.fill(key, start())
+
+
+async def _with_timeout(step: PlanStep, call: typing.Awaitable) -> typing.Any:
+    try:
+        return await asyncio.wait_for(call, step.timeout)
+    except asyncio.TimeoutError:
+        raise NodeTimeoutError(step.name, step.timeout) from None
+
+
+def _resolve_input(input_node_id, input_node_kwd) -> tuple:
+    """Normalise an entry of GraphIO.inputs to (node name, field) or (None, constant)."""
+    if input_node_id is None:
+        if isinstance(input_node_kwd, NodeDataAggregator):
+            return input_node_kwd.name, input_node_kwd.result_name
+        elif isinstance(input_node_kwd, NodeDataTracker):
+            if len(input_node_kwd.fields) == 1:
+                return getattr(input_node_kwd, "__node_name"), input_node_kwd.fields[0]
+    return input_node_id, input_node_kwd
+
+
+def _output_fields(outputs) -> list[tuple[str, str]]:
+    """(node name, field) for every value tracked by the graph outputs."""
+    if outputs is None:
+        return []
+    if isinstance(outputs, list):
+        return [x for tracker in outputs for x in _output_fields(tracker)]
+    node_name = getattr(outputs, "__node_name")
+    output_fields = [(node_name, x.name) for x in fields(outputs.data_class)]
+    output_fields += list(outputs.field_map.items())
+    return output_fields
+
+
+def _alias(aliases: dict, ref: tuple) -> tuple:
+    """Follow aliases until ref names a step (or input) of the plan, or a constant."""
+    while ref[0] is not None and ref in aliases:
+        ref = aliases[ref]
+    return ref
+
+
+def _expand_subgraphs(flow: dict) -> tuple[dict, dict]:
+    """Replace each flattened subgraph step with copies of the inner graph's steps.
+
+    Copies are named "<subgraph step>/<inner step>". Inner steps reading an inner graph input read whatever
+    the subgraph step was given instead.
+
+    Args:
+        flow (dict[str, typing.Union[GraphIO, NodeDataAggregator]]): Nodes and aggregators of the graph.
+
+    Returns:
+        tuple[dict, dict]: the expanded flow, and aliases mapping (subgraph step, output field) to the (step, field) producing it,
+            or (None, constant).
+    """
+    if not any(
+        isinstance(x.node, SubgraphNode) and x.node.flatten for x in flow.values()
+    ):
+        return flow, dict()
+    expanded = dict()
+    aliases = dict()
+    for step_name, step_graphio in flow.items():
+        node = step_graphio.node
+        if not (isinstance(node, SubgraphNode) and node.flatten):
+            expanded[step_name] = step_graphio
+            continue
+        inner_flow, inner_aliases = _expand_subgraphs(node.flow)
+        sources = dict()
+        for input_name, input_dataclass in node.graph_inputs.items():
+            for input_field in fields(input_dataclass):
+                if input_field.name in step_graphio.inputs:
+                    source = _resolve_input(*step_graphio.inputs[input_field.name])
+                else:
+                    source = (None, getattr(input_dataclass, input_field.name))
+                sources[(input_name, input_field.name)] = source
+
+        def rename(ref: tuple) -> tuple:
+            ref = _alias(inner_aliases, _resolve_input(*ref))
+            if ref[0] is None:
+                return ref
+            if ref in sources:
+                return sources[ref]
+            if ref[0] in inner_flow:
+                return (f"{step_name}/{ref[0]}", ref[1])
+            return ref
+
+        for inner_name, inner_graphio in inner_flow.items():
+            inner_copy = copy.copy(inner_graphio)
+            inner_copy.name = f"{step_name}/{inner_name}"
+            inner_copy.inputs = {
+                kwd: rename(ref) for kwd, ref in inner_graphio.inputs.items()
+            }
+            expanded[inner_copy.name] = inner_copy
+        for inner_ref, out_field in zip(
+            _output_fields(node.graph_outputs), fields(step_graphio.output)
+        ):
+            aliases[(step_name, out_field.name)] = rename(inner_ref)
+    return expanded, aliases
+
+
+def build_plan(
+    flow: dict[str, typing.Union[GraphIO, NodeDataAggregator]],
+    inputs: dict[str, NodeDataClass],
+    outputs: typing.Optional[NodeDataTracker],
+    semaphore: typing.Optional[ConcurrencyLimit] = None,
+    process_pool: typing.Optional[ProcessPool] = None,
+    thread_pool: typing.Optional[ThreadPool] = None,
+    stream_buffer: int = 16,
+) -> ExecutionPlan:
+    """Compile a graph's flow into an ExecutionPlan.
+
+    Args:
+        flow (dict[str, typing.Union[GraphIO, NodeDataAggregator]]): Nodes and aggregators of the graph.
+        inputs (dict[str, NodeDataClass]): Graph inputs.
+        outputs (typing.Optional[NodeDataTracker]): Graph outputs.
+        semaphore (typing.Optional[ConcurrencyLimit], optional): graph-wide limit on running nodes. Defaults to None.
+        process_pool (typing.Optional[ProcessPool], optional): pool for nodes using the process executor. Defaults to None.
+        thread_pool (typing.Optional[ThreadPool], optional): pool for thread nodes without a pool of their own. Defaults to the event loop's default executor.
+        stream_buffer (int, optional): items buffered between a streaming node and each streaming consumer. Defaults to 16.
+
+    Flattened subgraphs are replaced by their inner steps.
+
+    Raises:
+        Exception: Raised when a node reads from something that is not part of the graph.
+        Exception: Raised when the flow contains a cycle.
+
+    Returns:
+        ExecutionPlan: the compiled plan.
+    """
+    flow, aliases = _expand_subgraphs(flow)
+    slots = dict()
+    plan_inputs = []
+    for input_name, input_dataclass in inputs.items():
+        for input_field in fields(input_dataclass):
+            slot = len(slots)
+            slots[(input_name, input_field.name)] = slot
+            plan_inputs.append(
+                (input_field.name, slot, getattr(input_dataclass, input_field.name))
+            )
+
+    step_names = list(flow.keys())
+    step_index = {name: index for index, name in enumerate(step_names)}
+    out_fields = []
+    for step_name in step_names:
+        out_fields.append(tuple(x.name for x in fields(flow[step_name].output)))
+        for out_field in out_fields[-1]:
+            slots[(step_name, out_field)] = len(slots)
+
+    plan_outputs = []
+    for node_name, field in _output_fields(outputs):
+        ref = _alias(aliases, (node_name, field))
+        if ref not in slots:
+            raise Exception(f"graph output {field} is not produced by the graph")
+        if field in [x[0] for x in plan_outputs]:
+            raise Exception(f"graph has more than one output named {field}")
+        plan_outputs.append((field, slots[ref]))
+    output_class = make_node_dataclass(
+        "graph_outputs",
+        [(field, "typing.Optional[typing.Any]", None) for field, _ in plan_outputs],
+    )
+
+    output_slots = set(x[1] for x in plan_outputs)
+
+    is_stream = [isinstance(flow[x].node, StreamNode) for x in step_names]
+    is_aggregator = [isinstance(flow[x], NodeDataAggregator) for x in step_names]
+    # partial aggregators stream their values like a streaming node
+    streams = [
+        is_stream[index] or (is_aggregator[index] and flow[x].partial)
+        for index, x in enumerate(step_names)
+    ]
+    step_args = []
+    producers = []
+    stream_inputs = []
+    for index, step_name in enumerate(step_names):
+        args = []
+        step_producers = set()
+        step_stream_inputs = set()
+        for kwd, (input_node_id, input_node_kwd) in flow[step_name].inputs.items():
+            input_node_id, input_node_kwd = _alias(
+                aliases, _resolve_input(input_node_id, input_node_kwd)
+            )
+            if input_node_id is None:
+                args.append((kwd, -1, input_node_kwd))
+                continue
+            if (input_node_id, input_node_kwd) not in slots:
+                raise Exception(
+                    f"{step_name} reads {input_node_kwd} from {input_node_id}, which is not part of the graph"
+                )
+            slot = slots[(input_node_id, input_node_kwd)]
+            args.append((kwd, slot, None))
+            if input_node_id in step_index:
+                producer = step_index[input_node_id]
+                step_producers.add(producer)
+                if streams[producer] and is_stream[index]:
+                    step_stream_inputs.add(slot)
+        step_args.append(tuple(args))
+        producers.append(step_producers)
+        stream_inputs.append(frozenset(step_stream_inputs))
+
+    # streaming consumers of a streaming node start with it, everything else waits for it to finish
+    consumers = [[] for _ in step_names]
+    stream_consumers = [[] for _ in step_names]
+    for index, step_producers in enumerate(producers):
+        for producer in sorted(step_producers):
+            if streams[producer] and is_stream[index]:
+                stream_consumers[producer].append(index)
+            else:
+                consumers[producer].append(index)
+
+    # Kahn's algorithm, one level at a time
+    levels = []
+    step_level = [0] * len(step_names)
+    waiting_on = [len(x) for x in producers]
+    level = [index for index, count in enumerate(waiting_on) if count == 0]
+    while level:
+        levels.append(tuple(level))
+        next_level = []
+        for index in level:
+            for consumer in consumers[index] + stream_consumers[index]:
+                waiting_on[consumer] -= 1
+                if waiting_on[consumer] == 0:
+                    step_level[consumer] = len(levels)
+                    next_level.append(consumer)
+        level = next_level
+    if sum(len(x) for x in levels) != len(step_names):
+        cycle = [step_names[i] for i, count in enumerate(waiting_on) if count > 0]
+        raise Exception(f"graph contains a cycle through: {cycle}")
+
+    # aggregators take each value as soon as its producer finishes
+    slot_producer = {
+        slots[(step_name, x)]: index
+        for index, step_name in enumerate(step_names)
+        for x in out_fields[index]
+    }
+    read_slots = set(output_slots)
+    for index, args in enumerate(step_args):
+        if not is_aggregator[index]:
+            read_slots.update(slot for _, slot, _ in args)
+    folds = [dict() for _ in step_names]
+    aggregator_inputs = [[] for _ in step_names]
+    for index, args in enumerate(step_args):
+        if not is_aggregator[index]:
+            continue
+        for position, (_, slot, constant) in enumerate(args):
+            if slot in slot_producer:
+                positions = folds[slot_producer[slot]].setdefault(index, [])
+                positions.append((position, slot))
+            else:
+                aggregator_inputs[index].append((position, slot, constant))
+
+    steps = []
+    for index, step_name in enumerate(step_names):
+        step_graphio = flow[step_name]
+        node = step_graphio.node
+        map_over, map_concurrency = None, None
+        if isinstance(node, MappedNode):
+            map_over, map_concurrency = node.over, node.max_concurrency
+            node = node.node
+        executor = None
+        if isinstance(step_graphio, NodeDataAggregator):
+            dispatch, call = INLINE, step_graphio
+        elif isinstance(node, AsyncNode) or (is_stream[index] and node.asynchronous):
+            dispatch, call = ASYNC, node.func
+        else:
+            dispatch = node.executor or THREAD
+            call = node.func
+            if dispatch == PROCESS:
+                if process_pool is None:
+                    raise Exception(
+                        f"{node.name} runs in a process but the graph has no process pool"
+                    )
+                executor = process_pool
+            elif dispatch == THREAD:
+                executor = node.thread_pool or thread_pool
+        steps.append(
+            PlanStep(
+                index=index,
+                name=step_name,
+                node=node,
+                call=call,
+                dispatch=dispatch,
+                args=step_args[index],
+                out_fields=out_fields[index],
+                out_slots=tuple(slots[(step_name, x)] for x in out_fields[index]),
+                consumers=tuple(consumers[index]),
+                n_deps=len(producers[index]),
+                level=step_level[index],
+                semaphore=node.semaphore,
+                rate_limiter=node.rate_limiter,
+                rate_limit_cost=node.rate_limit_cost,
+                executor=executor,
+                cache=node.cache,
+                cache_namespace=node_namespace(node.func)
+                if node.cache is not None
+                else None,
+                stream=is_stream[index],
+                stream_consumers=tuple(stream_consumers[index]),
+                stream_inputs=stream_inputs[index],
+                collect_stream=is_stream[index]
+                and (
+                    len(consumers[index]) > 0
+                    or any(slots[(step_name, x)] in output_slots for x in out_fields[index])
+                ),
+                timeout=node.timeout,
+                hedge=node.hedge,
+                map_over=map_over,
+                map_concurrency=map_concurrency,
+                aggregator=step_graphio if is_aggregator[index] else None,
+                aggregator_inputs=tuple(aggregator_inputs[index]),
+                folds=tuple((x, tuple(y)) for x, y in folds[index].items()),
+                drop_slots=tuple(
+                    sorted(
+                        set(
+                            slot
+                            for positions in folds[index].values()
+                            for _, slot in positions
+                            if slot not in read_slots
+                        )
+                    )
+                ),
+            )
+        )
+
+    return ExecutionPlan(
+        steps=tuple(steps),
+        levels=tuple(levels),
+        roots=levels[0] if levels else tuple(),
+        inputs=tuple(plan_inputs),
+        outputs=tuple(plan_outputs),
+        output_class=output_class,
+        n_slots=len(slots),
+        semaphore=semaphore,
+        stream_buffer=stream_buffer,
+        mean_durations=[None] * len(steps),
+        aggregators=tuple(index for index, x in enumerate(is_aggregator) if x),
+    )
@@ -0,0 +1,311 @@
+import json
+import typing
+from collections import deque
+from dataclasses import dataclass
+from mr_graph.hooks import GraphHooks
+
+FINISHED = "finished"
+SKIPPED = "skipped"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+@dataclass
+class NodeTiming:
+    """Timings of one step in one run. Times are time.perf_counter() values.
+
+    Attributes:
+        step (int): plan step index.
+        name (str): node name.
+        dispatch (str): how the node was run: "async", "inline", "thread" or "process".
+        ready (float, optional): when every input was available.
+        started (float, optional): when the call started, after any concurrency or rate limit.
+        finished (float, optional): when the result (or error) was available.
+        cache_hit (bool): the result came from the node's cache.
+        status (str): "finished", "skipped", "failed" or "cancelled".
+    """
+
+    step: int
+    name: str
+    dispatch: str
+    ready: typing.Optional[float] = None
+    started: typing.Optional[float] = None
+    finished: typing.Optional[float] = None
+    cache_hit: bool = False
+    status: str = SKIPPED
+
+    @property
+    def duration(self) -> float:
+        """Seconds from start to finish."""
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+    @property
+    def wait(self) -> float:
+        """Seconds from ready to start."""
+        if self.ready is None or self.started is None:
+            return 0.0
+        return self.started - self.ready
+
+
+class RunProfile:
+    """Timings of every step in one run of a graph.
+
+    Attributes:
+        started (float): when the run started.
+        finished (float, optional): when the run finished.
+        timings (list[NodeTiming]): one per plan step, in plan order.
+    """
+
+    started: float
+    finished: typing.Optional[float]
+    timings: list[NodeTiming]
+
+    def __init__(self, plan, started: float):
+        """Prepare the timings for a run of a plan.
+
+        Args:
+            plan (ExecutionPlan): the plan being run.
+            started (float): when the run started.
+        """
+        self.started = started
+        self.finished = None
+        self.timings = [
+            NodeTiming(step=step.index, name=step.node.name, dispatch=step.dispatch)
+            for step in plan.steps
+        ]
+        self.index = {step.name: step.index for step in plan.steps}
+        self._producers = [[] for _ in plan.steps]
+        for step in plan.steps:
+            for consumer in step.consumers + step.stream_consumers:
+                self._producers[consumer].append(step.index)
+
+    def _finish(
+        self, step: str, ready: float, started: float, finished: float, status: str
+    ) -> NodeTiming:
+        timing = self.timings[self.index[step]]
+        timing.ready = ready
+        timing.started = started
+        timing.finished = finished
+        timing.status = status
+        return timing
+
+    def critical_path(self) -> list[NodeTiming]:
+        """The chain of steps which determined how long the run took.
+
+        Starting from the last step to finish, each step is preceded by the input it waited on longest.
+
+        Returns:
+            list[NodeTiming]: steps on the critical path, first to last.
+        """
+        finished = [x for x in self.timings if x.finished is not None]
+        if not finished:
+            return []
+        timing = max(finished, key=lambda x: x.finished)
+        path = [timing]
+        while True:
+            producers = [
+                self.timings[x]
+                for x in self._producers[timing.step]
+                if self.timings[x].finished is not None
+            ]
+            if not producers:
+                break
+            timing = max(producers, key=lambda x: x.finished)
+            path.append(timing)
+        return path[::-1]
+
+
+@dataclass(frozen=True)
+class NodeSummary:
+    """Run times of a node over the profiled runs, in seconds.
+
+    Attributes:
+        count (int): calls (and cache hits) profiled.
+        cache_hits (int): results which came from the cache.
+        mean (float): mean time from start to finish.
+        p50 (float): median time from start to finish.
+        p95 (float): 95th percentile time from start to finish.
+        p99 (float): 99th percentile time from start to finish.
+        mean_wait (float): mean time from ready to start.
+        critical (int): runs in which the node was on the critical path.
+    """
+
+    count: int
+    cache_hits: int
+    mean: float
+    p50: float
+    p95: float
+    p99: float
+    mean_wait: float
+    critical: int
+
+
+def _percentile(values: list, q: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    return values[min(len(values) - 1, int(len(values) * q / 100))]
+
+
+class Profiler(GraphHooks):
+    """Hooks recording the timings of a graph's runs.
+
+    Attributes:
+        runs (deque[RunProfile]): the most recent runs.
+    """
+
+    runs: deque
+
+    def __init__(self, max_runs: int = 1000):
+        """Keep the timings of the last max_runs runs.
+
+        Args:
+            max_runs (int, optional): runs kept. Defaults to 1000.
+        """
+        self.runs = deque(maxlen=max_runs)
+        self._running = dict()
+
+    def on_run_start(self, run: int, plan: typing.Any, started: float):
+        self._running[run] = RunProfile(plan, started)
+
+    def on_node_start(
+        self, run: int, node: str, step: str, ready: float, started: float
+    ):
+        profile = self._running[run]
+        timing = profile.timings[profile.index[step]]
+        timing.ready = ready
+        timing.started = started
+
+    def on_node_end(
+        self,
+        run: int,
+        node: str,
+        step: str,
+        ready: float,
+        started: float,
+        finished: float,
+        cache_hit: bool,
+    ):
+        timing = self._running[run]._finish(step, ready, started, finished, FINISHED)
+        timing.cache_hit = cache_hit
+
+    def on_node_error(
+        self,
+        run: int,
+        node: str,
+        step: str,
+        ready: float,
+        started: float,
+        finished: float,
+        error: BaseException,
+    ):
+        self._running[run]._finish(step, ready, started, finished, FAILED)
+
+    def on_run_end(
+        self,
+        run: int,
+        started: float,
+        finished: float,
+        skipped: dict,
+        error: typing.Optional[BaseException],
+    ):
+        profile = self._running.pop(run)
+        profile.finished = finished
+        for timing in profile.timings:
+            if timing.started is not None and timing.finished is None:
+                timing.finished = finished
+                timing.status = CANCELLED
+        self.runs.append(profile)
+
+    def summary(self) -> dict[str, NodeSummary]:
+        """Percentiles of each node's run time over the recorded runs.
+
+        Returns:
+            dict[str, NodeSummary]: summaries by node name.
+        """
+        durations = dict()
+        waits = dict()
+        cache_hits = dict()
+        critical = dict()
+        for run in self.runs:
+            for timing in run.timings:
+                if timing.status != FINISHED:
+                    continue
+                durations.setdefault(timing.name, []).append(timing.duration)
+                waits.setdefault(timing.name, []).append(timing.wait)
+                cache_hits[timing.name] = cache_hits.get(timing.name, 0) + int(
+                    timing.cache_hit
+                )
+            for name in set(x.name for x in run.critical_path()):
+                critical[name] = critical.get(name, 0) + 1
+        summaries = dict()
+        for name, values in durations.items():
+            values = sorted(values)
+            summaries[name] = NodeSummary(
+                count=len(values),
+                cache_hits=cache_hits[name],
+                mean=sum(values) / len(values),
+                p50=_percentile(values, 50),
+                p95=_percentile(values, 95),
+                p99=_percentile(values, 99),
+                mean_wait=sum(waits[name]) / len(waits[name]),
+                critical=critical.get(name, 0),
+            )
+        return summaries
+
+    def chrome_trace(self) -> dict:
+        """The recorded runs as Chrome trace events, for chrome://tracing or Perfetto.
+
+        Each run is a process and each step a thread. Steps on the critical path are marked in their args.
+
+        Returns:
+            dict: trace in the Chrome trace-event JSON format.
+        """
+        events = []
+        if not self.runs:
+            return {"traceEvents": events, "displayTimeUnit": "ms"}
+        origin = self.runs[0].started
+        for pid, run in enumerate(self.runs):
+            critical = set(x.step for x in run.critical_path())
+            events.append(
+                {
+                    "name": "process_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "args": {"name": f"run {pid}"},
+                }
+            )
+            for timing in run.timings:
+                if timing.started is None:
+                    continue
+                events.append(
+                    {
+                        "name": timing.name,
+                        "cat": timing.dispatch,
+                        "ph": "X",
+                        "ts": (timing.started - origin) * 1e6,
+                        "dur": timing.duration * 1e6,
+                        "pid": pid,
+                        "tid": timing.step,
+                        "args": {
+                            "status": timing.status,
+                            "cache_hit": timing.cache_hit,
+                            "wait_us": timing.wait * 1e6,
+                            "critical": timing.step in critical,
+                        },
+                    }
+                )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str):
+        """Write chrome_trace() to a JSON file.
+
+        Args:
+            path (str): file to write.
+        """
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def clear(self):
+        """Forget the recorded runs."""
+        self.runs.clear()
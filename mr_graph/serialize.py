@@ -0,0 +1,355 @@
+import hashlib
+import importlib
+import json
+import types
+import typing
+from mr_graph.executors import PROCESS, THREAD, ProcessPool, ThreadPool
+from mr_graph.node import AsyncNode, StreamNode, SubgraphNode, SyncNode
+from mr_graph.node_data_aggregator import NodeDataAggregator
+from mr_graph.node_data_class import make_node_dataclass
+from mr_graph.plan import ExecutionPlan, PlanStep
+
+FORMAT_VERSION = 1
+"""Version of the saved plan layout. Files written with another version are refused.
+"""
+
+
+class StalePlanError(Exception):
+    """Raised when a saved plan no longer matches the code it refers to.
+
+    Attributes:
+        functions (list[str]): import paths of the functions which changed or could not be found.
+    """
+
+    def __init__(self, functions: list[str]):
+        super().__init__(
+            f"saved plan is out of date, save it again. Changed: {', '.join(functions)}"
+        )
+        self.functions = functions
+
+
+def function_path(func: typing.Callable) -> str:
+    """Import path of a function, as "module:qualified.name".
+
+    Args:
+        func (typing.Callable): the function.
+
+    Raises:
+        ValueError: Raised when the function cannot be imported by name, e.g. a lambda or a function defined inside another.
+
+    Returns:
+        str: the import path.
+    """
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None)
+    if module is None or qualname is None or "<" in qualname:
+        raise ValueError(
+            f"{func!r} cannot be imported by name, so a plan using it cannot be saved"
+        )
+    return f"{module}:{qualname}"
+
+
+def function_hash(func: typing.Callable) -> typing.Optional[str]:
+    """Hash what a function does: its bytecode, constants (including the docstring), names and argument names.
+
+    Unlike reading the source, this is cheap, and does not change when the function only moves within its file.
+
+    Args:
+        func (typing.Callable): the function.
+
+    Returns:
+        typing.Optional[str]: short hex digest, or None for functions without bytecode (builtins).
+    """
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return None
+    return hashlib.sha256(repr(_code_key(code)).encode()).hexdigest()[:16]
+
+
+def _code_key(code: types.CodeType) -> tuple:
+    consts = tuple(
+        _code_key(x) if isinstance(x, types.CodeType) else x for x in code.co_consts
+    )
+    return (code.co_code, consts, code.co_names, code.co_varnames)
+
+
+def import_function(path: str) -> typing.Callable:
+    """Import a function from a path made by function_path.
+
+    Args:
+        path (str): "module:qualified.name".
+
+    Raises:
+        ImportError: Raised when the module or the function cannot be found.
+
+    Returns:
+        typing.Callable: the function.
+    """
+    module_name, qualname = path.split(":")
+    value = importlib.import_module(module_name)
+    for attr in qualname.split("."):
+        try:
+            value = getattr(value, attr)
+        except AttributeError:
+            raise ImportError(f"{path} not found") from None
+    return value
+
+
+def _json_value(value: typing.Any, what: str) -> typing.Any:
+    try:
+        json.dumps(value)
+    except (TypeError, ValueError):
+        raise TypeError(
+            f"{what} {value!r} cannot be saved. Constants and input defaults must be JSON values."
+        ) from None
+    return value
+
+
+def save_plan(plan: ExecutionPlan, path: str):
+    """Write a compiled plan to a JSON file. Functions are saved by import path, with a hash of their code.
+
+    Limits, caches and hedges are not saved. Constants and input defaults must be JSON values, and come back as JSON
+    (tuples become lists).
+
+    Args:
+        plan (ExecutionPlan): the plan.
+        path (str): file to write.
+
+    Raises:
+        ValueError: Raised when a function cannot be imported by name, or the plan runs a subgraph which is not flattened.
+        TypeError: Raised when a constant or input default is not a JSON value.
+    """
+    functions = dict()
+
+    def ref(func: typing.Optional[typing.Callable]) -> typing.Optional[str]:
+        if func is None:
+            return None
+        func_path = function_path(func)
+        if func_path not in functions:
+            functions[func_path] = function_hash(func)
+        return func_path
+
+    steps = []
+    for step in plan.steps:
+        node = step.node
+        if isinstance(node, SubgraphNode):
+            raise ValueError(
+                f"{node.name} runs a subgraph. Add it with flatten=True to save the plan."
+            )
+        aggregator = None
+        if step.aggregator is not None:
+            aggregator = dict(
+                result_name=step.aggregator.result_name,
+                reduce=ref(step.aggregator.reduce),
+                initial=ref(step.aggregator.initial),
+                ordered=step.aggregator.ordered,
+                partial=step.aggregator.partial,
+            )
+            node_spec = None
+        else:
+            node_spec = dict(
+                name=node.name,
+                func=ref(node.func),
+                kind=(
+                    "stream"
+                    if isinstance(node, StreamNode)
+                    else "async" if isinstance(node, AsyncNode) else "sync"
+                ),
+                asynchronous=getattr(node, "asynchronous", None),
+                executor=node.executor,
+                thread_pool=None if node.thread_pool is None else node.thread_pool.name,
+            )
+        steps.append(
+            dict(
+                index=step.index,
+                name=step.name,
+                node=node_spec,
+                dispatch=step.dispatch,
+                args=[
+                    [kwd, slot, _json_value(constant, f"constant {kwd} of {step.name}")]
+                    for kwd, slot, constant in step.args
+                ],
+                out_fields=list(step.out_fields),
+                out_slots=list(step.out_slots),
+                consumers=list(step.consumers),
+                n_deps=step.n_deps,
+                level=step.level,
+                stream=step.stream,
+                stream_consumers=list(step.stream_consumers),
+                stream_inputs=sorted(step.stream_inputs),
+                collect_stream=step.collect_stream,
+                timeout=step.timeout,
+                map_over=step.map_over,
+                map_concurrency=step.map_concurrency,
+                aggregator=aggregator,
+                aggregator_inputs=[
+                    [position, slot, _json_value(constant, f"constant of {step.name}")]
+                    for position, slot, constant in step.aggregator_inputs
+                ],
+                folds=[
+                    [index, [list(x) for x in positions]]
+                    for index, positions in step.folds
+                ],
+                drop_slots=list(step.drop_slots),
+            )
+        )
+    saved = dict(
+        format=FORMAT_VERSION,
+        functions=functions,
+        steps=steps,
+        levels=[list(x) for x in plan.levels],
+        roots=list(plan.roots),
+        inputs=[
+            [field, slot, _json_value(default, f"default of input {field}")]
+            for field, slot, default in plan.inputs
+        ],
+        outputs=[list(x) for x in plan.outputs],
+        n_slots=plan.n_slots,
+        stream_buffer=plan.stream_buffer,
+    )
+    with open(path, "w") as f:
+        json.dump(saved, f)
+
+
+def load_plan(
+    path: str,
+    semaphore: typing.Optional[typing.Any] = None,
+    process_pool: typing.Optional[ProcessPool] = None,
+    thread_pools: typing.Optional[dict[str, ThreadPool]] = None,
+) -> ExecutionPlan:
+    """Read a plan written by save_plan. Functions are imported by path, without parsing signatures or docstrings.
+
+    Args:
+        path (str): file to read.
+        semaphore (typing.Optional[ConcurrencyLimit], optional): graph-wide limit on running nodes. Defaults to None.
+        process_pool (typing.Optional[ProcessPool], optional): pool for nodes using the process executor. Defaults to None.
+        thread_pools (typing.Optional[dict[str, ThreadPool]], optional): the graph's thread pools, by name. Defaults to None.
+
+    Raises:
+        ValueError: Raised when the file was written with another format version.
+        StalePlanError: Raised when a function cannot be imported, or its code has changed since the plan was saved.
+        KeyError: Raised when a node uses a thread pool which is not in thread_pools.
+
+    Returns:
+        ExecutionPlan: the plan, ready to run.
+    """
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("format") != FORMAT_VERSION:
+        raise ValueError(
+            f"{path} was saved with format {saved.get('format')}, expected {FORMAT_VERSION}"
+        )
+    thread_pools = thread_pools or dict()
+
+    functions = dict()
+    changed = []
+    for func_path, func_hash in saved["functions"].items():
+        try:
+            func = import_function(func_path)
+        except ImportError:
+            changed.append(func_path)
+            continue
+        if function_hash(func) != func_hash:
+            changed.append(func_path)
+        functions[func_path] = func
+    if changed:
+        raise StalePlanError(changed)
+
+    steps = []
+    for saved_step in saved["steps"]:
+        saved_aggregator = saved_step["aggregator"]
+        aggregator = None
+        executor = None
+        if saved_aggregator is not None:
+            aggregator = NodeDataAggregator(
+                saved_aggregator["result_name"],
+                reduce=functions.get(saved_aggregator["reduce"]),
+                initial=functions.get(saved_aggregator["initial"]),
+                ordered=saved_aggregator["ordered"],
+                partial=saved_aggregator["partial"],
+            )
+            node, call = aggregator.node, aggregator
+        else:
+            node = _load_node(saved_step["node"], functions[saved_step["node"]["func"]])
+            call = node.func
+            if saved_step["node"]["thread_pool"] is not None:
+                pool_name = saved_step["node"]["thread_pool"]
+                if pool_name not in thread_pools:
+                    raise KeyError(
+                        f"{node.name} runs in thread pool {pool_name}, which the graph does not have"
+                    )
+                node.thread_pool = thread_pools[pool_name]
+            if saved_step["dispatch"] == PROCESS:
+                executor = process_pool
+            elif saved_step["dispatch"] == THREAD:
+                executor = node.thread_pool or thread_pools.get("default")
+        steps.append(
+            PlanStep(
+                index=saved_step["index"],
+                name=saved_step["name"],
+                node=node,
+                call=call,
+                dispatch=saved_step["dispatch"],
+                args=tuple(tuple(x) for x in saved_step["args"]),
+                out_fields=tuple(saved_step["out_fields"]),
+                out_slots=tuple(saved_step["out_slots"]),
+                consumers=tuple(saved_step["consumers"]),
+                n_deps=saved_step["n_deps"],
+                level=saved_step["level"],
+                executor=executor,
+                stream=saved_step["stream"],
+                stream_consumers=tuple(saved_step["stream_consumers"]),
+                stream_inputs=frozenset(saved_step["stream_inputs"]),
+                collect_stream=saved_step["collect_stream"],
+                timeout=saved_step["timeout"],
+                map_over=saved_step["map_over"],
+                map_concurrency=saved_step["map_concurrency"],
+                aggregator=aggregator,
+                aggregator_inputs=tuple(
+                    tuple(x) for x in saved_step["aggregator_inputs"]
+                ),
+                folds=tuple(
+                    (index, tuple(tuple(x) for x in positions))
+                    for index, positions in saved_step["folds"]
+                ),
+                drop_slots=tuple(saved_step["drop_slots"]),
+            )
+        )
+
+    outputs = tuple(tuple(x) for x in saved["outputs"])
+    return ExecutionPlan(
+        steps=tuple(steps),
+        levels=tuple(tuple(x) for x in saved["levels"]),
+        roots=tuple(saved["roots"]),
+        inputs=tuple(tuple(x) for x in saved["inputs"]),
+        outputs=outputs,
+        output_class=make_node_dataclass(
+            "graph_outputs",
+            [(field, "typing.Optional[typing.Any]", None) for field, _ in outputs],
+        ),
+        n_slots=saved["n_slots"],
+        semaphore=semaphore,
+        stream_buffer=saved["stream_buffer"],
+        mean_durations=[None] * len(steps),
+        aggregators=tuple(
+            index for index, x in enumerate(steps) if x.aggregator is not None
+        ),
+    )
+
+
+def _load_node(spec: dict, func: typing.Callable):
+    """A node for a saved step. Its inputs and outputs dataclasses are not built, since the plan does not use them."""
+    if spec["kind"] == "stream":
+        node = StreamNode(
+            name=spec["name"],
+            inputs=None,
+            func=func,
+            outputs=None,
+            asynchronous=spec["asynchronous"],
+        )
+    elif spec["kind"] == "async":
+        node = AsyncNode(name=spec["name"], inputs=None, func=func, outputs=None)
+    else:
+        node = SyncNode(name=spec["name"], inputs=None, func=func, outputs=None)
+    node.executor = spec["executor"]
+    return node
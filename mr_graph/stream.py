@@ -0,0 +1,229 @@
+import asyncio
+import concurrent.futures
+import typing
+
+
+class _End:
+    """Marks the end of a stream. Carries the producer's error, if it failed."""
+
+    def __init__(self, error: typing.Optional[BaseException] = None):
+        self.error = error
+
+
+class NodeStream:
+    """Passes the items yielded by a streaming node to the streaming nodes that consume it.
+
+    Every consumer gets its own bounded queue when it starts. The producer waits while any queue is full,
+    so a slow consumer holds back the producer instead of letting items pile up in memory.
+
+    A consumer which also waits for a step that needs the whole stream starts late. The items yielded
+    before it starts are kept, and it reads those first.
+
+    Attributes:
+        maxsize (int): items buffered per consumer.
+        items (list, optional): every item yielded, kept when a non-streaming consumer or the graph output needs the whole list.
+        closed (bool): the run was abandoned. Items put from then on are dropped.
+    """
+
+    maxsize: int
+    items: typing.Optional[list]
+    closed: bool
+
+    def __init__(self, consumers: typing.Iterable[int], maxsize: int, collect: bool):
+        """Wait for the consumers to start. Their queues are opened when they read the stream.
+
+        Args:
+            consumers (typing.Iterable[int]): plan step indices of the consumers.
+            maxsize (int): items buffered per consumer.
+            collect (bool): keep every item.
+        """
+        self.maxsize = maxsize
+        self.items = [] if collect else None
+        self.closed = False
+        self._queues = dict()
+        self._waiting = set(consumers)
+        self._backlog = []
+        self._end = None
+        self._pending_put = None
+
+    def _keep(self, item: typing.Any):
+        if self.items is not None:
+            self.items.append(item)
+        elif self._waiting:
+            self._backlog.append(item)
+
+    async def put(self, item: typing.Any):
+        """Send an item to every consumer still reading, and keep it for those yet to start."""
+        if self.closed:
+            return
+        self._keep(item)
+        for queue in list(self._queues.values()):
+            await queue.put(item)
+
+    def put_nowait(self, item: typing.Any):
+        """put, for streams without a limit on their queues (maxsize 0)."""
+        self._keep(item)
+        for queue in self._queues.values():
+            queue.put_nowait(item)
+
+    def put_threadsafe(self, item: typing.Any, loop: asyncio.AbstractEventLoop):
+        """put, from a producer running in a worker thread. Blocks while a queue is full, or until the stream is aborted."""
+        self._pending_put = asyncio.run_coroutine_threadsafe(self.put(item), loop)
+        try:
+            self._pending_put.result()
+        except concurrent.futures.CancelledError:
+            pass
+
+    async def close(self, error: typing.Optional[BaseException] = None):
+        """Tell every consumer the stream has ended.
+
+        Args:
+            error (typing.Optional[BaseException], optional): raised by the consumers when the producer failed. Defaults to None.
+        """
+        if self.closed:
+            return
+        self._end = _End(error)
+        for queue in list(self._queues.values()):
+            await queue.put(self._end)
+
+    def close_nowait(self):
+        """close, for streams without a limit on their queues (maxsize 0)."""
+        self._end = _End()
+        for queue in self._queues.values():
+            queue.put_nowait(self._end)
+
+    def abort(self):
+        """Unblock everything waiting on the stream, when the run stops before it ends.
+
+        A producer waiting for room in a queue returns, and drops its later items. Consumers still reading are
+        sent the end of the stream, and raise asyncio.CancelledError.
+        """
+        self.closed = True
+        if self._pending_put is not None:
+            self._pending_put.cancel()
+        for queue in self._queues.values():
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_End(asyncio.CancelledError("stream aborted")))
+        self._queues = dict()
+        self._end = _End(asyncio.CancelledError("stream aborted"))
+        self._waiting.clear()
+        self._backlog = []
+
+    def detach(self, index: int):
+        """Stop sending items to a consumer that has finished or will never start, and unblock the producer if it was waiting on it."""
+        self._waiting.discard(index)
+        if not self._waiting:
+            self._backlog = []
+        queue = self._queues.pop(index, None)
+        while queue is not None and not queue.empty():
+            queue.get_nowait()
+
+    def _attach(self, index: int) -> tuple[list, asyncio.Queue]:
+        """Open the queue of a consumer which is starting, returning the items it missed."""
+        self._waiting.discard(index)
+        missed = list(self._backlog if self.items is None else self.items)
+        if not self._waiting:
+            self._backlog = []
+        queue = asyncio.Queue(self.maxsize)
+        if self._end is None:
+            self._queues[index] = queue
+        else:
+            queue.put_nowait(self._end)
+        return missed, queue
+
+    def reader(self, index: int) -> typing.AsyncIterator:
+        """Async iterator over the items sent to a consumer.
+
+        Args:
+            index (int): plan step index of the consumer.
+
+        Returns:
+            typing.AsyncIterator: the items, in the order they were yielded.
+        """
+        return _read(*self._attach(index))
+
+    def sync_reader(
+        self, index: int, loop: asyncio.AbstractEventLoop
+    ) -> typing.Iterator:
+        """Blocking iterator over the items sent to a consumer running in a worker thread.
+
+        Args:
+            index (int): plan step index of the consumer.
+            loop (asyncio.AbstractEventLoop): the event loop running the graph.
+
+        Returns:
+            typing.Iterator: the items, in the order they were yielded.
+        """
+        return _read_sync(*self._attach(index), loop)
+
+
+def _read_sync(
+    missed: list, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop
+) -> typing.Iterator:
+    yield from missed
+    while True:
+        item = asyncio.run_coroutine_threadsafe(queue.get(), loop).result()
+        if isinstance(item, _End):
+            if item.error is not None:
+                raise item.error
+            return
+        yield item
+
+
+async def _read(missed: list, queue: asyncio.Queue) -> typing.AsyncIterator:
+    for item in missed:
+        yield item
+    while True:
+        item = await queue.get()
+        if isinstance(item, _End):
+            if item.error is not None:
+                raise item.error
+            return
+        yield item
+
+
+async def drain_async(
+    call: typing.Callable, kwds: dict, stream: NodeStream
+) -> typing.Optional[list]:
+    """Run an async generator node, sending its items downstream.
+
+    Returns:
+        typing.Optional[list]: every item yielded, when the stream collects them.
+    """
+    try:
+        async for item in call(**kwds):
+            await stream.put(item)
+    except Exception as err:
+        await stream.close(err)
+        raise
+    await stream.close()
+    return stream.items
+
+
+def drain_sync(
+    call: typing.Callable,
+    kwds: dict,
+    stream: NodeStream,
+    loop: asyncio.AbstractEventLoop,
+) -> typing.Optional[list]:
+    """Run a generator node in a worker thread, sending its items downstream.
+
+    Returns:
+        typing.Optional[list]: every item yielded, when the stream collects them.
+    """
+    generator = call(**kwds)
+    try:
+        for item in generator:
+            if stream.closed:
+                # the run was abandoned, nothing reads the items any more
+                generator.close()
+                return stream.items
+            stream.put_threadsafe(item, loop)
+    except Exception as err:
+        if not stream.closed:
+            asyncio.run_coroutine_threadsafe(stream.close(err), loop).result()
+        raise
+    if not stream.closed:
+        asyncio.run_coroutine_threadsafe(stream.close(), loop).result()
+    return stream.items
@@ -1,8 +1,18 @@
+import asyncio
 import typing
 from statistics import mean
 
 Point = typing.NamedTuple("Point", [("x", int), ("y", int)])
 
+# names of the counting nodes below, in the order they were called
+calls = []
+
+
+class Running:
+    now = 0
+    most = 0
+    calls = 0
+
 
 def return_one():
     """
@@ -240,3 +250,142 @@ async def average_list(list_of_ints: list[int]):
         average of the list
     """
     return mean(list_of_ints)
+
+
+def square(n: int):
+    """
+    square a number
+
+    Parameters
+    ----------
+    n : int
+        a number.
+
+    Returns
+    -------
+    value : int
+        n * n
+    """
+    calls.append("square")
+    return n * n
+
+
+def double(x: int):
+    """
+    double a number
+
+    Parameters
+    ----------
+    x : int
+        a number.
+
+    Returns
+    -------
+    doubled : int
+        2 * x
+    """
+    calls.append("double")
+    return 2 * x
+
+
+def negate(x: int):
+    """
+    negate a number
+
+    Parameters
+    ----------
+    x : int
+        a number.
+
+    Returns
+    -------
+    negated : int
+        -x
+    """
+    calls.append("negate")
+    return -x
+
+
+def total(values: list):
+    """
+    add up a list
+
+    Parameters
+    ----------
+    values : list
+        numbers.
+
+    Returns
+    -------
+    sum_of : int
+        sum of the values
+    """
+    calls.append("total")
+    return sum(values)
+
+
+def add_p_q(p: int, q: int):
+    """
+    add two numbers
+
+    Parameters
+    ----------
+    p : int
+        first number
+    q : int
+        second number
+
+    Returns
+    -------
+    r : int
+        equal to p + q
+    """
+    return p + q
+
+
+def echo(value):
+    """
+    return the input
+
+    Parameters
+    ----------
+    value : typing.Any
+        anything
+
+    Returns
+    -------
+    echoed : typing.Any
+        the input
+    """
+    return value
+
+
+async def answer_question(user_question: str):
+    """get an answer, counting the calls running at once
+
+    Returns
+    -------
+    completion : str
+        LLM completion
+    """
+    Running.now += 1
+    Running.most = max(Running.most, Running.now)
+    await asyncio.sleep(0.01)
+    Running.now -= 1
+    return f" answer to {user_question} \n"
+
+
+def format_answer(user_question: str, completion: str):
+    """parse the answer
+
+    Args:
+        user_question (str): user question sent to the LLM. might be needed to determine formatting.
+        completion (str): LLM completion.
+
+    Returns
+    -------
+    answer : dict[str, str]
+        LLM completion
+    """
+    answer = completion.strip(" \n")
+    return answer
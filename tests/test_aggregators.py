@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.plan import MISSING
+from functions import square
+
+
+async def wait_return(n: int, delay: float = 0):
+    """
+    return a number after a delay
+
+    Parameters
+    ----------
+    n : int
+        a number.
+    delay : float
+        seconds to wait.
+
+    Returns
+    -------
+    value : int
+        equal to n
+    """
+    await asyncio.sleep(delay)
+    return n
+
+
+def identity(total):
+    """
+    return the aggregated value
+
+    Parameters
+    ----------
+    total : typing.Any
+        aggregated value.
+
+    Returns
+    -------
+    result : typing.Any
+        the same value
+    """
+    return total
+
+
+async def running_totals(total):
+    """
+    pass running results on as they arrive
+
+    Parameters
+    ----------
+    total : typing.AsyncIterator
+        running results.
+
+    Yields
+    -------
+    seen : int
+        each running result
+    """
+    async for x in total:
+        yield x
+
+
+def fan_in(g: Graph, node: str, values: list, delays: list = None, **kwds):
+    total = g.aggregator(name="total", **kwds)
+    for i, n in enumerate(values):
+        if delays is None:
+            total += getattr(g, node)(n=n).value
+        else:
+            total += getattr(g, node)(n=n, delay=delays[i]).value
+    return total
+
+
+@pytest.mark.asyncio
+async def test_reduce():
+    g = Graph(nodes=[identity])
+    g.add_node(square, executor="inline")
+    g.outputs = g.identity(
+        total=fan_in(g, "square", range(100), reduce=lambda a, b: a + b, initial=int)
+    )
+    v = await g()
+    assert v.result == sum(x * x for x in range(100))
+
+    # the values are not kept once they are added
+    plan = g.compile()
+    values = await plan.execute(plan.bind(tuple(), dict()))
+    assert all(
+        values[step.out_slots[0]] is MISSING for step in plan.steps if step.folds
+    )
+
+
+@pytest.mark.asyncio
+async def test_reduce_top_k_and_merge():
+    g = Graph(nodes=[identity])
+    g.add_node(square, executor="inline")
+    top = lambda a, b: heapq.nlargest(3, a + [b])
+    g.outputs = g.identity(
+        total=fan_in(g, "square", [3, 1, 4, 1, 5, 9, 2, 6], reduce=top, initial=list)
+    )
+    v = await g()
+    assert v.result == [81, 36, 25]
+
+    g = Graph(nodes=[identity])
+    g.add_node(square, executor="inline")
+    total = g.aggregator(name="total", reduce=lambda a, b: {**a, **b}, initial=dict)
+    total += {"a": 1}
+    total += {"b": 2}
+    g.outputs = g.identity(total=total)
+    v = await g()
+    assert v.result == {"a": 1, "b": 2}
+
+
+@pytest.mark.asyncio
+async def test_completion_order():
+    delays = [0.03, 0.01, 0.02]
+    g = Graph(nodes=[wait_return, identity])
+    g.outputs = g.identity(total=fan_in(g, "wait_return", [1, 2, 3], delays))
+    assert (await g()).result == [1, 2, 3]
+
+    g = Graph(nodes=[wait_return, identity])
+    g.outputs = g.identity(
+        total=fan_in(g, "wait_return", [1, 2, 3], delays, ordered=False)
+    )
+    assert (await g()).result == [2, 3, 1]
+
+    g = Graph(nodes=[wait_return, identity])
+    g.outputs = g.identity(
+        total=fan_in(
+            g,
+            "wait_return",
+            [1, 2, 3],
+            delays,
+            ordered=False,
+            reduce=lambda a, b: a * 10 + b,
+        )
+    )
+    assert (await g()).result == 231
+
+
+@pytest.mark.asyncio
+async def test_partial_results():
+    g = Graph(nodes=[wait_return, running_totals])
+    total = fan_in(
+        g,
+        "wait_return",
+        [1, 2, 3],
+        [0.01, 0.02, 0.03],
+        reduce=lambda a, b: a + b,
+        partial=True,
+    )
+    g.outputs = g.running_totals(total=total)
+    v = await g()
+    assert v.seen == [1, 3, 6]
+
+
+@pytest.mark.asyncio
+async def test_missing_value():
+    g = Graph(nodes=[wait_return, identity])
+    total = g.aggregator(name="total", reduce=lambda a, b: a + b)
+    total += g.wait_return(n=g.input(name="a").a).value
+    total += g.wait_return(n=g.input(name="b").b).value
+    g.outputs = g.identity(total=total)
+    assert (await g(a=1, b=2)).result == 3
+    v = await g(a=1)
+    assert v.result is None
+    assert set(getattr(v, "__skipped").values()) == {"missing input"}
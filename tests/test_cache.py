@@ -0,0 +1,274 @@
+import asyncio
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.cache import MemoryCache, DiskCache, NodeCache, node_namespace, main
+
+calls = []
+
+
+async def lookup(user_question: str):
+    """
+    pretend to call an expensive service
+
+    Parameters
+    ----------
+    user_question : str
+        question
+
+    Returns
+    -------
+    completion : str
+        answer
+    """
+    calls.append(user_question)
+    return user_question.upper()
+
+
+def count_words(completion: str):
+    """
+    count words
+
+    Parameters
+    ----------
+    completion : str
+        text
+
+    Returns
+    -------
+    words : int
+        number of words
+    """
+    calls.append(completion)
+    return len(completion.split())
+
+
+@pytest.mark.asyncio
+async def test_cache_hits_skip_the_function():
+    calls.clear()
+    g = Graph()
+    g.add_node(lookup, cache=True)
+    g.add_node(count_words, cache=True)
+
+    v = await g.batch(["a b", "c", "a b", "a b"], max_in_flight=1)
+    assert [x.words for x in v] == [2, 1, 2, 2]
+    assert calls == ["a b", "A B", "c", "C"]
+
+    stats = g.cache_stats()
+    assert stats["lookup"].hits == 2
+    assert stats["lookup"].misses == 2
+    assert stats["count_words"].entries == 2
+
+
+def test_memory_cache_lru_entries():
+    cache = MemoryCache(max_entries=2)
+    keys = [cache.key("f", {"x": x}) for x in range(3)]
+    cache.set(keys[0], 0)
+    cache.set(keys[1], 1)
+    assert cache.get(keys[0]) == (True, 0)
+    cache.set(keys[2], 2)
+    # keys[1] was the least recently used
+    assert cache.get(keys[1]) == (False, None)
+    assert cache.get(keys[0]) == (True, 0)
+    assert cache.stats().evictions == 1
+
+
+def test_memory_cache_bytes_and_ttl():
+    cache = MemoryCache(max_entries=None, max_bytes=2000)
+    cache.set("a", "x" * 900)
+    cache.set("b", "x" * 900)
+    cache.set("c", "x" * 900)
+    assert cache.stats().entries == 2
+    assert cache.get("a") == (False, None)
+    # larger than the whole cache
+    cache.set("d", "x" * 5000)
+    assert cache.get("d") == (False, None)
+
+    cache = MemoryCache(ttl=0.01)
+    cache.set("a", 1)
+    assert cache.get("a") == (True, 1)
+    time.sleep(0.02)
+    assert cache.get("a") == (False, None)
+
+
+def test_cache_keys():
+    cache = MemoryCache()
+    assert cache.key("f", {"x": 1, "y": 2}) == cache.key("f", {"y": 2, "x": 1})
+    assert cache.key("f", {"x": 1}) != cache.key("g", {"x": 1})
+    assert cache.key("f", {"x": lambda: 1}) is None
+
+
+def test_node_cache_is_abstract():
+    class KeysOnly(NodeCache):
+        def get(self, key):
+            return False, None
+
+    with pytest.raises(TypeError):
+        NodeCache()
+    with pytest.raises(TypeError):
+        KeysOnly()
+
+
+key_script = """
+from mr_graph.cache import MemoryCache
+tags = {"alpha", "beta", "gamma", "delta"}
+print(MemoryCache().key("f", {"tags": tags, "nested": [frozenset(tags), {"t": tags}]}))
+"""
+
+
+def test_cache_keys_stable_between_processes():
+    keys = [
+        subprocess.run(
+            [sys.executable, "-c", key_script],
+            env={**os.environ, "PYTHONHASHSEED": seed},
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in ["1", "2", "3"]
+    ]
+    assert keys[0] == keys[1] == keys[2]
+    cache = MemoryCache()
+    assert cache.key("f", {"tags": {1, 2}}) != cache.key(
+        "f", {"tags": frozenset({1, 2})}
+    )
+    assert cache.key("f", {"tags": {1, 2}}) != cache.key("f", {"tags": [1, 2]})
+
+
+def write_entries(path: str, start: int):
+    cache = DiskCache(path)
+    for n in range(start, start + 50):
+        cache.set(cache.key("worker", {"n": n}), n)
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    calls.clear()
+    for _ in range(2):
+        # a new graph and cache each time, as in a new process
+        g = Graph()
+        g.add_node(lookup, cache=DiskCache(path))
+        g.add_node(count_words)
+        v = await g("a b c")
+        assert v.words == 3
+        g.nodes["lookup"].cache.close()
+    assert calls == ["a b c", "A B C", "A B C"]
+
+
+@pytest.mark.asyncio
+async def test_disk_cache_locked_by_another_process(tmp_path):
+    path = str(tmp_path / "cache.db")
+    calls.clear()
+    g = Graph()
+    g.add_node(lookup, cache=DiskCache(path, timeout=0.5))
+    g.add_node(count_words)
+    await g("a b")
+
+    # another process holds the write lock
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    longest_gap = 0
+
+    async def heartbeat():
+        nonlocal longest_gap
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(0.01)
+            longest_gap = max(longest_gap, time.monotonic() - before)
+
+    beating = asyncio.create_task(heartbeat())
+    try:
+        assert (await g("a b")).words == 2
+        assert (await g("c d e")).words == 3
+    finally:
+        beating.cancel()
+        blocker.execute("ROLLBACK")
+        blocker.close()
+    # the hit is still answered, the new result is just not stored, and the event loop never waits on the lock
+    assert calls == ["a b", "A B", "A B", "c d e", "C D E"]
+    assert longest_gap < 0.25
+    cache = g.nodes["lookup"].cache
+    assert cache.stats().hits == 1
+    namespace = node_namespace(lookup)
+    assert cache.get(cache.key(namespace, {"user_question": "a b"})) == (True, "A B")
+    assert cache.get(cache.key(namespace, {"user_question": "c d e"})) == (False, None)
+    cache.close()
+
+
+def test_disk_cache_shared_between_processes(tmp_path):
+    path = str(tmp_path / "cache.db")
+    DiskCache(path).close()
+    workers = [
+        multiprocessing.Process(target=write_entries, args=(path, 50 * n))
+        for n in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert all(worker.exitcode == 0 for worker in workers)
+
+    cache = DiskCache(path)
+    assert cache.stats().entries == 200
+    assert cache.get(cache.key("worker", {"n": 123})) == (True, 123)
+    cache.close()
+
+
+def test_disk_cache_limits(tmp_path):
+    cache = DiskCache(str(tmp_path / "cache.db"), max_entries=3)
+    for n in range(5):
+        cache.set(f"f@1:{n}", n)
+    assert cache.stats().entries == 3
+    assert cache.get("f@1:0") == (False, None)
+    assert cache.get("f@1:4") == (True, 4)
+
+    cache = DiskCache(str(tmp_path / "sized.db"), max_bytes=3000)
+    for n in range(5):
+        cache.set(f"f@1:{n}", "x" * 1000)
+    assert cache.stats().size <= 3000
+    assert cache.get("f@1:4")[0]
+
+    cache = DiskCache(str(tmp_path / "ttl.db"), ttl=0.01)
+    cache.set("f@1:a", 1)
+    time.sleep(0.02)
+    assert cache.get("f@1:a") == (False, None)
+
+
+def test_namespace_tracks_source():
+    def f(x):
+        return x
+
+    namespace = node_namespace(f)
+    assert namespace.startswith("test_cache.test_namespace_tracks_source.<locals>.f@")
+
+    def f(x):
+        return x + 1
+
+    assert node_namespace(f) != namespace
+
+
+def test_disk_cache_cli(tmp_path, capsys):
+    path = str(tmp_path / "cache.db")
+    cache = DiskCache(path)
+    cache.set("a.f@1:x", 1)
+    cache.set("a.f@2:x", 2)
+    cache.set("a.g@1:x", 3)
+    cache.close()
+
+    main(["inspect", path])
+    out = capsys.readouterr().out
+    assert "a.f@1\t1\t" in out
+    assert "total\t3\t" in out
+
+    main(["purge", path, "--namespace", "a.f"])
+    assert capsys.readouterr().out == "removed 2 entries\n"
+    main(["purge", path])
+    assert capsys.readouterr().out == "removed 1 entries\n"
@@ -0,0 +1,60 @@
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.plan import ASYNC, THREAD
+from functions import sub_1, add_1, mult_2
+
+
+@pytest.mark.asyncio
+async def test_compile_fan_out():
+    g = Graph(nodes=[sub_1, add_1, mult_2])
+    i_0 = g.input(name="n")
+    o_1 = g.add_1(i_0)
+    g.outputs = g.mult_2(o_1)
+    g.outputs += g.sub_1(o_1)
+
+    plan = g.compile()
+    assert [len(x) for x in plan.levels] == [1, 2]
+    assert [plan.steps[x].node.name for x in plan.roots] == ["add_1"]
+    assert len(plan.steps[plan.roots[0]].consumers) == 2
+    assert {x.node.name: x.dispatch for x in plan.steps} == {
+        "add_1": ASYNC,
+        "sub_1": ASYNC,
+        "mult_2": THREAD,
+    }
+    assert [x[0] for x in plan.inputs] == ["n"]
+    assert sorted(x[0] for x in plan.outputs) == ["p", "q"]
+
+    # the plan is reused between calls
+    for n in range(3):
+        v = await g(n=n)
+        assert v.q == 2 * (n + 1)
+        assert v.p == n
+    assert g.compile() is plan
+
+
+@pytest.mark.asyncio
+async def test_compile_invalidated_by_changes():
+    g = Graph(nodes=[sub_1, add_1, mult_2])
+    o_1 = g.add_1()
+    g.outputs = g.mult_2(o_1)
+    plan = g.compile()
+    assert len(plan.steps) == 2
+
+    g.outputs = g.sub_1(o_1)
+    assert g.plan is None
+    assert len(g.compile().steps) == 3
+    v = await g(n=1)
+    assert v.p == 1
+
+
+@pytest.mark.asyncio
+async def test_compile_implicit():
+    g = Graph(nodes=[sub_1, add_1, mult_2])
+    plan = g.compile()
+    assert [plan.steps[x[0]].node.name for x in plan.levels] == [
+        "add_1",
+        "sub_1",
+        "mult_2",
+    ]
+    v = await g(n=5)
+    assert v.q == 10
@@ -0,0 +1,47 @@
+import asyncio
+import random
+import pytest
+from mr_graph.graph import Graph
+from functions import sub_1, add_1, mult_2
+
+
+async def jitter_add_1(n: int):
+    """
+    add 1 to a number after a random delay
+
+    Parameters
+    ----------
+    n : int
+        number to add 1 to.
+
+    Returns
+    -------
+    m : int
+        equal to n + 1
+    """
+    await asyncio.sleep(random.random() / 100)
+    return n + 1
+
+
+@pytest.mark.asyncio
+async def test_overlapping_calls():
+    g = Graph(nodes=[jitter_add_1, sub_1, mult_2])
+    o_1 = g.jitter_add_1()
+    g.outputs = g.mult_2(o_1.m)
+    g.outputs += g.sub_1(o_1)
+
+    results = await asyncio.gather(*[g(n=n) for n in range(200)])
+    for n, v in enumerate(results):
+        assert v.q == 2 * (n + 1)
+        assert v.p == n
+
+
+@pytest.mark.asyncio
+async def test_results_are_not_shared():
+    g = Graph(nodes=[add_1])
+    g.outputs = g.add_1()
+    v_1 = await g(1)
+    v_2 = await g(2)
+    assert v_1 is not v_2
+    assert v_1.m == 2
+    assert v_2.m == 3
@@ -0,0 +1,159 @@
+import asyncio
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.plan import DeadlineExceeded, NodeTimeoutError
+from functions import add_1
+
+
+class Calls:
+    slow = 0
+    cancelled = 0
+
+
+async def quick(n: int):
+    """
+    return a number after a very short wait
+
+    Parameters
+    ----------
+    n : int
+        a number.
+
+    Returns
+    -------
+    fast : int
+        equal to n
+    """
+    await asyncio.sleep(0.001)
+    return n
+
+
+async def slow(m: int):
+    """
+    return a number after a long wait
+
+    Parameters
+    ----------
+    m : int
+        a number.
+
+    Returns
+    -------
+    n : int
+        equal to m
+    """
+    Calls.slow += 1
+    try:
+        await asyncio.sleep(0.2)
+    except asyncio.CancelledError:
+        Calls.cancelled += 1
+        raise
+    return m
+
+
+async def fail(k: int):
+    """
+    fail after a short wait
+
+    Parameters
+    ----------
+    k : int
+        a number.
+
+    Returns
+    -------
+    bad : int
+        never returned
+    """
+    await asyncio.sleep(0.01)
+    raise RuntimeError("failed")
+
+
+def two_branches(g: Graph):
+    i0 = g.input(name="m")
+    i1 = g.input(name="n")
+    g.outputs = [g.add_1(g.slow(i0)), g.quick(i1)]
+
+
+@pytest.mark.asyncio
+async def test_node_timeout():
+    g = Graph()
+    g.add_node(slow, timeout=0.01)
+    g.outputs = g.slow()
+
+    with pytest.raises(NodeTimeoutError):
+        await g(m=1)
+
+
+@pytest.mark.asyncio
+async def test_failure_cancels_siblings():
+    Calls.cancelled = 0
+    g = Graph(nodes=[slow, fail])
+    i0 = g.input(name="m")
+    i1 = g.input(name="k")
+    g.outputs = [g.slow(i0), g.fail(i1)]
+
+    with pytest.raises(RuntimeError):
+        await g(m=1, k=2)
+    assert Calls.cancelled == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_exceeded():
+    g = Graph(nodes=[slow, quick, add_1])
+    two_branches(g)
+
+    with pytest.raises(DeadlineExceeded) as err:
+        await g(m=1, n=2, deadline=0.05)
+    assert err.value.outputs.fast == 2
+    assert set(err.value.skipped.values()) == {"deadline"}
+    assert len(err.value.skipped) == 2
+
+
+@pytest.mark.asyncio
+async def test_deadline_partial():
+    g = Graph(nodes=[slow, quick, add_1])
+    two_branches(g)
+
+    v = await g(m=1, n=2, deadline=0.05, return_partial=True)
+    assert v.fast == 2
+    assert v.m is None
+    assert len(getattr(v, "__skipped")) == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_node_not_started():
+    g = Graph(nodes=[slow, quick, add_1])
+    two_branches(g)
+    v = await g(m=1, n=2)
+    assert v.m == 2
+
+    Calls.slow = 0
+    v = await g(m=1, n=2, deadline=0.1, return_partial=True)
+    assert Calls.slow == 0
+    assert v.fast == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_input_reported():
+    g = Graph(nodes=[slow, quick, add_1])
+    two_branches(g)
+
+    v = await g(n=2)
+    assert v.fast == 2
+    assert set(getattr(v, "__skipped").values()) == {"missing input"}
+
+
+@pytest.mark.asyncio
+async def test_timeout_excludes_waiting_for_limits():
+    # each call takes 0.2s and runs alone, so the third waits 0.4s before it starts
+    g = Graph()
+    g.add_node(slow, max_concurrency=1, timeout=0.3)
+    g.outputs = g.slow()
+    values = await asyncio.gather(*[g(m=m) for m in range(3)])
+    assert [v.n for v in values] == [0, 1, 2]
+
+    g = Graph()
+    g.add_node(slow, max_concurrency=1, timeout=0.3)
+    g.outputs = g.map_node("slow", "m", m=[1, 2, 3])
+    assert (await g()).n == [1, 2, 3]
@@ -0,0 +1,204 @@
+import os
+import time
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from mr_graph.graph import Graph
+from mr_graph.plan import PROCESS, INLINE
+from mr_graph.executors import ThreadPool
+from functions import echo
+
+
+def worker_pid(n: int):
+    """
+    return the process id of the worker
+
+    Parameters
+    ----------
+    n : int
+        a number passed through
+
+    Returns
+    -------
+    pid : int
+        process id
+    total : int
+        sum of range(n)
+    """
+    return os.getpid(), sum(range(n))
+
+
+def worker_thread(n: int):
+    """
+    return the thread id
+
+    Parameters
+    ----------
+    n : int
+        unused
+
+    Returns
+    -------
+    thread_id : int
+        thread id
+    """
+    return threading.get_ident()
+
+
+def make_lock(n: int):
+    """
+    return something that cannot be pickled
+
+    Parameters
+    ----------
+    n : int
+        unused
+
+    Returns
+    -------
+    lock : typing.Any
+        a lock
+    """
+    return threading.Lock()
+
+
+@pytest.mark.asyncio
+async def test_process_executor():
+    g = Graph(process_pool=2)
+    g.add_node(worker_pid, executor="process")
+    g.outputs = g.worker_pid()
+    assert g.compile().steps[0].dispatch == PROCESS
+
+    try:
+        results = await g.batch([{"n": n} for n in range(8)])
+    finally:
+        g.shutdown()
+    assert [x.total for x in results] == [sum(range(n)) for n in range(8)]
+    assert os.getpid() not in {x.pid for x in results}
+
+
+@pytest.mark.asyncio
+async def test_inline_executor():
+    g = Graph()
+    g.add_node(worker_thread, executor="inline")
+    g.outputs = g.worker_thread()
+    assert g.compile().steps[0].dispatch == INLINE
+    v = await g(1)
+    assert v.thread_id == threading.get_ident()
+
+
+def test_process_executor_needs_picklable_function():
+    def local_function(n: int):
+        """
+        Returns
+        -------
+        m : int
+            n
+        """
+        return n
+
+    g = Graph()
+    with pytest.raises(TypeError, match="local_function"):
+        g.add_node(local_function, executor="process")
+
+
+@pytest.mark.asyncio
+async def test_process_executor_unpicklable_values():
+    g = Graph()
+    g.add_node(echo, executor="process")
+    g.add_node(make_lock, executor="process")
+    g.outputs = g.echo()
+    g.outputs += g.make_lock()
+    try:
+        with pytest.raises(TypeError, match="arguments of node echo"):
+            await g(value=lambda: 1, n=1)
+        with pytest.raises(TypeError, match="returned by node make_lock"):
+            await g(value=1, n=1)
+    finally:
+        g.shutdown()
+
+
+def test_executor_validation():
+    async def async_echo(value):
+        """
+        Returns
+        -------
+        echoed : typing.Any
+            the input
+        """
+        return value
+
+    g = Graph()
+    with pytest.raises(ValueError):
+        g.add_node(echo, executor="gpu")
+    with pytest.raises(ValueError):
+        g.add_node(async_echo, executor="thread")
+
+
+def thread_name(n: int):
+    """
+    return the name of the worker thread after a short wait
+
+    Parameters
+    ----------
+    n : int
+        unused
+
+    Returns
+    -------
+    name : str
+        thread name
+    """
+    time.sleep(0.02)
+    return threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_named_thread_pools():
+    g = Graph(thread_pools={"files": 1, "default": 4})
+    g.add_node(thread_name, thread_pool="files")
+    g.add_node(worker_thread)
+    g.outputs = g.thread_name()
+    g.outputs += g.worker_thread()
+
+    start = time.perf_counter()
+    try:
+        results = await g.batch([(n, n) for n in range(5)])
+    finally:
+        g.shutdown()
+    # a single worker runs the calls one at a time
+    assert time.perf_counter() - start >= 0.1
+    assert all(x.name.startswith("files") for x in results)
+
+    stats = g.thread_pool_stats()
+    assert stats["files"].completed == 5
+    assert stats["files"].queued == 0
+    assert stats["files"].busy_time >= 0.1
+    assert 0 < stats["files"].utilisation <= 1
+    assert stats["default"].completed == 5
+
+
+def test_thread_pool_validation():
+    g = Graph()
+    with pytest.raises(KeyError):
+        g.add_node(thread_name, thread_pool="missing")
+    with pytest.raises(ValueError):
+        g.add_node(thread_name, executor="process", thread_pool=ThreadPool("x", 1))
+    g.add_node(thread_name, thread_pool=ThreadPool("http", 8))
+    assert g.thread_pools["http"].max_workers == 8
+
+
+@pytest.mark.asyncio
+async def test_caller_executor_left_running():
+    executor = ThreadPoolExecutor(max_workers=1)
+    g = Graph(process_pool=executor)
+    g.add_node(worker_pid, executor="process")
+    g.outputs = g.worker_pid()
+    try:
+        assert (await g(3)).total == 3
+        g.shutdown()
+        assert g.process_pool.executor is executor
+        assert executor.submit(sum, [1, 2]).result() == 3
+        assert (await g(4)).total == 6
+    finally:
+        executor.shutdown()
@@ -1,5 +1,6 @@
 import pytest
 from mr_graph.graph import Graph
+from functions import format_answer
 
 
 async def get_answer(user_question: str, temp=0):
@@ -15,21 +16,6 @@ async def get_answer(user_question: str, temp=0):
     """
     return "a random completion"
 
-def format_answer(user_question:str, completion:str):
-    """parse the answer
-
-    Args:
-        user_question (str): user question sent to the LLM. might be needed to determine formatting.
-        completion (str): LLM completion.
-
-    Returns
-    -------
-    answer : dict[str, str]
-        LLM completion
-    """
-    answer = completion.strip(' \n')
-    return answer
-
 
 async def get_structured_answer(user_question: str):
     """get answer + structure it
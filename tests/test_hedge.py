@@ -0,0 +1,171 @@
+import asyncio
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.hedge import HedgePolicy
+from mr_graph.limits import RateLimiter
+
+
+class Upstream:
+    calls = 0
+
+
+async def flaky_lookup(key: int):
+    """
+    the first call is slow, the rest are fast
+
+    Parameters
+    ----------
+    key : int
+        key to look up.
+
+    Returns
+    -------
+    value : int
+        equal to 10 * key
+    """
+    Upstream.calls += 1
+    if Upstream.calls == 1:
+        await asyncio.sleep(1)
+    else:
+        await asyncio.sleep(0.01)
+    return 10 * key
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins():
+    Upstream.calls = 0
+    g = Graph()
+    g.add_node(flaky_lookup, hedge=HedgePolicy(delay=0.02, max_extra=1))
+    g.outputs = g.flaky_lookup()
+
+    v = await asyncio.wait_for(g(key=3), 0.5)
+    assert v.value == 30
+    stats = g.hedge_stats()["flaky_lookup"]
+    assert (stats.calls, stats.hedges, stats.wins) == (1, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_hedge_capped():
+    Upstream.calls = 0
+    policy = HedgePolicy(delay=0.001, max_extra=0.25)
+    g = Graph()
+    g.add_node(flaky_lookup, hedge=policy)
+    g.outputs = g.flaky_lookup()
+
+    Upstream.calls = 1
+    await g.batch([{"key": k} for k in range(20)], max_in_flight=20)
+    stats = policy.stats()
+    assert stats.calls == 20
+    assert stats.hedges <= 5
+
+
+@pytest.mark.asyncio
+async def test_hedge_percentile():
+    policy = HedgePolicy(percentile=50, min_samples=5)
+    assert policy.current_delay() is None
+
+    async def call():
+        await asyncio.sleep(0.001)
+        return 1
+
+    for _ in range(5):
+        assert await policy.run(call) == 1
+    assert policy.current_delay() > 0
+    assert policy.stats().hedges == 0
+
+
+def test_hedge_sync_rejected():
+    def blocking(key: int):
+        """
+        Returns
+        -------
+        value : int
+        """
+        return key
+
+    g = Graph()
+    with pytest.raises(ValueError):
+        g.add_node(blocking, hedge=0.1)
+
+
+@pytest.mark.asyncio
+async def test_hedge_respects_limits():
+    running = []
+    peak = []
+
+    async def slow_first(key: int):
+        """
+        the first call is slow, the rest are fast
+
+        Parameters
+        ----------
+        key : int
+            key to look up.
+
+        Returns
+        -------
+        value : int
+            equal to 10 * key
+        """
+        running.append(key)
+        peak.append(len(running))
+        await asyncio.sleep(0.2 if len(peak) == 1 else 0.01)
+        running.remove(key)
+        return 10 * key
+
+    # the duplicate waits for the slot held by the slow call, so the slow call wins
+    g = Graph()
+    g.add_node(
+        slow_first, max_concurrency=1, hedge=HedgePolicy(delay=0.02, max_extra=1)
+    )
+    g.outputs = g.slow_first()
+    assert (await g(key=1)).value == 10
+    assert max(peak) == 1
+    stats = g.hedge_stats()["slow_first"]
+    assert (stats.calls, stats.hedges, stats.wins) == (1, 1, 0)
+
+    # the duplicate takes its own token
+    peak.clear()
+    limiter = RateLimiter(rate=0.001, capacity=2)
+    g = Graph()
+    g.add_node(
+        slow_first, rate_limit=limiter, hedge=HedgePolicy(delay=0.02, max_extra=1)
+    )
+    g.outputs = g.slow_first()
+    assert (await g(key=2)).value == 20
+    assert g.hedge_stats()["slow_first"].wins == 1
+    assert limiter.tokens < 0.5
+
+
+@pytest.mark.asyncio
+async def test_queued_calls_not_hedged():
+    calls = []
+
+    async def steady(key: int):
+        """
+        always takes the same time
+
+        Parameters
+        ----------
+        key : int
+            key to look up.
+
+        Returns
+        -------
+        value : int
+            equal to 10 * key
+        """
+        calls.append(key)
+        await asyncio.sleep(0.1)
+        return 10 * key
+
+    # each call waits up to 0.4s for the slot, but runs for less than the delay
+    policy = HedgePolicy(delay=0.15, max_extra=1)
+    g = Graph()
+    g.add_node(steady, max_concurrency=1, hedge=policy)
+    g.outputs = g.steady()
+    values = await asyncio.gather(*[g(key=k) for k in range(5)])
+    assert [v.value for v in values] == [0, 10, 20, 30, 40]
+    assert sorted(calls) == [0, 1, 2, 3, 4]
+    assert policy.stats().hedges == 0
+    assert max(policy._latencies) < 0.15
@@ -0,0 +1,85 @@
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.hooks import GraphHooks
+from functions import add_1, sub_1, mult_2
+
+
+class Recorder(GraphHooks):
+    def __init__(self):
+        self.events = []
+
+    def on_run_start(self, run, plan, started):
+        self.events.append(("run_start", None))
+
+    def on_node_ready(self, run, node, step, ready):
+        self.events.append(("ready", node))
+
+    def on_node_start(self, run, node, step, ready, started):
+        assert ready <= started
+        self.events.append(("start", node))
+
+    def on_node_end(self, run, node, step, ready, started, finished, cache_hit):
+        assert started <= finished
+        self.events.append(("end", node))
+
+    def on_node_error(self, run, node, step, ready, started, finished, error):
+        self.events.append(("error", node))
+
+    def on_run_end(self, run, started, finished, skipped, error):
+        self.events.append(("run_end", type(error).__name__ if error else None))
+
+
+def broken(q: int):
+    """
+    always fails
+
+    Parameters
+    ----------
+    q : int
+        a number.
+
+    Returns
+    -------
+    r : int
+        never returned
+    """
+    raise ValueError("broken")
+
+
+@pytest.mark.asyncio
+async def test_hooks_called_in_order():
+    hooks = Recorder()
+    g = Graph(nodes=[add_1, sub_1, mult_2])
+    g.add_hooks(hooks)
+
+    v = await g(n=1)
+    assert v.q == 2
+    assert hooks.events == [
+        ("run_start", None),
+        ("ready", "add_1"),
+        ("start", "add_1"),
+        ("end", "add_1"),
+        ("ready", "sub_1"),
+        ("start", "sub_1"),
+        ("end", "sub_1"),
+        ("ready", "mult_2"),
+        ("start", "mult_2"),
+        ("end", "mult_2"),
+        ("run_end", None),
+    ]
+
+    g.remove_hooks(hooks)
+    await g(n=1)
+    assert len(hooks.events) == 11
+
+
+@pytest.mark.asyncio
+async def test_hooks_node_error():
+    hooks = Recorder()
+    g = Graph(nodes=[add_1, sub_1, mult_2, broken])
+    g.add_hooks(hooks)
+    g.outputs = g.broken(g.mult_2(g.sub_1(g.add_1())))
+
+    with pytest.raises(ValueError):
+        await g(n=1)
+    assert hooks.events[-2:] == [("error", "broken"), ("run_end", "ValueError")]
@@ -0,0 +1,71 @@
+import pytest
+from mr_graph.graph import Graph
+from functions import add_p_q, sub_1, mult_2
+
+
+async def make_q(n: int):
+    """
+    add 1 to a number
+
+    Parameters
+    ----------
+    n : int
+        a number.
+
+    Returns
+    -------
+    q : int
+        equal to n + 1
+    """
+    return n + 1
+
+
+async def other_p(k: int):
+    """
+    also outputs p
+
+    Parameters
+    ----------
+    k : int
+        a number.
+
+    Returns
+    -------
+    p : int
+        equal to k
+    """
+    return k
+
+
+def chain_link(i: int):
+    source = (
+        f"def link_{i}(x_{i}: int):\n"
+        f'    """\n    Returns\n    -------\n    x_{i + 1} : int\n        next\n    """\n'
+        f"    return x_{i} + 1\n"
+    )
+    namespace = dict()
+    exec(source, namespace)
+    return namespace[f"link_{i}"]
+
+
+@pytest.mark.asyncio
+async def test_implicit_fan_in():
+    g = Graph(nodes=[add_p_q, sub_1, make_q])
+    v = await g(m=5, n=5)
+    assert v.r == 10
+
+
+@pytest.mark.asyncio
+async def test_implicit_ambiguous_producer():
+    g = Graph(nodes=[sub_1, other_p, mult_2])
+    with pytest.raises(Exception, match="more than one node"):
+        await g(m=1, k=2)
+
+
+@pytest.mark.asyncio
+async def test_implicit_large_chain():
+    # nodes added out of order, wired through the output index
+    n = 1000
+    g = Graph(nodes=[chain_link(i) for i in reversed(range(n))])
+    v = await g(x_0=0)
+    assert getattr(v, f"x_{n}") == n
@@ -0,0 +1,148 @@
+import pytest
+from mr_graph.graph import Graph
+from functions import calls, double, negate, total
+
+
+def combine(doubled: int, negated: int):
+    """
+    add two numbers
+
+    Parameters
+    ----------
+    doubled : int
+        a number.
+    negated : int
+        another number.
+
+    Returns
+    -------
+    total : int
+        doubled + negated
+    """
+    calls.append("combine")
+    return doubled + negated
+
+
+def label(value: int):
+    """
+    describe a number
+
+    Parameters
+    ----------
+    value : int
+        a number.
+
+    Returns
+    -------
+    text : str
+        the number as text
+    """
+    calls.append("label")
+    return f"total is {value}"
+
+
+def reused(v) -> list:
+    return [x.split("-")[0] for x in getattr(v, "__reused")]
+
+
+def two_input_graph() -> Graph:
+    g = Graph()
+    for func in [double, negate, combine]:
+        g.add_node(func, executor="inline")
+    d = g.double(g.input(name="x"))
+    n = g.negate(g.input(name="y"))
+    g.outputs = g.combine(doubled=d.doubled, negated=n.negated)
+    return g
+
+
+@pytest.mark.asyncio
+async def test_reuse_unchanged_nodes():
+    g = two_input_graph()
+    run = g.incremental()
+    calls.clear()
+    v = await run(x=1, y=2)
+    assert v.total == 0
+    assert reused(v) == []
+    assert calls == ["double", "negate", "combine"]
+
+    calls.clear()
+    v = await run(x=1, y=3)
+    assert v.total == -1
+    assert reused(v) == ["double"]
+    assert calls == ["negate", "combine"]
+
+    calls.clear()
+    v = await run(x=1, y=3)
+    assert v.dict() == {"total": -1}
+    assert sorted(reused(v)) == ["combine", "double", "negate"]
+    assert calls == []
+
+    run.reset()
+    calls.clear()
+    await run(x=1, y=3)
+    assert calls == ["double", "negate", "combine"]
+
+    # plain calls do not keep anything
+    assert not hasattr(await g(x=1, y=3), "__reused")
+
+
+@pytest.mark.asyncio
+async def test_compare_by_hash():
+    g = Graph()
+    for func in [total, label]:
+        g.add_node(func, executor="inline")
+    g.outputs = g.label(value=g.total(g.input(name="xs")).sum_of)
+
+    run = g.incremental()
+    await run(xs=[1, 2])
+    calls.clear()
+    # an equal list is still a different object, but total returns the same (cached small) int
+    await run(xs=[1, 2])
+    assert calls == ["total"]
+
+    run = g.incremental(compare="hash")
+    await run(xs=[1, 2])
+    calls.clear()
+    v = await run(xs=[1, 2])
+    assert calls == []
+    assert v.text == "total is 3"
+
+    # total is called again, but returns the same value, so label is not
+    v = await run(xs=[2, 1])
+    assert calls == ["total"]
+    assert reused(v) == ["label"]
+    assert v.text == "total is 3"
+
+    with pytest.raises(ValueError):
+        g.incremental(compare="equal")
+
+
+@pytest.mark.asyncio
+async def test_aggregator_inputs_kept():
+    g = Graph()
+    for func in [double, negate, total]:
+        g.add_node(func, executor="inline")
+    xs = g.aggregator(name="xs")
+    xs += g.double(g.input(name="x")).doubled
+    xs += g.negate(g.input(name="y")).negated
+    g.outputs = g.total(values=xs)
+
+    run = g.incremental()
+    assert (await run(x=1, y=2)).sum_of == 0
+    calls.clear()
+    v = await run(x=1, y=5)
+    assert v.sum_of == -3
+    assert calls == ["negate", "total"]
+    assert reused(v) == ["double"]
+    assert (await g(x=1, y=5)).sum_of == -3
+
+
+@pytest.mark.asyncio
+async def test_graph_changed():
+    g = two_input_graph()
+    run = g.incremental()
+    await run(x=1, y=2)
+    g.plan = None
+    calls.clear()
+    await run(x=1, y=2)
+    assert calls == ["double", "negate", "combine"]
@@ -0,0 +1,117 @@
+import asyncio
+import time
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.limits import RateLimiter
+from functions import average_list
+
+
+class Counter:
+    running = 0
+    max_running = 0
+
+
+async def slow_double(n: int):
+    """
+    double a number after a short wait
+
+    Parameters
+    ----------
+    n : int
+        number to double
+
+    Returns
+    -------
+    d : int
+        equal to 2 * n
+    """
+    Counter.running += 1
+    Counter.max_running = max(Counter.max_running, Counter.running)
+    await asyncio.sleep(0.02)
+    Counter.running -= 1
+    return 2 * n
+
+
+def build_fan_out(g: Graph, width: int):
+    doubles = g.aggregator(name="list_of_ints")
+    for n in range(width):
+        doubles += g.slow_double(n=n).d
+    g.outputs = g.average_list(list_of_ints=doubles)
+
+
+@pytest.mark.asyncio
+async def test_node_max_concurrency():
+    Counter.max_running = 0
+    g = Graph()
+    g.add_node(slow_double, max_concurrency=2)
+    g.add_node(average_list)
+    build_fan_out(g, 10)
+
+    v = await g()
+    assert v.avg == 9
+    assert Counter.max_running == 2
+
+
+@pytest.mark.asyncio
+async def test_node_max_concurrency_shared_across_calls():
+    Counter.max_running = 0
+    g = Graph()
+    g.add_node(slow_double, max_concurrency=3)
+    g.add_node(average_list)
+    build_fan_out(g, 4)
+
+    await asyncio.gather(*[g() for _ in range(5)])
+    assert Counter.max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_graph_max_concurrency():
+    Counter.max_running = 0
+    g = Graph(nodes=[slow_double, average_list], max_concurrency=4)
+    build_fan_out(g, 12)
+
+    v = await g()
+    assert v.avg == 11
+    assert Counter.max_running == 4
+
+
+@pytest.mark.asyncio
+async def test_rate_limit():
+    g = Graph()
+    g.add_node(slow_double, rate_limit=RateLimiter(rate=100, capacity=1))
+    g.add_node(average_list)
+    build_fan_out(g, 10)
+
+    start = time.perf_counter()
+    await g()
+    # one start every 10 ms after the first
+    assert time.perf_counter() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_cost():
+    limiter = RateLimiter(rate=1000, capacity=100)
+    await limiter.acquire(60)
+    start = time.perf_counter()
+    await limiter.acquire(60)
+    assert time.perf_counter() - start >= 0.015
+
+
+def test_limits_on_several_event_loops():
+    Counter.max_running = 0
+    g = Graph(nodes=[slow_double, average_list], max_concurrency=2)
+    g.add_node(slow_double, max_concurrency=1, rate_limit=RateLimiter(rate=1000))
+    build_fan_out(g, 4)
+    run = g.incremental()
+
+    # each asyncio.run starts a new event loop
+    assert asyncio.run(g()).avg == 3
+    assert asyncio.run(g()).avg == 3
+    assert asyncio.run(run()).avg == 3
+    assert asyncio.run(run()).avg == 3
+    assert Counter.max_running == 1
+
+    async def both():
+        return await asyncio.gather(g(), asyncio.to_thread(asyncio.run, g()))
+
+    assert [v.avg for v in asyncio.run(both())] == [3, 3]
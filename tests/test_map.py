@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from mr_graph.graph import Graph
+from functions import sub_1, add_1, mult_2
+
+
+in_flight = 0
+max_seen = 0
+
+
+async def tracked_add_1(n: int):
+    """
+    add 1 to a number, recording how many calls overlap
+
+    Parameters
+    ----------
+    n : int
+        number to add 1 to.
+
+    Returns
+    -------
+    m : int
+        equal to n + 1
+    """
+    global in_flight, max_seen
+    in_flight += 1
+    max_seen = max(max_seen, in_flight)
+    await asyncio.sleep(0.01 * (n % 3))
+    in_flight -= 1
+    return n + 1
+
+
+@pytest.mark.asyncio
+async def test_batch_ordered_and_bounded():
+    g = Graph(nodes=[tracked_add_1, sub_1])
+    g.outputs = g.sub_1(g.tracked_add_1())
+
+    v = await g.batch([{"n": n} for n in range(50)], max_in_flight=4)
+    assert [x.p for x in v] == list(range(50))
+    assert max_seen <= 4
+
+
+@pytest.mark.asyncio
+async def test_map_as_completed():
+    g = Graph(nodes=[add_1, sub_1, mult_2])
+
+    async def rows():
+        for n in range(20):
+            yield n
+
+    seen = dict()
+    async for index, v in g.map(rows(), max_in_flight=5, ordered=False):
+        seen[index] = v.q
+    assert seen == {n: 2 * n for n in range(20)}
+
+
+@pytest.mark.asyncio
+async def test_map_positional():
+    g = Graph(nodes=[add_1, sub_1, mult_2])
+    v = [x.q async for x in g.map([(1,), 2, {"n": 3}])]
+    assert v == [2, 4, 6]
@@ -0,0 +1,186 @@
+import asyncio
+import pytest
+from mr_graph.graph import Graph
+from functions import Running
+
+
+def split_words(text: str):
+    """
+    split a text into words
+
+    Parameters
+    ----------
+    text : str
+        some text.
+
+    Returns
+    -------
+    words : list[str]
+        the words of the text
+    """
+    return text.split()
+
+
+async def shout(word: str, suffix: str = "!"):
+    """
+    shout a word
+
+    Parameters
+    ----------
+    word : str
+        a word.
+    suffix : str
+        added to the word.
+
+    Returns
+    -------
+    loud : str
+        the word in upper case
+    """
+    Running.calls += 1
+    Running.now += 1
+    Running.most = max(Running.most, Running.now)
+    await asyncio.sleep(0.001)
+    Running.now -= 1
+    if word == "boom":
+        raise RuntimeError(word)
+    return word.upper() + suffix
+
+
+def measure(word: str):
+    """
+    measure a word
+
+    Parameters
+    ----------
+    word : str
+        a word.
+
+    Returns
+    -------
+    first : str
+        first letter
+    length : int
+        number of letters
+    """
+    return word[0], len(word)
+
+
+def join_words(loud: list[str]):
+    """
+    join words
+
+    Parameters
+    ----------
+    loud : list[str]
+        words.
+
+    Returns
+    -------
+    sentence : str
+        the words joined by spaces
+    """
+    return " ".join(loud)
+
+
+def add_one(n: int):
+    """
+    add 1
+
+    Parameters
+    ----------
+    n : int
+        a number.
+
+    Returns
+    -------
+    m : int
+        n + 1
+    """
+    return n + 1
+
+
+@pytest.mark.asyncio
+async def test_map_node():
+    Running.most = 0
+    g = Graph(nodes=[split_words, shout, join_words])
+    words = g.split_words(g.input(name="text"))
+    loud = g.map_node("shout", "word", word=words.words, max_concurrency=2)
+    g.outputs = g.join_words(loud=loud.loud)
+
+    v = await g(text="a b c d e")
+    assert v.sentence == "A! B! C! D! E!"
+    assert Running.most == 2
+
+    v = await g(text="")
+    assert v.sentence == ""
+
+
+@pytest.mark.asyncio
+async def test_map_node_constant_inputs():
+    g = Graph(nodes=[split_words])
+    words = g.split_words(g.input(name="text"))
+    g.outputs = g.map_node(shout, "word", word=words.words, suffix="?")
+
+    v = await g(text="a b")
+    assert v.loud == ["A?", "B?"]
+
+
+@pytest.mark.asyncio
+async def test_map_node_several_outputs():
+    g = Graph(nodes=[split_words])
+    g.add_node(measure, executor="thread")
+    words = g.split_words(g.input(name="text"))
+    g.outputs = g.map_node(measure, "word", word=words.words)
+
+    v = await g(text="one three")
+    assert v.first == ["o", "t"]
+    assert v.length == [3, 5]
+
+
+@pytest.mark.asyncio
+async def test_map_node_failure():
+    g = Graph(nodes=[split_words])
+    words = g.split_words(g.input(name="text"))
+    g.outputs = g.map_node(shout, "word", word=words.words, max_concurrency=1)
+
+    Running.calls = 0
+    with pytest.raises(RuntimeError):
+        await g(text="boom a b c")
+    await asyncio.sleep(0.01)
+    assert Running.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_map_node_cache():
+    g = Graph()
+    g.add_node(shout, cache=True)
+    g.outputs = g.map_node(
+        shout, "word", word=g.input(name="words").words, max_concurrency=1
+    )
+
+    Running.calls = 0
+    v = await g(words=["a", "b", "a"])
+    v = await g(words=["a", "b", "c"])
+    assert v.loud == ["A!", "B!", "C!"]
+    assert Running.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_map_node_inline_many():
+    g = Graph()
+    g.add_node(add_one, executor="inline")
+    g.outputs = g.map_node(add_one, "n", n=g.input(name="numbers").numbers)
+    plan = g.compile()
+    assert len(plan.steps) == 1
+
+    v = await g(numbers=range(10000))
+    assert v.m == list(range(1, 10001))
+
+
+def test_map_node_errors():
+    g = Graph(nodes=[shout])
+    with pytest.raises(ValueError):
+        g.map_node(shout, "words")
+    with pytest.raises(ValueError):
+        g.map_node(shout, "word", max_concurrency=0)
@@ -0,0 +1,43 @@
+import pytest
+from pydantic import ValidationError
+from mr_graph.graph import Graph
+from mr_graph.node import build_node
+from functions import add_n_m, div_mul_2
+
+
+def test_fields_in_slots():
+    node = build_node(div_mul_2)
+    o = node.outputs()
+    assert type(o).__slots__ == ("s", "t")
+    assert (o.s, o.t) == (None, None)
+    o.s = 1.0
+    assert dict(o) == {"s": 1.0, "t": None}
+    # extra attributes are still allowed
+    setattr(o, "__node_name", "div_mul_2-0")
+    assert o.dict() == {"s": 1.0, "t": None}
+
+
+def test_add():
+    a = build_node(div_mul_2).outputs(s=1.0)
+    b = build_node(add_n_m).outputs(r=2.0)
+    c = a + b
+    assert (c.s, c.t, c.r) == (1.0, None, 2.0)
+    with pytest.raises(Exception):
+        a + build_node(div_mul_2).outputs(s=3.0)
+
+
+def test_validate():
+    o = build_node(add_n_m).inputs(n="1.5", m=2)
+    o.validate()
+    assert o.n == 1.5
+    o.m = "not a number"
+    with pytest.raises(ValidationError):
+        o.validate()
+
+
+@pytest.mark.asyncio
+async def test_graph_output_is_slotted():
+    g = Graph(nodes=[div_mul_2])
+    v = await g(n=4)
+    assert (v.s, v.t) == (2, 8)
+    assert "s" not in v.__dict__
@@ -0,0 +1,53 @@
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.node import build_node
+from functions import add_1, add_n_m
+
+
+def test_spec_reused():
+    a = build_node(add_n_m)
+    b = build_node(add_n_m)
+    assert a is not b
+    assert a.inputs is b.inputs
+    assert a.outputs is b.outputs
+
+
+def test_spec_invalidated_on_new_code():
+    def f(x: int):
+        """
+        a number
+
+        Parameters
+        ----------
+        x : int
+            a number.
+
+        Returns
+        -------
+        y : int
+            the number
+        """
+        return x
+
+    def twice(x: int):
+        return 2 * x
+
+    before = build_node(f)
+    f.__code__ = twice.__code__
+    after = build_node(f)
+    assert before.inputs is not after.inputs
+    assert after.func(x=2) == 4
+
+
+@pytest.mark.asyncio
+async def test_rebuilt_graph_shares_spec():
+    def make():
+        g = Graph(nodes=[add_1, add_n_m])
+        i = g.input(name="n")
+        g.outputs = g.add_1(i)
+        return g
+
+    g0, g1 = make(), make()
+    assert g0.nodes["add_1"] is not g1.nodes["add_1"]
+    assert g0.nodes["add_1"].inputs is g1.nodes["add_1"].inputs
+    assert (await g0(n=1)).m == (await g1(n=1)).m == 2
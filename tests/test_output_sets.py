@@ -0,0 +1,80 @@
+import pytest
+from mr_graph.graph import Graph
+from functions import calls, double, negate, square, total
+
+
+def wide_graph() -> Graph:
+    g = Graph()
+    for func in [double, negate, square, total]:
+        g.add_node(func, executor="inline")
+    x = g.input(name="x")
+    d = g.double(x)
+    n = g.negate(x)
+    s = g.square(n=d.doubled)
+    values = g.aggregator(name="values")
+    values += d.doubled
+    values += n.negated
+    g.outputs = [d, n, s, g.total(values=values)]
+    return g
+
+
+@pytest.mark.asyncio
+async def test_run_only_needed_nodes():
+    g = wide_graph()
+    calls.clear()
+    v = await g(x=3)
+    assert v.dict() == {"doubled": 6, "negated": -3, "value": 36, "sum_of": 3}
+    assert sorted(calls) == ["double", "negate", "square", "total"]
+
+    calls.clear()
+    v = await g(x=3, outputs=["value"])
+    assert v.dict() == {"value": 36}
+    assert calls == ["double", "square"]
+
+    calls.clear()
+    v = await g(x=3, outputs=["negated"])
+    assert v.dict() == {"negated": -3}
+    assert calls == ["negate"]
+
+    calls.clear()
+    v = await g(x=3, outputs=["sum_of", "value"])
+    assert v.dict() == {"value": 36, "sum_of": 3}
+    assert sorted(calls) == ["double", "negate", "square", "total"]
+
+    with pytest.raises(ValueError):
+        await g(x=3, outputs=["tripled"])
+
+
+@pytest.mark.asyncio
+async def test_named_output_sets():
+    g = wide_graph()
+    g.add_output_set("cheap", ["doubled", "negated"])
+    calls.clear()
+    v = await g(x=2, outputs="cheap")
+    assert v.dict() == {"doubled": 4, "negated": -2}
+    assert sorted(calls) == ["double", "negate"]
+
+    # pruned plans are kept with the full plan
+    plan = g.compile("cheap")
+    assert g.compile("cheap") is plan
+    assert g.compile(["negated", "doubled"]) is plan
+    assert len(plan.steps) == 2
+    assert len(g.compile().steps) == 5
+    assert g.compile(["doubled", "negated", "value", "sum_of"]) is g.compile()
+
+    outputs = await g.batch([1, 2, 3], outputs="cheap")
+    assert [x.doubled for x in outputs] == [2, 4, 6]
+
+    with pytest.raises(ValueError):
+        await g(x=2, outputs="everything")
+
+
+@pytest.mark.asyncio
+async def test_incremental_output_sets():
+    g = wide_graph()
+    run = g.incremental()
+    await run(x=2, outputs=["value"])
+    calls.clear()
+    v = await run(x=2, outputs=["value"])
+    assert calls == []
+    assert v.value == 16
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.profiler import Profiler
+
+
+async def fast_branch(m: int):
+    """
+    return quickly
+
+    Parameters
+    ----------
+    m : int
+        a number.
+
+    Returns
+    -------
+    a : int
+        equal to m
+    """
+    await asyncio.sleep(0.001)
+    return m
+
+
+async def slow_branch(n: int):
+    """
+    return slowly
+
+    Parameters
+    ----------
+    n : int
+        a number.
+
+    Returns
+    -------
+    b : int
+        equal to n
+    """
+    await asyncio.sleep(0.03)
+    return n
+
+
+def join(a: int, b: int):
+    """
+    add the branches, on the event loop
+
+    Parameters
+    ----------
+    a : int
+        first number.
+    b : int
+        second number.
+
+    Returns
+    -------
+    c : int
+        equal to a + b
+    """
+    return a + b
+
+
+def build(g: Graph):
+    g.add_node(fast_branch)
+    g.add_node(slow_branch)
+    g.add_node(join, executor="inline", cache=True)
+    i0 = g.input(name="m")
+    i1 = g.input(name="n")
+    g.outputs = g.join(g.fast_branch(i0).a, g.slow_branch(i1).b)
+
+
+@pytest.mark.asyncio
+async def test_critical_path():
+    g = Graph(profile=True)
+    build(g)
+    v = await g(m=1, n=2)
+    assert v.c == 3
+
+    run = g.profiler.runs[-1]
+    assert [x.name for x in run.critical_path()] == ["slow_branch", "join"]
+    timings = {x.name: x for x in run.timings}
+    assert timings["slow_branch"].duration >= 0.03
+    assert timings["join"].dispatch == "inline"
+    assert timings["fast_branch"].ready <= timings["fast_branch"].started
+
+
+@pytest.mark.asyncio
+async def test_summary_and_trace(tmp_path):
+    profiler = Profiler(max_runs=10)
+    g = Graph(profile=profiler)
+    build(g)
+    for _ in range(12):
+        await g(m=1, n=2)
+
+    assert len(profiler.runs) == 10
+    summary = profiler.summary()
+    assert summary["slow_branch"].count == 10
+    assert summary["slow_branch"].critical == 10
+    assert summary["join"].cache_hits == 10
+    assert summary["slow_branch"].p50 <= summary["slow_branch"].p99
+
+    path = tmp_path / "trace.json"
+    profiler.write_chrome_trace(str(path))
+    trace = json.loads(path.read_text())
+    spans = [x for x in trace["traceEvents"] if x["ph"] == "X"]
+    assert len(spans) == 30
+    assert all(x["dur"] >= 0 for x in spans)
@@ -0,0 +1,68 @@
+import asyncio
+import time
+import pytest
+from mr_graph.graph import Graph
+from functions import add_1, add_p_q, reverse_order
+
+
+async def slow_sub_1(m: int):
+    """
+    subtract 1 from a number, slowly
+
+    Parameters
+    ----------
+    m : int
+        number to subtract 1 from.
+
+    Returns
+    -------
+    p : int
+        equal to m - 1
+    """
+    await asyncio.sleep(0.2)
+    return m - 1
+
+
+async def slow_add_1(n: int):
+    """
+    add 1 to a number, slowly
+
+    Parameters
+    ----------
+    n : int
+        number to add 1 to.
+
+    Returns
+    -------
+    q : int
+        equal to n + 1
+    """
+    await asyncio.sleep(0.2)
+    return n + 1
+
+
+@pytest.mark.asyncio
+async def test_independent_branches_overlap():
+    g = Graph(nodes=[slow_sub_1, slow_add_1, add_p_q])
+    o_1 = g.slow_sub_1()
+    o_2 = g.slow_add_1()
+    g.outputs = g.add_p_q(o_1, o_2)
+
+    start = time.perf_counter()
+    v = await g(m=5, n=5)
+    elapsed = time.perf_counter() - start
+    assert v.r == 10
+    # both slow branches wait at the same time
+    assert elapsed < 0.35
+
+
+@pytest.mark.asyncio
+async def test_consumer_waits_for_every_producer():
+    g = Graph(nodes=[slow_sub_1, add_1, reverse_order])
+    i0 = g.input(name="m")
+    i1 = g.input(name="n")
+    g.outputs = g.reverse_order(g.slow_sub_1(i0).p, g.add_1(i1).m)
+
+    v = await g(m=5, n=6)
+    assert v.s == 4
+    assert v.t == 7
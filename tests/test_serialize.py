@@ -0,0 +1,101 @@
+import importlib
+import operator
+import sys
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.serialize import StalePlanError
+from functions import add_1, mult_2, square, sub_1
+
+
+def total_graph() -> Graph:
+    g = Graph(nodes=[add_1, sub_1], thread_pools={"math": 2})
+    g.add_node(square, executor="inline")
+    g.add_node(mult_2, thread_pool="math")
+    m = g.add_1(g.input(name="n"))
+    q = g.mult_2(p=m.m)
+    total = g.aggregator(name="total", reduce=operator.add, initial=int)
+    total += q.q
+    total += 100
+    total += g.sub_1(m=q.q).p
+    added = g.map_node(add_1, "n", n=g.input(name="ns").ns)
+    g.outputs = [g.square(n=total), added]
+    return g
+
+
+@pytest.mark.asyncio
+async def test_save_load(tmp_path):
+    g = total_graph()
+    expected = await g(n=1, ns=[1, 2, 3])
+    path = str(tmp_path / "plan.json")
+    g.save(path)
+
+    loaded = Graph.load(path, thread_pools={"math": 2})
+    v = await loaded(n=1, ns=[1, 2, 3])
+    assert v.dict() == expected.dict()
+    assert v.value == (4 + 100 + 3) ** 2
+    assert v.m == [2, 3, 4]
+
+    with pytest.raises(KeyError):
+        Graph.load(path)
+
+
+def test_unsaveable(tmp_path):
+    path = str(tmp_path / "plan.json")
+    g = Graph(nodes=[add_1])
+    total = g.aggregator(name="total", reduce=lambda a, b: a + b)
+    total += g.input(name="x").x
+    g.outputs = g.add_1(n=total)
+    with pytest.raises(ValueError):
+        g.save(path)
+
+    g = Graph(nodes=[add_1])
+    total = g.aggregator(name="total")
+    total += object()
+    g.outputs = g.add_1(n=total)
+    with pytest.raises(TypeError):
+        g.save(path)
+
+
+source = '''
+def work(n: int):
+    """
+    do some work
+
+    Parameters
+    ----------
+    n : int
+        a number.
+
+    Returns
+    -------
+    m : int
+        the result
+    """
+    return n {}
+'''
+
+
+@pytest.mark.asyncio
+async def test_stale_plan(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module_path = tmp_path / "saved_work.py"
+    module_path.write_text(source.format("+ 1"))
+    import saved_work
+
+    g = Graph(nodes=[saved_work.work])
+    g.outputs = g.work(g.input(name="n"))
+    path = str(tmp_path / "plan.json")
+    g.save(path)
+    assert (await Graph.load(path)(n=1)).m == 2
+
+    module_path.write_text(source.format("+ 2"))
+    importlib.reload(saved_work)
+    with pytest.raises(StalePlanError) as err:
+        Graph.load(path)
+    assert err.value.functions == ["saved_work:work"]
+
+    module_path.write_text("")
+    importlib.reload(saved_work)
+    with pytest.raises(StalePlanError):
+        Graph.load(path)
+    sys.modules.pop("saved_work")
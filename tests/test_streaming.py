@@ -0,0 +1,277 @@
+import asyncio
+import threading
+import time
+import pytest
+from mr_graph.graph import Graph
+from functions import total
+
+
+events = []
+
+
+async def produce(n: int):
+    """
+    yield the numbers below n, slowly
+
+    Parameters
+    ----------
+    n : int
+        number of items.
+
+    Yields
+    -------
+    item : int
+        the next number
+    """
+    for i in range(n):
+        await asyncio.sleep(0.01)
+        events.append(("produced", i))
+        yield i
+
+
+async def square_each(item):
+    """
+    square every item as it arrives
+
+    Parameters
+    ----------
+    item : typing.AsyncIterator
+        items to square.
+
+    Yields
+    -------
+    squared : int
+        the item, squared
+    """
+    async for i in item:
+        events.append(("squared", i))
+        yield i * i
+
+
+def count_up(n: int):
+    """
+    yield the numbers below n from a thread
+
+    Parameters
+    ----------
+    n : int
+        number of items.
+
+    Yields
+    -------
+    item : int
+        the next number
+    """
+    for i in range(n):
+        time.sleep(0.001)
+        yield i
+
+
+def double_each(item):
+    """
+    double every item, in a thread
+
+    Parameters
+    ----------
+    item : typing.Iterator
+        items to double.
+
+    Yields
+    -------
+    doubled : int
+        the item, doubled
+    """
+    for i in item:
+        yield 2 * i
+
+
+async def first(item):
+    """
+    pass on only the first item
+
+    Parameters
+    ----------
+    item : typing.AsyncIterator
+        items.
+
+    Yields
+    -------
+    head : int
+        the first item
+    """
+    async for i in item:
+        yield i
+        return
+
+
+numbers_stopped = threading.Event()
+
+
+def numbers(n: int):
+    """
+    yield the numbers below n from a thread, noting when the generator stops
+
+    Parameters
+    ----------
+    n : int
+        number of items.
+
+    Yields
+    -------
+    item : int
+        the next number
+    """
+    try:
+        yield from range(n)
+    finally:
+        numbers_stopped.set()
+
+
+async def picky(item):
+    """
+    pass on items, failing on 2
+
+    Parameters
+    ----------
+    item : typing.AsyncIterator
+        items.
+
+    Yields
+    -------
+    picked : int
+        the item
+    """
+    async for i in item:
+        if i == 2:
+            raise ValueError("2 is not allowed")
+        yield i
+
+
+async def scale(item, factor: int):
+    """
+    multiply every item as it arrives
+
+    Parameters
+    ----------
+    item : typing.AsyncIterator
+        items to scale.
+    factor : int
+        multiplier.
+
+    Yields
+    -------
+    scaled : int
+        the item times factor
+    """
+    async for i in item:
+        yield i * factor
+
+
+def count(item: list):
+    """
+    count every item
+
+    Parameters
+    ----------
+    item : list
+        every item.
+
+    Returns
+    -------
+    factor : int
+        the number of items
+    """
+    return len(item)
+
+
+@pytest.mark.asyncio
+async def test_stream_pipeline_overlaps():
+    events.clear()
+    g = Graph(nodes=[produce, square_each, total], stream_buffer=1)
+    g.outputs = g.total(g.square_each(g.produce()))
+
+    v = await g(n=5)
+    assert v.sum_of == sum(i * i for i in range(5))
+    # the first item is squared before the producer has finished
+    assert events.index(("squared", 0)) < events.index(("produced", 4))
+
+
+@pytest.mark.asyncio
+async def test_stream_with_small_concurrency_limit():
+    g = Graph(nodes=[produce, square_each, total], max_concurrency=1, stream_buffer=1)
+    g.outputs = g.total(g.square_each(g.produce()))
+
+    v = await asyncio.wait_for(g(n=5), 5)
+    assert v.sum_of == sum(i * i for i in range(5))
+    outputs = await asyncio.wait_for(g.batch([3, 4]), 5)
+    assert [x.sum_of for x in outputs] == [5, 14]
+
+
+@pytest.mark.asyncio
+async def test_stream_output_collected():
+    g = Graph(nodes=[produce, square_each])
+    g.outputs = g.square_each(g.produce())
+
+    v = await g(n=4)
+    assert v.squared == [0, 1, 4, 9]
+
+
+@pytest.mark.asyncio
+async def test_sync_generators():
+    g = Graph(nodes=[count_up, double_each])
+    g.outputs = g.double_each(g.count_up())
+
+    v = await g(n=50)
+    assert v.doubled == [2 * i for i in range(50)]
+
+
+@pytest.mark.asyncio
+async def test_consumer_stops_early():
+    g = Graph(nodes=[produce, first], stream_buffer=1)
+    g.outputs = g.first(g.produce())
+
+    v = await asyncio.wait_for(g(n=20), 5)
+    assert v.head == [0]
+
+
+@pytest.mark.asyncio
+async def test_consumer_fails():
+    numbers_stopped.clear()
+    g = Graph(nodes=[numbers, picky], stream_buffer=1)
+    g.outputs = g.picky(g.numbers())
+
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(g(n=1000), 5)
+    # the producer thread is not left waiting on a queue nobody reads
+    assert await asyncio.to_thread(numbers_stopped.wait, 5)
+
+
+@pytest.mark.asyncio
+async def test_skipped_consumer():
+    g = Graph(nodes=[numbers, scale], stream_buffer=1)
+    p = g.numbers()
+    g.outputs = [p, g.scale(item=p.item, factor=g.input(name="factor"))]
+
+    # factor is never given, so scale is skipped and nothing reads its queue
+    v = await asyncio.wait_for(g(n=100), 5)
+    assert v.item == list(range(100))
+    assert v.scaled is None
+
+
+@pytest.mark.asyncio
+async def test_consumer_waits_for_whole_stream():
+    g = Graph(nodes=[numbers, count, scale], stream_buffer=1)
+    p = g.numbers()
+    g.outputs = g.scale(item=p.item, factor=g.count(item=p.item).factor)
+
+    # scale starts once count has read every item, and is sent the items it missed
+    v = await asyncio.wait_for(g(n=100), 5)
+    assert v.scaled == [100 * i for i in range(100)]
+
+
+def test_generator_options_rejected():
+    g = Graph()
+    with pytest.raises(ValueError):
+        g.add_node(produce, cache=True)
+    with pytest.raises(ValueError):
+        g.add_node(count_up, executor="process")
@@ -0,0 +1,108 @@
+import pytest
+from mr_graph.graph import Graph
+from mr_graph.limits import RateLimiter
+from functions import Running, add_1, answer_question, format_answer, mult_2
+
+
+def join_answers(answers: list):
+    """join answers
+
+    Returns
+    -------
+    summary : str
+        every answer
+    """
+    return "|".join(answers)
+
+
+def structured_answer() -> Graph:
+    llm = Graph(nodes=[answer_question, format_answer], name="structured_answer")
+    q = llm.input(name="user_question")
+    llm.outputs = llm.format_answer(q, llm.answer_question(q))
+    return llm
+
+
+def q_and_a(questions: list[str], flatten: bool, max_concurrency=None) -> Graph:
+    g = Graph(nodes=[join_answers], max_concurrency=max_concurrency)
+    g.add_subgraph(structured_answer(), "structured_answer", flatten=flatten)
+    answers = g.aggregator(name="answers")
+    for question in questions:
+        answers += g.structured_answer(user_question=question).answer
+    g.outputs = g.join_answers(answers=answers)
+    return g
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("flatten", [False, True])
+async def test_subgraph(flatten):
+    g = q_and_a(["a", "b", "c"], flatten)
+    v = await g()
+    assert v.summary == "answer to a|answer to b|answer to c"
+
+
+@pytest.mark.asyncio
+async def test_flattened_steps_in_plan():
+    g = q_and_a(["a", "b"], flatten=True)
+    names = [x.node.name for x in g.compile().steps]
+    assert "structured_answer" not in names
+    assert names.count("answer_question") == 2
+    assert names.count("format_answer") == 2
+
+
+@pytest.mark.asyncio
+async def test_flattened_share_limits():
+    Running.most = 0
+    g = q_and_a(["a", "b", "c", "d"], flatten=True, max_concurrency=1)
+    await g()
+    assert Running.most == 1
+
+    Running.most = 0
+    g = q_and_a(["a", "b", "c", "d"], flatten=True)
+    await g()
+    assert Running.most == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("flatten", [False, True])
+async def test_nested_subgraphs(flatten):
+    inner = Graph(nodes=[add_1])
+    i = inner.input(name="n")
+    inner.outputs = inner.add_1(i)
+
+    middle = Graph(nodes=[mult_2])
+    middle.add_subgraph(inner, "inner", flatten=flatten)
+    middle.outputs = middle.mult_2(p=middle.inner(n=middle.input(name="n")).m)
+
+    outer = Graph()
+    outer.add_subgraph(middle, "middle", flatten=flatten)
+    outer.add_subgraph(inner, "first", flatten=flatten)
+    outer.outputs = outer.middle(n=outer.first(outer.input(name="n")).m)
+    v = await outer(n=1)
+    assert v.q == 6
+
+
+@pytest.mark.asyncio
+async def test_add_graph_as_node():
+    g = Graph(nodes=[structured_answer()])
+    v = await g(user_question="a")
+    assert v.answer == "answer to a"
+
+    with pytest.raises(ValueError):
+        Graph(nodes=[Graph(nodes=[add_1])])
+
+
+@pytest.mark.asyncio
+async def test_add_graph_as_node_options():
+    limiter = RateLimiter(rate=1000, capacity=5)
+    g = Graph()
+    g.add_node(structured_answer(), max_concurrency=1, rate_limit=limiter)
+    node = g.nodes["structured_answer"]
+    assert node.semaphore is not None
+    assert node.rate_limiter is limiter
+    g.outputs = g.structured_answer(g.input(name="user_question"))
+    assert (await g(user_question="a")).answer == "answer to a"
+    assert limiter.tokens < 5
+
+    for option in [{"cache": True}, {"executor": "process"}, {"hedge": 0.1}]:
+        with pytest.raises(ValueError, match=next(iter(option))):
+            Graph().add_node(structured_answer(), **option)
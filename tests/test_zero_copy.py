@@ -0,0 +1,91 @@
+import tracemalloc
+import pytest
+from mr_graph.graph import Graph
+
+
+class Seen:
+    values = dict()
+
+
+async def load(size: int):
+    """
+    make a large buffer
+
+    Parameters
+    ----------
+    size : int
+        bytes to allocate.
+
+    Returns
+    -------
+    buffer : bytearray
+        a zeroed buffer
+    """
+    buffer = bytearray(size)
+    Seen.values["load"] = buffer
+    return buffer
+
+
+def inspect_buffer(buffer: bytearray):
+    """
+    record the buffer received, on the event loop
+
+    Parameters
+    ----------
+    buffer : bytearray
+        buffer from load.
+
+    Returns
+    -------
+    length : int
+        length of the buffer
+    """
+    Seen.values["inspect_buffer"] = buffer
+    return len(buffer)
+
+
+async def pass_on(buffer: bytearray):
+    """
+    pass the buffer on
+
+    Parameters
+    ----------
+    buffer : bytearray
+        any buffer.
+
+    Returns
+    -------
+    same : bytearray
+        the same buffer
+    """
+    return buffer
+
+
+@pytest.mark.asyncio
+async def test_values_passed_by_reference():
+    Seen.values = dict()
+    g = Graph()
+    g.add_node(load)
+    g.add_node(inspect_buffer, executor="inline")
+    o = g.load()
+    g.outputs = [o, g.inspect_buffer(o)]
+
+    v = await g(size=1 << 20)
+    assert Seen.values["inspect_buffer"] is Seen.values["load"]
+    assert v.buffer is Seen.values["load"]
+
+
+@pytest.mark.asyncio
+async def test_large_input_not_copied():
+    buffer = bytearray(64 << 20)
+    g = Graph(nodes=[pass_on])
+    g.outputs = g.pass_on()
+    await g(buffer=bytearray(1))
+
+    tracemalloc.start()
+    v = await g(buffer=buffer)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert v.same is buffer
+    # a copy would need another 64MB
+    assert peak < 1 << 20